@@ -1,3 +1,4 @@
 from Core.peak_extractor import PeakExtractor
 from Core.stft import STFT
-from Core.fingerprint_generator import FingerprintGenerator
+from Core.fingerprint_generator import FingerprintGenerator, FINGERPRINT_DTYPE
+from Core.feature_cache import FeatureCache
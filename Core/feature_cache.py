@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+
+class FeatureCache(object):
+    """
+    A class to cache spectrograms and spectral peaks of audio files on disk. Entries are keyed by a hash of the content
+    of the audio file along with the audio loader and the STFT and PeakExtractor parameters, so changing only the
+    fingerprint generation parameters reuses the cached features without decoding the audio or computing its
+    spectrogram again. The least recently used entries are evicted once the cache grows beyond its maximum size.
+
+    Attributes:
+        cache_dir (String): Directory where cached features are stored.
+        max_size (int): Maximum size of the cache in bytes.
+        load_audio_parameters (dict): Extra parameters of the function loading audio data, such as backend.
+        hits (int): Number of requests served from the cache.
+        misses (int): Number of requests computed and added to the cache.
+
+    """
+
+    def __init__(self, cache_dir, max_size=2 ** 32, load_audio=None, load_audio_parameters=None):
+        """
+        A constructor method for FeatureCache class.
+
+        Parameters:
+            cache_dir (String): Directory where cached features are stored, created if it doesn't exist.
+            max_size (int): Maximum size of the cache in bytes.
+            load_audio (function): Function used to load audio data, audio_manager.load_audio by default.
+            load_audio_parameters (dict): Extra parameters of the function loading audio data, such as backend and
+                resampler of audio_manager.load_audio.
+
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.load_audio_parameters = load_audio_parameters or dict()
+        self.hits = 0
+        self.misses = 0
+        self.__load_audio = load_audio
+        self.__content_hashes = dict()
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def get_features(self, audio_path, stft, peak_extractor, offset=None, duration=None):
+        """
+        A method to return the spectrogram and spectral peaks of an audio, computing and caching them on a miss.
+
+        Parameters:
+            audio_path (String): relative/absolute path of a given audio.
+            stft (STFT): object used to compute the spectrogram of the audio.
+            peak_extractor (PeakExtractor): object used to extract spectral peaks from the spectrogram.
+            offset (float): an offset in seconds where reading the audio starts.
+            duration (float): duration of reading (in seconds).
+
+        Returns:
+            tuple : read only memory mapped spectrogram, (N, 2) int32 array of time sorted spectral peaks and the
+                array of magnitudes of the spectral peaks.
+
+        """
+        key = self.__key(audio_path=audio_path, stft=stft, peak_extractor=peak_extractor, offset=offset,
+                         duration=duration)
+        paths = [self.__path(key, name) for name in ("spectrogram", "peaks", "magnitudes")]
+        if all(os.path.exists(path) for path in paths):
+            self.hits += 1
+            for path in paths:
+                os.utime(path)
+            return (np.load(paths[0], mmap_mode='r'), np.load(paths[1]), np.load(paths[2]))
+        self.misses += 1
+        audio_data = self.__loader()(audio_path=audio_path, sr=stft.sr, offset=offset, duration=duration,
+                                     **self.load_audio_parameters)
+        spectrogram = stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data)
+        spectral_peaks, peak_magnitudes = peak_extractor.extract_spectral_peak_array(spectrogram=spectrogram,
+                                                                                     return_magnitudes=True)
+        for path, data in zip(paths, (spectrogram, spectral_peaks, peak_magnitudes)):
+            self.__save(path=path, data=data)
+        del spectrogram
+        spectrogram = np.load(paths[0], mmap_mode='r')
+        self.evict(keep=key)
+        return spectrogram, spectral_peaks, peak_magnitudes
+
+    def size(self):
+        """
+        A method to compute the size of the cache.
+
+        Returns:
+            int : Size of all cached files in bytes.
+
+        """
+        return sum(os.path.getsize(os.path.join(self.cache_dir, i)) for i in os.listdir(self.cache_dir)
+                   if i.endswith(".npy"))
+
+    def evict(self, keep=None):
+        """
+        A method to remove least recently used entries until the cache fits in its maximum size.
+
+        Parameters:
+            keep (String): Key of an entry which is never removed, such as the entry which was just added.
+
+        """
+        entries = dict()
+        kept_size = 0
+        for i in os.listdir(self.cache_dir):
+            if not i.endswith(".npy"):
+                continue
+            path = os.path.join(self.cache_dir, i)
+            status = os.stat(path)
+            key = i.split(".")[0]
+            if key == keep:
+                kept_size += status.st_size
+                continue
+            size, last_used, paths = entries.get(key, (0, 0, []))
+            entries[key] = (size + status.st_size, max(last_used, status.st_mtime), paths + [path])
+        total_size = sum(i[0] for i in entries.values()) + kept_size
+        for size, last_used, paths in sorted(entries.values(), key=lambda x: x[1]):
+            if total_size <= self.max_size:
+                break
+            for path in paths:
+                os.remove(path)
+            total_size -= size
+
+    def __key(self, audio_path, stft, peak_extractor, offset, duration):
+        """
+        A method to compute the cache key of the features of an audio.
+
+        Returns:
+            String : hex digest identifying the audio content and the feature parameters.
+
+        """
+        parameters = {
+            "audio": self.__content_hash(audio_path),
+            "loader": self.__loader_identity(),
+            "offset": offset,
+            "duration": duration,
+            "stft": [stft.n_fft, stft.hop_length, stft.sr, getattr(stft, "backend", "librosa")],
+            "peak_extractor": [peak_extractor.maximum_filter_height, peak_extractor.maximum_filter_width,
+                               peak_extractor.minimum_filter_height, peak_extractor.minimum_filter_width]
+        }
+        return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def __loader(self):
+        """
+        A method to return the function loading audio data.
+
+        """
+        if self.__load_audio is not None:
+            return self.__load_audio
+        from Utilities import audio_manager
+        return audio_manager.load_audio
+
+    def __loader_identity(self):
+        """
+        A method to describe the function loading audio data and all of its parameters, including the defaults of the
+        parameters which are not given, so that caches using different loaders never share features.
+
+        Returns:
+            List : name of the loader function, its positional arguments and its keyword arguments.
+
+        """
+        load_audio = self.__loader()
+        arguments = list()
+        parameters = dict(self.load_audio_parameters)
+        while isinstance(load_audio, functools.partial):
+            arguments = list(load_audio.args) + arguments
+            parameters = dict(load_audio.keywords, **parameters)
+            load_audio = load_audio.func
+        try:
+            defaults = {name: parameter.default for name, parameter in inspect.signature(load_audio).parameters.items()
+                        if parameter.default is not inspect.Parameter.empty}
+        except (TypeError, ValueError):
+            defaults = dict()
+        for name in ("audio_path", "sr", "offset", "duration"):
+            defaults.pop(name, None)
+        defaults.update(parameters)
+        name = getattr(load_audio, "__module__", "") + "." + getattr(load_audio, "__qualname__", repr(load_audio))
+        return [name, [repr(i) for i in arguments], {i: repr(j) for i, j in defaults.items()}]
+
+    def __content_hash(self, audio_path):
+        """
+        A method to hash the content of an audio file, hashes are remembered as long as the file is not modified.
+
+        Parameters:
+            audio_path (String): relative/absolute path of a given audio.
+
+        Returns:
+            String : hex digest of the content of the file.
+
+        """
+        status = os.stat(audio_path)
+        file_id = (os.path.abspath(audio_path), status.st_size, status.st_mtime_ns)
+        if file_id not in self.__content_hashes:
+            content_hash = hashlib.sha1()
+            with open(audio_path, "rb") as audio_file:
+                for chunk in iter(lambda: audio_file.read(2 ** 20), b""):
+                    content_hash.update(chunk)
+            self.__content_hashes[file_id] = content_hash.hexdigest()
+        return self.__content_hashes[file_id]
+
+    def __path(self, key, name):
+        """
+        A method to return the path of a cached array.
+
+        """
+        return os.path.join(self.cache_dir, key + "." + name + ".npy")
+
+    def __save(self, path, data):
+        """
+        A method to write an array to the cache, the file appears only once it is completely written.
+
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as cache_file:
+            np.save(cache_file, data)
+        os.replace(temporary_path, path)
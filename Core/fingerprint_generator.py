@@ -1,6 +1,49 @@
-from itertools import combinations
+from itertools import combinations, chain, repeat
 from bisect import bisect_left
-from heapq import nlargest
+from heapq import nlargest, heappush, heapreplace
+from functools import lru_cache
+
+import numpy as np
+
+# layout of a fingerprint when fingerprints are generated as a NumPy structured array, the hash followed by the raw
+# data (root peak A and peak B) associated with the hash.
+FINGERPRINT_DTYPE = np.dtype([('cx', np.float32), ('cy', np.float32), ('dx', np.float32), ('dy', np.float32),
+                              ('Ax', np.int32), ('Ay', np.int32), ('Bx', np.int32), ('By', np.int32)])
+
+
+# largest number of items whose combinations are cached, larger target zones compute them on every call so that
+# the cache stays within a few megabytes
+MAX_CACHED_COMBINATION_ITEMS = 64
+
+
+def __combination_indices__(n):
+    """
+    A function to compute index triples of all 3-combinations of n items.
+
+    """
+    count = n * (n - 1) * (n - 2) // 6
+    indices = np.fromiter(chain.from_iterable(combinations(range(n), 3)), dtype=np.int32, count=3 * count)
+    return indices.reshape(count, 3)
+
+
+__cached_combination_indices__ = lru_cache(maxsize=16)(__combination_indices__)
+
+
+def combination_indices(n):
+    """
+    A function to compute index triples of all 3-combinations of n items, in the same order as itertools.combinations.
+    Triples of up to MAX_CACHED_COMBINATION_ITEMS items are cached.
+
+    Parameters:
+        n (int): Number of items.
+
+    Returns:
+        numpy.ndarray: Array of shape (n choose 3, 3) holding the index triples.
+
+    """
+    if n > MAX_CACHED_COMBINATION_ITEMS:
+        return __combination_indices__(n)
+    return __cached_combination_indices__(n)
 
 
 class FingerprintGenerator(object):
@@ -16,11 +59,14 @@ class FingerprintGenerator(object):
         min_frame_number (int): Minimum frame number of assigned target zone.
         max_frame_number (int): Maximum frame number of the assigned target zone.
         number_of_quads_per_second (int): Number of quads per second.
+        vectorized (bool): Whether valid quads are enumerated with NumPy array operations.
+        budgeted (bool): Whether the strongest quads are searched directly with the per second budget.
+        output_format (String): Format of generated fingerprints, either "list" or "array".
 
     """
 
     def __init__(self, frames_per_second=219, target_zone_width=1, target_zone_center=4, number_of_quads_per_second=9,
-                 tolerance=0.31):
+                 tolerance=0.31, vectorized=False, budgeted=False, output_format="list"):
         """
         A constructor method for a class FingerprintGenerator.
 
@@ -29,6 +75,14 @@ class FingerprintGenerator(object):
             target_zone_width (int): Width of the target zone in seconds.
             target_zone_center (int): Center of the target zone in seconds.
             tolerance (float): Maximum allowed tolerance to modifications.
+            vectorized (bool): Whether valid quads are enumerated with NumPy array operations instead of pure Python
+                loops. Both modes return the same quads.
+            budgeted (bool): Whether the number_of_quads_per_second strongest quads of each second are searched
+                directly, pruning root peaks and C/D pairs that can not enter the budget instead of enumerating all
+                valid quads first.
+            output_format (String): Format of generated fingerprints. "list" returns a list of
+                [[cx, cy, dx, dy], [Ax, Ay, Bx, By]] lists, "array" returns a single NumPy structured array of
+                FINGERPRINT_DTYPE computed in one batch.
 
         """
         self.frames_per_second = frames_per_second
@@ -40,25 +94,48 @@ class FingerprintGenerator(object):
         self.max_frame_number = ((self.target_zone_center + self.target_zone_width / 2) * self.frames_per_second) / (
                 1 - self.tolerance)
         self.number_of_quads_per_second = number_of_quads_per_second
+        self.vectorized = vectorized
+        self.budgeted = budgeted
+        self.output_format = output_format
 
-    def generate_fingerprints(self, spectral_peaks, spectrogram):
+    def generate_fingerprints(self, spectral_peaks, spectrogram=None, peak_magnitudes=None):
         """
-        A method to generate audio fingerprints using the association of four spectral peaks.
+        A method to generate audio fingerprints using the association of four spectral peaks. Quads are ranked
+        either from the spectrogram or, when given, from the magnitudes of the spectral peaks, in which case the
+        spectrogram is not needed and can be released right after peak extraction.
 
         Parameters:
-            spectral_peaks (List): List of spectral peaks extracted from STFT based spectrogram of an audio.
+            spectral_peaks (List or numpy.ndarray): List or (N, 2) array of time sorted spectral peaks extracted from
+                STFT based spectrogram of an audio.
             spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            peak_magnitudes (List): Magnitude of each spectral peak, as returned by
+                PeakExtractor.extract_spectral_peaks(return_magnitudes=True).
 
         Returns:
-            List: List of audio fingerprints.
+            List: List of audio fingerprints, or a numpy.ndarray of FINGERPRINT_DTYPE if output_format is "array".
 
         """
-        # extracting valid quads.
-        valid_quads = self.__validate_quads(spectral_peaks=spectral_peaks)
-        # strong quads per second audio.
-        strong_quads = self.__strongest_quads(spectrogram=spectrogram, quads=valid_quads)
+        if isinstance(spectral_peaks, np.ndarray):
+            # peaks as tuples of NumPy integers, the same as the ones of PeakExtractor.extract_spectral_peaks
+            spectral_peaks = list(map(tuple, spectral_peaks.astype(np.intp)))
+        if self.budgeted:
+            # strong quads per second audio, searched within the budget.
+            strong_quads = self.__budgeted_strongest_quads(spectral_peaks=spectral_peaks, spectrogram=spectrogram,
+                                                           peak_magnitudes=peak_magnitudes)
+        else:
+            # extracting valid quads.
+            if self.vectorized:
+                valid_quads = self.__validate_quads_vectorized(spectral_peaks=spectral_peaks)
+            else:
+                valid_quads = self.__validate_quads(spectral_peaks=spectral_peaks)
+            # strong quads per second audio.
+            strong_quads = self.__strongest_quads(spectrogram=spectrogram, quads=valid_quads,
+                                                  spectral_peaks=spectral_peaks, peak_magnitudes=peak_magnitudes)
         # audio fingerprints extracted using the association of four spectral peaks.
-        audio_fingerprints = self.__hash_quads(strong_quads=strong_quads)
+        if self.output_format == "array":
+            audio_fingerprints = self.__hash_quads_array(strong_quads=strong_quads)
+        else:
+            audio_fingerprints = self.__hash_quads(strong_quads=strong_quads)
         return audio_fingerprints
 
     def __validate_quads(self, spectral_peaks):
@@ -95,21 +172,188 @@ class FingerprintGenerator(object):
                     valid_quads.append((a,) + j)
         return valid_quads
 
-    def __strongest_quads(self, spectrogram, quads):
+    def __validate_quads_vectorized(self, spectral_peaks):
+        """
+        A method to extract valid quads per root peak using NumPy array operations. Target zones are located with
+        a binary search over the time sorted peaks and the quad conditions are applied as array masks, the returned
+        quads are the same (and in the same order) as the ones returned by __validate_quads.
+
+        Parameters:
+            spectral_peaks (List): List of spectral peaks sorted by time.
+
+        Returns:
+            List : List of all valid quads.
+
+        """
+        valid_quads = list()
+        if len(spectral_peaks) == 0:
+            return valid_quads
+        peaks = np.asarray(spectral_peaks)
+        times = peaks[:, 0]
+        freqs = peaks[:, 1]
+        zone_starts, zone_ends = self.__target_zones(times=times)
+        for i in range(len(spectral_peaks)):
+            zone = np.arange(zone_starts[i], zone_ends[i])
+            # C, D and B should all be above the root peak (A) in pitch
+            zone = zone[freqs[zone] > freqs[i]]
+            if len(zone) < 3:
+                continue
+            triples = zone[combination_indices(len(zone))]
+            c_freqs = freqs[triples[:, 0]]
+            d_freqs = freqs[triples[:, 1]]
+            b_freqs = freqs[triples[:, 2]]
+            # Checking for conditions Cy<By and Dy<=By
+            triples = triples[(c_freqs < b_freqs) & (d_freqs <= b_freqs)]
+            peak = spectral_peaks.__getitem__
+            valid_quads += zip(repeat(spectral_peaks[i], len(triples)), map(peak, triples[:, 0].tolist()),
+                               map(peak, triples[:, 1].tolist()), map(peak, triples[:, 2].tolist()))
+        return valid_quads
+
+    def __target_zones(self, times):
+        """
+        A method to locate the target zone of each root peak.
+
+        Parameters:
+            times (numpy.ndarray): Time sorted frame numbers of spectral peaks.
+
+        Returns:
+            tuple : Start (inclusive) and end (exclusive) index of the target zone of each spectral peak.
+
+        """
+        zone_starts = np.searchsorted(times, times + self.min_frame_number, side='left')
+        zone_ends = np.searchsorted(times, times + self.max_frame_number, side='right')
+        return zone_starts, zone_ends
+
+    def __budgeted_strongest_quads(self, spectral_peaks, spectrogram, peak_magnitudes):
+        """
+        A method to return n strongest quads per second without enumerating every valid quad. Where n is passed as
+        number of quads per second. Quads are ranked by the magnitude of their C and D peaks, root peaks of a second
+        are expanded strongest first and the expansion stops as soon as no remaining root peak or C/D pair can beat
+        the weakest quad kept so far, so the work done scales with the budget instead of the number of valid quads.
+        Seconds are partitioned like __find_partitions does, the last partial second is merged into the previous one
+        and no quads are kept if the last valid quad starts within the first second, so the kept quads have the same
+        strengths as the ones of __strongest_quads. Among quads of equal strength, different quads may be kept, and in
+        a different order.
+
+        Parameters:
+            spectral_peaks (List): List of spectral peaks sorted by time.
+            spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            peak_magnitudes (List): Magnitude of each spectral peak, used instead of the spectrogram if given.
+
+        Returns:
+            List: list of strongest quads.
+
+        """
+        strong_quads = list()
+        if len(spectral_peaks) == 0:
+            return strong_quads
+        budget = self.number_of_quads_per_second
+        peaks = np.asarray(spectral_peaks)
+        times = peaks[:, 0]
+        freqs = peaks[:, 1]
+        if peak_magnitudes is not None:
+            magnitudes = np.asarray(peak_magnitudes)
+        else:
+            magnitudes = spectrogram[freqs, times]
+        zone_starts, zone_ends = self.__target_zones(times=times)
+        # second of the last root peak having a valid quad, which __find_partitions merges with the partial second
+        last_partition = -1
+        for i in range(len(spectral_peaks) - 1, -1, -1):
+            if self.__has_valid_quad(freqs=freqs, zone=np.arange(zone_starts[i], zone_ends[i]), root=i):
+                last_partition = times[i] // self.frames_per_second - 1
+                break
+        if last_partition < 0:
+            return strong_quads
+        partition_ids = np.minimum(times // self.frames_per_second, last_partition)
+        partition_starts = np.flatnonzero(np.diff(partition_ids)) + 1
+        for roots in np.split(np.arange(len(spectral_peaks)), partition_starts):
+            zones = list()
+            bounds = list()
+            for i in roots:
+                zone = np.arange(zone_starts[i], zone_ends[i])
+                # C, D and B should all be above the root peak (A) in pitch
+                zone = zone[freqs[zone] > freqs[i]]
+                if len(zone) < 3:
+                    continue
+                # no quad of this root peak can be stronger than its two strongest peaks
+                zones.append((i, zone))
+                bounds.append(-np.sum(np.partition(magnitudes[zone], len(zone) - 2)[-2:]))
+            heap = list()
+            sequence = 0
+            for k in np.argsort(bounds, kind='stable'):
+                if len(heap) == budget and -bounds[k] <= heap[0][0]:
+                    break
+                i, zone = zones[k]
+                zone_freqs = freqs[zone]
+                # highest pitch after each position of the target zone, a candidate for B
+                b_freqs = np.maximum.accumulate(zone_freqs[::-1])[::-1]
+                b_freqs = np.append(b_freqs[1:], -1)
+                c, d = np.triu_indices(len(zone), 1)
+                # a C/D pair is expandable if there is a B with Cy<By and Dy<=By after D
+                pairs = (zone_freqs[c] < b_freqs[d]) & (zone_freqs[d] <= b_freqs[d])
+                c = c[pairs]
+                d = d[pairs]
+                scores = magnitudes[zone[c]] + magnitudes[zone[d]]
+                for p in np.argsort(-scores, kind='stable'):
+                    score = scores[p]
+                    if len(heap) == budget and score <= heap[0][0]:
+                        break
+                    c_freq = zone_freqs[c[p]]
+                    d_freq = zone_freqs[d[p]]
+                    for b in range(d[p] + 1, len(zone)):
+                        if not c_freq < zone_freqs[b] >= d_freq:
+                            continue
+                        sequence += 1
+                        item = (score, -sequence, (spectral_peaks[i], spectral_peaks[zone[c[p]]],
+                                                   spectral_peaks[zone[d[p]]], spectral_peaks[zone[b]]))
+                        if len(heap) < budget:
+                            heappush(heap, item)
+                        elif item[:2] > heap[0][:2]:
+                            heapreplace(heap, item)
+                        else:
+                            break
+            strong_quads += [item[2] for item in sorted(heap, key=lambda x: x[:2], reverse=True)]
+        return strong_quads
+
+    @staticmethod
+    def __has_valid_quad(freqs, zone, root):
+        """
+        A method to check whether a root peak has at least one valid quad in its target zone.
+
+        """
+        zone_freqs = freqs[zone]
+        zone_freqs = zone_freqs[zone_freqs > freqs[root]]
+        if len(zone_freqs) < 3:
+            return False
+        # highest pitch after each position, a candidate for B
+        b_freqs = np.maximum.accumulate(zone_freqs[::-1])[::-1][1:]
+        # a C/D pair followed by a B with Cy<By and Dy<=By, the lowest C before each D is the best choice for C
+        c_freqs = np.minimum.accumulate(zone_freqs)[:-2]
+        return bool(np.any((c_freqs < b_freqs[1:]) & (zone_freqs[1:-1] <= b_freqs[1:])))
+
+    def __strongest_quads(self, spectrogram, quads, spectral_peaks=None, peak_magnitudes=None):
         """
         A method to return n number of strong quads per second. Where n is passed as number of quads per second.
 
         Parameters:
             spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
             quads (List) : All valid quads from spectral peaks of an audio.
+            spectral_peaks (List): List of spectral peaks the quads are formed from.
+            peak_magnitudes (List): Magnitude of each spectral peak, used instead of the spectrogram if given.
 
         Returns:
             List: list of strongest quads.
 
         """
         strong_quads = []
+        if len(quads) == 0:
+            return strong_quads
         partitions = self.__find_partitions(quads)
-        key = lambda p: (spectrogram[p[1][1]][p[1][0]] + spectrogram[p[2][1]][p[2][0]])
+        if peak_magnitudes is not None:
+            magnitude = dict(zip(map(tuple, spectral_peaks), peak_magnitudes))
+            key = lambda p: (magnitude[p[1]] + magnitude[p[2]])
+        else:
+            key = lambda p: (spectrogram[p[1][1]][p[1][0]] + spectrogram[p[2][1]][p[2][0]])
         for i in range(1, len(partitions)):
             start = partitions[i - 1]
             end = partitions[i]
@@ -168,3 +412,35 @@ class FingerprintGenerator(object):
             if cx_new > (self.min_frame_number / self.max_frame_number) - 0.02:
                 audio_fingerprints.append([[cx_new, cy_new, dx_new, dy_new], [a[0], a[1], b[0], b[1]]])
         return audio_fingerprints
+
+    def __hash_quads_array(self, strong_quads):
+        """
+        A method to hash strong quads into distortion invariant audio fingerprints in a single batch. The ratios,
+        rounding and filtering are the same as in __hash_quads but computed over arrays, hashes are stored as float32
+        and peak coordinates as int32.
+
+        Parameters:
+            strong_quads (List): List of strong quads.
+
+        Returns:
+            numpy.ndarray : Structured array of FINGERPRINT_DTYPE, one record per audio fingerprint.
+        """
+        quads = np.asarray(strong_quads, dtype=np.float64).reshape(-1, 4, 2)
+        a = quads[:, 0]  # root peak (A), where a[:, 0] tempo info and a[:, 1] pitch info.
+        c = quads[:, 1]  # C
+        d = quads[:, 2]  # D
+        b = quads[:, 3]  # B
+        # tempo and pitch differences between the root peak (A) and B.
+        delta = b - a
+        hashes = np.empty((len(quads), 4))
+        hashes[:, 0:2] = (c - a) / delta
+        hashes[:, 2:4] = (d - a) / delta
+        hashes = np.round(hashes, 3)
+        # filtering fingerprints based on the new value of cx
+        keep = hashes[:, 0] > (self.min_frame_number / self.max_frame_number) - 0.02
+        audio_fingerprints = np.empty(np.count_nonzero(keep), dtype=FINGERPRINT_DTYPE)
+        for i, name in enumerate(('cx', 'cy', 'dx', 'dy')):
+            audio_fingerprints[name] = hashes[keep, i]
+        for i, name in enumerate(('Ax', 'Ay', 'Bx', 'By')):
+            audio_fingerprints[name] = quads[keep, 3 * (i // 2), i % 2]
+        return audio_fingerprints
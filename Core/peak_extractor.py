@@ -1,6 +1,7 @@
 import numpy as np
 from operator import itemgetter
 from scipy.ndimage import maximum_filter
+from scipy.ndimage import maximum_filter1d
 from scipy.ndimage import minimum_filter
 
 
@@ -32,15 +33,21 @@ class PeakExtractor(object):
         self.minimum_filter_height = minimum_filter_height
         self.minimum_filter_width = minimum_filter_width
 
-    def extract_spectral_peaks(self, spectrogram):
+    def extract_spectral_peaks(self, spectrogram, return_magnitudes=False):
         """
-        A method to extract spectral peaks given the spectrogram of an audio.
+        A method to extract spectral peaks given the spectrogram of an audio. Peaks of the same frame used to be left
+        in the iteration order of a set, fingerprints of such frames stored before they were sorted by frequency may
+        differ from the ones generated now, so those databases should be re-ingested.
 
         Parameters:
             spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            return_magnitudes (bool): Whether to also return the magnitude of each spectral peak, which allows
+                fingerprints to be generated without keeping the spectrogram.
 
         Returns:
-            List : list of spectral peaks.
+            tuple : list of spectral peaks sorted by time and then by frequency, time indices and frequency indices of
+                the sorted peaks, followed by the list of magnitudes of the sorted spectral peaks if return_magnitudes
+                is True.
         """
         # computing local maximum points with the specified maximum filter dimension
         local_max_values = maximum_filter(input=spectrogram, size=(self.maximum_filter_height,
@@ -56,8 +63,177 @@ class PeakExtractor(object):
         lows = list(zip(m, k))
         # avoiding spectral points with are both local maximum and local minimum
         spectral_peaks = list(set(peaks) - set(lows))
+        # peaks of the same frame are sorted by frequency too, instead of being left in the iteration order of the set
+        spectral_peaks.sort(key=itemgetter(0, 1))
         # time and frequency information for extracted spectral peaks
         time_indices = [i[0] for i in spectral_peaks]
         freq_indices = [i[1] for i in spectral_peaks]
-        spectral_peaks.sort(key=itemgetter(0))
+        if return_magnitudes:
+            peak_magnitudes = [spectrogram[i[1]][i[0]] for i in spectral_peaks]
+            return spectral_peaks, time_indices, freq_indices, peak_magnitudes
         return spectral_peaks, time_indices, freq_indices
+
+    def extract_spectral_peak_array(self, spectrogram, return_magnitudes=False):
+        """
+        A method to extract spectral peaks given the spectrogram of an audio, returning them as an array. The local
+        maximum and minimum masks are combined with boolean array operations instead of Python sets and the large
+        maximum filter is applied as two one dimensional sliding window filters. The extracted peaks, their order (by
+        time and then by frequency) and so the generated fingerprints are the same as the ones of
+        extract_spectral_peaks, which makes it a drop-in replacement. The spectrogram can be float32 or float64.
+
+        Parameters:
+            spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            return_magnitudes (bool): Whether to also return the magnitude of each spectral peak.
+
+        Returns:
+            numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks sorted by time, followed by the
+                array of magnitudes of the spectral peaks if return_magnitudes is True.
+        """
+        spectral_peaks, peak_magnitudes = self.__peak_array(spectrogram=spectrogram,
+                                                            maximum_filter_height=self.maximum_filter_height,
+                                                            maximum_filter_width=self.maximum_filter_width)
+        if return_magnitudes:
+            return spectral_peaks, peak_magnitudes
+        return spectral_peaks
+
+    def extract_spectral_peak_arrays(self, spectrograms, return_magnitudes=False):
+        """
+        A method to extract spectral peaks from a stack of equal sized spectrograms at once, as computed by
+        STFT.compute_batch_spectrogram_magnitude_in_db. The filters and masks run over the whole stack, the peaks of
+        each spectrogram are the same as the ones returned by extract_spectral_peak_array.
+
+        Parameters:
+            spectrograms (numpy.ndarray): (clips, frequency, time) array of spectrograms.
+            return_magnitudes (bool): Whether to also return the magnitudes of the spectral peaks.
+
+        Returns:
+            List : (N, 2) int32 array of (time, frequency) spectral peaks sorted by time for each spectrogram, followed
+                by the list of arrays of magnitudes of the spectral peaks if return_magnitudes is True.
+        """
+        peaks = self.__peak_mask(spectrogram=spectrograms, maximum_filter_height=self.maximum_filter_height,
+                                 maximum_filter_width=self.maximum_filter_width)
+        # swapping the last two axes orders the peaks by clip, then by time and then by frequency
+        clip_indices, time_indices, freq_indices = np.nonzero(np.swapaxes(peaks, 1, 2))
+        spectral_peaks = np.empty((len(time_indices), 2), dtype=np.int32)
+        spectral_peaks[:, 0] = time_indices
+        spectral_peaks[:, 1] = freq_indices
+        clip_starts = np.searchsorted(clip_indices, np.arange(1, len(spectrograms)))
+        spectral_peaks = np.split(spectral_peaks, clip_starts)
+        if return_magnitudes:
+            peak_magnitudes = np.split(spectrograms[clip_indices, freq_indices, time_indices], clip_starts)
+            return spectral_peaks, peak_magnitudes
+        return spectral_peaks
+
+    def extract_spectral_peaks_adaptive(self, spectrogram, peaks_per_second=(10, 30), frames_per_second=219,
+                                        block_duration=1):
+        """
+        A method to extract spectral peaks while keeping the number of peaks per second of each time block within a
+        target range. Blocks with too few peaks take their peaks from a finer maximum filter (the filter size is
+        halved until the block reaches the minimum density or the filter can not be made smaller) and blocks with
+        too many peaks keep only their strongest peaks, which bounds the cost of generating fingerprints from them.
+
+        Parameters:
+            spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            peaks_per_second (tuple): Minimum and maximum number of spectral peaks per second.
+            frames_per_second (int): Number of frames per second.
+            block_duration (float): Duration of a time block in seconds.
+
+        Returns:
+            tuple : (N, 2) int32 array of (time, frequency) spectral peaks sorted by time, the array of magnitudes of
+                the spectral peaks and the achieved number of peaks per second of each time block.
+        """
+        block_frames = max(1, int(round(block_duration * frames_per_second)))
+        number_of_blocks = -(-spectrogram.shape[1] // block_frames)
+        if number_of_blocks == 0:
+            return np.empty((0, 2), dtype=np.int32), np.empty(0, dtype=spectrogram.dtype), np.empty(0)
+        # duration of each time block, the last block may be shorter than the others
+        block_durations = np.full(number_of_blocks, block_frames / frames_per_second)
+        block_durations[-1] = (spectrogram.shape[1] - (number_of_blocks - 1) * block_frames) / frames_per_second
+        min_counts = peaks_per_second[0] * block_durations
+        max_counts = np.floor(peaks_per_second[1] * block_durations)
+        maximum_filter_height = self.maximum_filter_height
+        maximum_filter_width = self.maximum_filter_width
+        selected_peaks = list()
+        selected_magnitudes = list()
+        # blocks which did not reach the minimum density yet
+        pending = np.ones(number_of_blocks, dtype=bool)
+        while True:
+            spectral_peaks, peak_magnitudes = self.__peak_array(spectrogram=spectrogram,
+                                                                maximum_filter_height=maximum_filter_height,
+                                                                maximum_filter_width=maximum_filter_width)
+            block_ids = spectral_peaks[:, 0] // block_frames
+            counts = np.bincount(block_ids, minlength=number_of_blocks)
+            finest = maximum_filter_height <= self.minimum_filter_height and \
+                maximum_filter_width <= self.minimum_filter_width
+            # blocks settled by this filter size
+            settled = pending & ((counts >= min_counts) | finest)
+            keep = settled[block_ids]
+            selected_peaks.append(spectral_peaks[keep])
+            selected_magnitudes.append(peak_magnitudes[keep])
+            pending &= ~settled
+            if not pending.any():
+                break
+            maximum_filter_height = max(self.minimum_filter_height, maximum_filter_height // 2)
+            maximum_filter_width = max(self.minimum_filter_width, maximum_filter_width // 2)
+        spectral_peaks = np.concatenate(selected_peaks)
+        peak_magnitudes = np.concatenate(selected_magnitudes)
+        block_ids = spectral_peaks[:, 0] // block_frames
+        # ranking the peaks of each block by magnitude and keeping the strongest ones
+        order = np.lexsort((-peak_magnitudes, block_ids))
+        block_starts = np.searchsorted(block_ids[order], np.arange(number_of_blocks))
+        ranks = np.empty(len(order), dtype=np.intp)
+        ranks[order] = np.arange(len(order)) - block_starts[block_ids[order]]
+        keep = ranks < max_counts[block_ids]
+        spectral_peaks = spectral_peaks[keep]
+        peak_magnitudes = peak_magnitudes[keep]
+        # restoring the time and frequency order
+        order = np.lexsort((spectral_peaks[:, 1], spectral_peaks[:, 0]))
+        spectral_peaks = spectral_peaks[order]
+        peak_magnitudes = peak_magnitudes[order]
+        # achieved density
+        peak_density = np.bincount(spectral_peaks[:, 0] // block_frames, minlength=number_of_blocks) / block_durations
+        return spectral_peaks, peak_magnitudes, peak_density
+
+    def __peak_array(self, spectrogram, maximum_filter_height, maximum_filter_width):
+        """
+        A method to extract time sorted spectral peaks and their magnitudes with a given maximum filter dimension.
+
+        Parameters:
+            spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            maximum_filter_height (int): Height of the maximum filter.
+            maximum_filter_width (int): Width of the maximum filter.
+
+        Returns:
+            tuple : (N, 2) int32 array of (time, frequency) spectral peaks and the array of their magnitudes.
+        """
+        peaks = self.__peak_mask(spectrogram=spectrogram, maximum_filter_height=maximum_filter_height,
+                                 maximum_filter_width=maximum_filter_width)
+        # transposing the mask orders the peaks by time and then by frequency
+        time_indices, freq_indices = np.nonzero(peaks.T)
+        spectral_peaks = np.empty((len(time_indices), 2), dtype=np.int32)
+        spectral_peaks[:, 0] = time_indices
+        spectral_peaks[:, 1] = freq_indices
+        return spectral_peaks, spectrogram[freq_indices, time_indices]
+
+    def __peak_mask(self, spectrogram, maximum_filter_height, maximum_filter_width):
+        """
+        A method to mark the spectral peaks of a spectrogram, or of a stack of spectrograms with frequency and time as
+        the last two axes, with a given maximum filter dimension.
+
+        Parameters:
+            spectrogram (numpy.ndarray): Time-Frequency representation of an audio.
+            maximum_filter_height (int): Height of the maximum filter.
+            maximum_filter_width (int): Width of the maximum filter.
+
+        Returns:
+            numpy.ndarray : boolean array which is True at spectral peaks.
+        """
+        # computing local maximum points with the specified maximum filter dimension, one axis at a time
+        local_max_values = maximum_filter1d(input=spectrogram, size=maximum_filter_height, axis=-2)
+        local_max_values = maximum_filter1d(input=local_max_values, size=maximum_filter_width, axis=-1)
+        peaks = spectrogram == local_max_values
+        del local_max_values
+        # avoiding spectral points which are both local maximum and local minimum, stacked spectrograms are not mixed
+        minimum_filter_size = (1,) * (spectrogram.ndim - 2) + (self.minimum_filter_height, self.minimum_filter_width)
+        peaks &= spectrogram != minimum_filter(input=spectrogram, size=minimum_filter_size)
+        return peaks
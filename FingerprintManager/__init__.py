@@ -1 +1,7 @@
 from FingerprintManager.fingerprint_manager import FingerprintManager
+from FingerprintManager.ingest_pipeline import IngestPipeline
+from FingerprintManager.hash_index import HashIndex, KDTreeHashIndex, GridHashIndex
+from FingerprintManager.candidate_aggregator import StreamingAggregator
+from FingerprintManager.peak_cache import PeakCache
+from FingerprintManager.query_batcher import QueryBatcher
+from FingerprintManager.identification_service import IdentificationService
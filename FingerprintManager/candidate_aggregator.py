@@ -0,0 +1,155 @@
+import numpy as np
+
+
+class StreamingAggregator(object):
+    """
+    A class to aggregate filtered candidates into (audio id, time bin) groups as they arrive, keeping a running count
+    and running means and sums of squared deviations of the scale factors of each bin (Welford's method, merged batch
+    by batch with Chan's formula) instead of the candidates themselves. Memory is bounded by the number of active bins,
+    and the aggregation stops as soon as the number of bins goes beyond a cap, which happens for noisy or silent
+    queries matching many common hashes. Bins are ranked by number of candidates since the 2 standard deviation
+    inliers of aggregate_candidates can't be counted without the candidates.
+
+    Attributes:
+        bin_width (int): Width of a time bin.
+        ts (int): Minimum number of candidates of a reported bin.
+        max_bins (int): Maximum number of active bins, there is no limit if None.
+        candidates (int): Number of candidates aggregated so far.
+        ambiguous (bool): Whether the aggregation stopped because there were too many bins.
+
+    """
+
+    def __init__(self, bin_width=20, ts=4, max_bins=None):
+        """
+        A constructor method for StreamingAggregator class.
+
+        Parameters:
+            bin_width (int): Width of a time bin.
+            ts (int): Minimum number of candidates of a reported bin.
+            max_bins (int): Maximum number of active bins, there is no limit if None.
+
+        """
+        self.bin_width = bin_width
+        self.ts = ts
+        self.max_bins = max_bins
+        self.candidates = 0
+        self.ambiguous = False
+        self.__slots = dict()
+        self.__keys = np.empty((0, 2), dtype=np.int64)
+        self.__counts = np.empty(0, dtype=np.int64)
+        self.__means = np.empty((0, 2))
+        self.__squares = np.empty((0, 2))
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def update(self, audio_ids, offsets, s_times, s_freqs):
+        """
+        A method to add a batch of filtered candidates to the running statistics of their bins.
+
+        Parameters:
+            audio_ids (numpy.ndarray): audio id of each candidate.
+            offsets (numpy.ndarray): rough offset of each candidate.
+            s_times (numpy.ndarray): sTime of each candidate.
+            s_freqs (numpy.ndarray): sFreq of each candidate.
+
+        Returns:
+            bool : False if the number of bins went beyond the cap, the candidates are then ignored from now on.
+
+        """
+        if self.ambiguous:
+            return False
+        if len(audio_ids) == 0:
+            return True
+        keys = np.column_stack((audio_ids, np.floor(np.asarray(offsets) / self.bin_width) * self.bin_width))
+        keys = keys.astype(np.int64)
+        scales = np.column_stack((s_times, s_freqs)).astype(np.float64)
+        # statistics of the bins of the batch, bins are numbered in order of their first candidate
+        unique_keys, first_indices, group_ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        order = np.argsort(first_indices, kind='stable')
+        ranks = np.empty(len(order), dtype=np.intp)
+        ranks[order] = np.arange(len(order))
+        group_ids = ranks[group_ids]
+        unique_keys = unique_keys[order]
+        counts = np.bincount(group_ids, minlength=len(unique_keys))
+        means = np.stack([np.bincount(group_ids, weights=scales[:, i], minlength=len(unique_keys))
+                          for i in range(2)], axis=1) / counts[:, np.newaxis]
+        deviations = scales - means[group_ids]
+        squares = np.stack([np.bincount(group_ids, weights=deviations[:, i] ** 2, minlength=len(unique_keys))
+                            for i in range(2)], axis=1)
+        # slots of the bins in the running statistics
+        slots = np.array([self.__slots.setdefault(i, len(self.__slots)) for i in map(tuple, unique_keys.tolist())],
+                         dtype=np.intp)
+        if self.max_bins is not None and len(self.__slots) > self.max_bins:
+            self.ambiguous = True
+            self.__release()
+            return False
+        self.__grow(unique_keys=unique_keys, slots=slots)
+        # merging the statistics of the batch into the running statistics
+        running_counts = self.__counts[slots]
+        total_counts = running_counts + counts
+        delta = means - self.__means[slots]
+        self.__means[slots] += delta * (counts / total_counts)[:, np.newaxis]
+        self.__squares[slots] += squares + delta ** 2 * (running_counts * counts / total_counts)[:, np.newaxis]
+        self.__counts[slots] = total_counts
+        self.candidates += len(keys)
+        return True
+
+    def results(self, top_k=None):
+        """
+        A method to rank the bins by number of candidates.
+
+        Parameters:
+            top_k (int): Number of best bins returned, all bins if None.
+
+        Returns:
+            List : [audio id, offset, sTime, sFreq, number of candidates] of the best bins with at least ts candidates,
+                sorted by number of candidates.
+
+        """
+        counts = self.__counts[:len(self)]
+        selected = np.flatnonzero(counts >= self.ts)
+        if top_k is not None and top_k < len(selected):
+            # keeping the bins with at least as many candidates as the k-th best bin, without sorting all bins
+            best = np.argpartition(-counts[selected], top_k - 1)[:top_k]
+            selected = selected[counts[selected] >= counts[selected[best]].min()]
+        # ties are ranked by the first candidate of the bin
+        selected = selected[np.lexsort((selected, -counts[selected]))][:top_k]
+        return [[int(self.__keys[i, 0]), int(self.__keys[i, 1]), float(self.__means[i, 0]), float(self.__means[i, 1]),
+                 int(self.__counts[i])] for i in selected.tolist()]
+
+    def standard_deviations(self):
+        """
+        A method to compute the standard deviations of the scale factors of each bin.
+
+        Returns:
+            numpy.ndarray : (bins, 2) standard deviations of sTime and sFreq, in the order bins first appeared.
+
+        """
+        return np.sqrt(self.__squares[:len(self)] / self.__counts[:len(self), np.newaxis])
+
+    def __grow(self, unique_keys, slots):
+        """
+        A method to make room for the statistics of new bins, doubling the capacity when needed.
+
+        """
+        size = len(self.__slots)
+        if size > len(self.__counts):
+            capacity = max(size, 2 * len(self.__counts), 64)
+            self.__keys = np.resize(self.__keys, (capacity, 2))
+            self.__counts = np.concatenate((self.__counts, np.zeros(capacity - len(self.__counts), dtype=np.int64)))
+            self.__means = np.concatenate((self.__means, np.zeros((capacity - len(self.__means), 2))))
+            self.__squares = np.concatenate((self.__squares, np.zeros((capacity - len(self.__squares), 2))))
+        self.__keys[slots] = unique_keys
+
+    def __release(self):
+        """
+        A method to drop the running statistics once the aggregation stopped.
+
+        """
+        self.__slots = dict()
+        self.__keys = np.empty((0, 2), dtype=np.int64)
+        self.__counts = np.empty(0, dtype=np.int64)
+        self.__means = np.empty((0, 2))
+        self.__squares = np.empty((0, 2))
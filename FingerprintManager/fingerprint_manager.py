@@ -1,11 +1,25 @@
 import math
 import operator
+import os
 import sqlite3
-from bisect import bisect_left, bisect_right
+import threading
+import time
 from collections import defaultdict
+from contextlib import contextmanager
+from itertools import groupby
+from urllib.request import pathname2url
 
 import numpy as np
 
+from FingerprintManager.candidate_aggregator import StreamingAggregator
+from FingerprintManager.hash_index import HASH_INDEXES
+from FingerprintManager.peak_cache import PeakCache
+from FingerprintManager.query_batcher import QueryBatcher
+
+
+# number of frames of a time block of encoded spectral peaks
+PEAK_BLOCK_LENGTH = 3750
+
 
 def __create_tables__(conn):
     """
@@ -40,9 +54,37 @@ def __create_tables__(conn):
                 IF NOT EXISTS Peaks(
                     audio_id INTEGER, Px INTEGER, Py INTEGER,
                     PRIMARY KEY(audio_id, Px, Py),
+                    FOREIGN KEY(audio_id) REFERENCES Audios(id));
+                CREATE TABLE
+                IF NOT EXISTS PeakBlocks(
+                    audio_id INTEGER, block INTEGER,
+                    item_size INTEGER, data BLOB,
+                    PRIMARY KEY(audio_id, block),
                     FOREIGN KEY(audio_id) REFERENCES Audios(id));""")
 
 
+def iterate_fingerprints(audio_fingerprints):
+    """
+    A function to iterate over audio fingerprints as (hash, raw data) pairs. Fingerprints can either be a list of
+    [[cx, cy, dx, dy], [Ax, Ay, Bx, By]] items or a NumPy structured array with cx, cy, dx, dy, Ax, Ay, Bx and By
+    fields, in which case each column is converted once instead of each record separately.
+
+    Parameters:
+        audio_fingerprints (List or numpy.ndarray): Audio fingerprints.
+
+    Returns:
+        iterator : (hash, raw data) pair of each audio fingerprint.
+
+    """
+    if isinstance(audio_fingerprints, np.ndarray):
+        hashes = zip(audio_fingerprints['cx'].tolist(), audio_fingerprints['cy'].tolist(),
+                     audio_fingerprints['dx'].tolist(), audio_fingerprints['dy'].tolist())
+        quads = zip(audio_fingerprints['Ax'].tolist(), audio_fingerprints['Ay'].tolist(),
+                    audio_fingerprints['Bx'].tolist(), audio_fingerprints['By'].tolist())
+        return zip(hashes, quads)
+    return ((i[0], i[1]) for i in audio_fingerprints)
+
+
 def store_audio(cursor, audio_title):
     """
     A function to store an audio record into the database.
@@ -123,6 +165,44 @@ def find_hash(cursor, hash_value, e=0.01):
                     hash_value[3] - e, hash_value[3] + e))
 
 
+def find_hash_batch(cursor, hash_values, e=0.01):
+    """
+    A function to retrieve the matching hashes of many query hashes with a single query. The look up boxes of all
+    hashes are loaded into a temporary table which drives a join against the r-tree, each returned row is tagged with
+    the index of the query hash it matches and rows are ordered by that index and then by hash id. The rows of each
+    query hash are the ones find_hash returns for it, ordered by hash id like the ones of the in-memory hash indexes
+    (find_hash leaves them in the traversal order of the r-tree), so candidates tie the same way with every backend.
+
+    Parameters:
+        cursor : The current cursor of the database.
+        hash_values (List): Hashes extracted from a query audio.
+        e (float): A look up radius for the r-tree.
+
+    """
+    cursor.execute("""CREATE TEMP TABLE
+                   IF NOT EXISTS QueryHashes(
+                       idx INTEGER PRIMARY KEY,
+                       minCx REAL, maxCx REAL,
+                       minCy REAL, maxCy REAL,
+                       minDx REAL, maxDx REAL,
+                       minDy REAL, maxDy REAL)""")
+    cursor.execute("""DELETE FROM QueryHashes""")
+    cursor.executemany("""INSERT INTO QueryHashes VALUES (?,?,?,?,?,?,?,?,?)""",
+                       ((idx, hash_value[0] - e, hash_value[0] + e,
+                         hash_value[1] - e, hash_value[1] + e,
+                         hash_value[2] - e, hash_value[2] + e,
+                         hash_value[3] - e, hash_value[3] + e) for idx, hash_value in enumerate(hash_values)))
+    # CROSS JOIN keeps the query hashes as the outer loop, so the r-tree is searched once per query hash
+    cursor.execute("""SELECT QueryHashes.idx,Quads.Ax,Quads.Ay,Quads.Bx,Quads.By,Quads.audio_id
+                   FROM QueryHashes CROSS JOIN Hashes CROSS JOIN Quads
+                  WHERE Hashes.minNewCx >= QueryHashes.minCx AND Hashes.maxNewCx <= QueryHashes.maxCx
+                    AND Hashes.minNewCy >= QueryHashes.minCy AND Hashes.maxNewCy <= QueryHashes.maxCy
+                    AND Hashes.minNewDx >= QueryHashes.minDx AND Hashes.maxNewDx <= QueryHashes.maxDx
+                    AND Hashes.minNewDy >= QueryHashes.minDy AND Hashes.maxNewDy <= QueryHashes.maxDy
+                    AND Quads.hash_id = Hashes.id
+                  ORDER BY QueryHashes.idx, Hashes.id""")
+
+
 def store_quads(cursor, quad, audio_id):
     """
     A function to store raw data associated with each hash to reference fingerprint database. This data will be used
@@ -198,6 +278,76 @@ def filter_candidates(cursor, query_quad, filtered, tolerance=0.31, e_fine=1.8):
         filtered[reference_quad[4]].append((offset, (sTime, sFreq)))
 
 
+def filter_candidates_batch(cursor, query_quads, filtered, tolerance=0.31, e_fine=1.8):
+    """
+    A function to filter the candidates returned by find_hash_batch in one pass, the rows of each query hash are
+    filtered against the raw data of that query hash the same way filter_candidates does.
+
+    Parameters:
+        cursor : The current cursor of the database, holding the result of find_hash_batch.
+        query_quads (List): Raw data of each query hash, in the order the hashes were looked up.
+        filtered (dict): Rough offsets and scale factors of the candidates of each reference audio.
+        tolerance (float): Tolerance of the scale factors.
+        e_fine (float): Tolerance of the fine pitch coherence check.
+
+    """
+    for idx, rows in groupby(cursor, key=operator.itemgetter(0)):
+        filter_candidates(cursor=(row[1:] for row in rows), query_quad=query_quads[idx], filtered=filtered,
+                          tolerance=tolerance, e_fine=e_fine)
+
+
+def fetch_candidates(cursor):
+    """
+    A function to fetch the candidates returned by find_hash_batch as arrays.
+
+    Parameters:
+        cursor : The current cursor of the database, holding the result of find_hash_batch.
+
+    Returns:
+        tuple : index of the matching query hash, (N, 4) array of Ax, Ay, Bx and By and audio id of each candidate.
+
+    """
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 6)
+    return rows[:, 0], rows[:, 1:5], rows[:, 5]
+
+
+def filter_candidates_vectorized(query_quads, reference_quads, audio_ids, tolerance=0.31, e_fine=1.8):
+    """
+    A function to filter candidates with array operations, each check of filter_candidates is applied to all
+    candidates at once as a mask and the surviving candidates are returned as columns. The results are the ones
+    filter_candidates gives for the same candidates, in the same order.
+
+    Parameters:
+        query_quads (numpy.ndarray): (N, 4) raw data of the query hash of each candidate.
+        reference_quads (numpy.ndarray): (N, 4) raw data of each candidate.
+        audio_ids (numpy.ndarray): audio id of each candidate.
+        tolerance (float): Tolerance of the scale factors.
+        e_fine (float): Tolerance of the fine pitch coherence check.
+
+    Returns:
+        tuple : audio id, rough offset, sTime and sFreq of each candidate passing all checks.
+
+    """
+    query_quads = np.asarray(query_quads, dtype=np.float64).reshape(-1, 4)
+    reference_quads = np.asarray(reference_quads, dtype=np.float64).reshape(-1, 4)
+    audio_ids = np.asarray(audio_ids)
+    lower, upper = 1 / (1 + tolerance), 1 / (1 - tolerance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Rough pitch coherence
+        pitch_ratio = query_quads[:, 1] / reference_quads[:, 1]
+        # X and Y transformation
+        s_time = (query_quads[:, 2] - query_quads[:, 0]) / (reference_quads[:, 2] - reference_quads[:, 0])
+        s_freq = (query_quads[:, 3] - query_quads[:, 1]) / (reference_quads[:, 3] - reference_quads[:, 1])
+        valid = (lower <= pitch_ratio) & (pitch_ratio <= upper)
+        valid &= (lower <= s_time) & (s_time <= upper)
+        valid &= (lower <= s_freq) & (s_freq <= upper)
+        # Fine pitch coherence
+        valid &= np.abs(query_quads[:, 1] - reference_quads[:, 1] * s_freq) <= e_fine
+        s_time = s_time[valid]
+        offsets = reference_quads[valid, 0] - query_quads[valid, 0] / s_time
+    return audio_ids[valid], offsets, s_time, s_freq[valid]
+
+
 def store_hash(cursor, hash_value):
     """
     A function to store hashes into a reference fingerprint database.
@@ -212,6 +362,71 @@ def store_hash(cursor, hash_value):
                     hash_value[2], hash_value[2], hash_value[3], hash_value[3]))
 
 
+def next_hash_id(cursor):
+    """
+    A function to find the id the next stored hash gets, the same id the r-tree assigns to a hash inserted without one.
+
+    Parameters:
+        cursor : the current cursor of the reference fingerprint database.
+
+    Returns:
+        int : id of the next hash.
+
+    """
+    cursor.execute("""SELECT MAX(hash_id) FROM Quads""")
+    max_hash_id = cursor.fetchone()[0]
+    return 1 if max_hash_id is None else max_hash_id + 1
+
+
+def store_hashes_bulk(cursor, hash_values, first_hash_id):
+    """
+    A function to store hashes into a reference fingerprint database with a single statement execution, assigning
+    consecutive ids starting from first_hash_id.
+
+    Parameters:
+        cursor : the current cursor of the reference fingerprint database.
+        hash_values (List) : hash values.
+        first_hash_id (int) : id of the first hash.
+
+    """
+    cursor.executemany("""INSERT INTO Hashes VALUES (?,?,?,?,?,?,?,?,?)""",
+                       ((hash_id, i[0], i[0], i[1], i[1], i[2], i[2], i[3], i[3])
+                        for hash_id, i in enumerate(hash_values, first_hash_id)))
+
+
+def store_quads_bulk(cursor, quads, first_hash_id, audio_id):
+    """
+    A function to store raw data associated with consecutive hashes with a single statement execution.
+
+    Parameters:
+        cursor: the current cursor of the database.
+        quads (List): the raw information to be stored into the database.
+        first_hash_id (int): id of the hash of the first quad.
+        audio_id (int): Id of the audio.
+
+    """
+    cursor.executemany("""INSERT INTO Quads
+                             VALUES (?,?,?,?,?,?)""",
+                       ((hash_id, audio_id, int(i[0]), int(i[1]), int(i[2]), int(i[3]))
+                        for hash_id, i in enumerate(quads, first_hash_id)))
+
+
+def store_peaks_bulk(cursor, spectral_peaks, audio_id):
+    """
+    Store spectral peaks extracted from reference audios with a single statement execution.
+
+    Parameters:
+        cursor : the current cursor of the database.
+        spectral_peaks (List or numpy.ndarray) : spectral peaks extracted from the reference audio.
+        audio_id (int): id of the audio.
+
+    """
+    if isinstance(spectral_peaks, np.ndarray):
+        spectral_peaks = spectral_peaks.tolist()
+    cursor.executemany("""INSERT INTO Peaks
+                     VALUES (?,?,?)""", ((audio_id, int(i[0]), int(i[1])) for i in spectral_peaks))
+
+
 def lookup_record(cursor, audio_id):
     """
     Returns title of given recordid
@@ -232,6 +447,64 @@ def outlier_removal(binned_item, results):
     results.append([binned_item[0], binned_item[1], means[0], means[1], len(items)])
 
 
+def aggregate_candidates(audio_ids, offsets, s_times, s_freqs, bin_width=20, ts=4, top_k=None):
+    """
+    A function to bin filtered candidates and remove outliers with grouped array operations, the counterpart of
+    bin_times followed by outlier_removal for columnar candidates. Candidates are grouped by audio id and time bin,
+    bins with less than ts candidates are dropped and the scale factors of each bin are averaged, counting the
+    candidates within 2 standard deviations of the means as inliers. Bins are ranked by number of inliers in the order
+    find_matches ranks them. Sums are accumulated in candidate order instead of numpy's pairwise order, so means may
+    differ from outlier_removal in the last digits and a candidate lying exactly on the 2 standard deviation boundary
+    may be counted differently.
+
+    Parameters:
+        audio_ids (numpy.ndarray): audio id of each candidate.
+        offsets (numpy.ndarray): rough offset of each candidate.
+        s_times (numpy.ndarray): sTime of each candidate.
+        s_freqs (numpy.ndarray): sFreq of each candidate.
+        bin_width (int): Width of a time bin.
+        ts (int): Minimum number of candidates of a bin.
+        top_k (int): Number of best bins returned, all bins if None.
+
+    Returns:
+        List : [audio id, offset, sTime, sFreq, number of inliers] of the best bins, sorted by number of inliers.
+
+    """
+    if len(audio_ids) == 0:
+        return list()
+    audio_ids = np.asarray(audio_ids, dtype=np.int64)
+    bins = (np.floor(np.asarray(offsets) / bin_width) * bin_width).astype(np.int64)
+    scales = np.column_stack((s_times, s_freqs)).astype(np.float64)
+    # grouping candidates by audio id and time bin, the sort is stable so candidates keep their order in a group
+    order = np.lexsort((bins, audio_ids))
+    audio_ids, bins, scales = audio_ids[order], bins[order], scales[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (audio_ids[1:] != audio_ids[:-1]) | (bins[1:] != bins[:-1])
+    group_starts = np.flatnonzero(new_group)
+    counts = np.diff(np.append(group_starts, len(order)))
+    group_ids = np.cumsum(new_group) - 1
+    # means, standard deviations and inliers of each group
+    means = np.add.reduceat(scales, group_starts, axis=0) / counts[:, np.newaxis]
+    stds = np.sqrt(np.add.reduceat((scales - means[group_ids]) ** 2, group_starts, axis=0) / counts[:, np.newaxis])
+    lower, upper = (means - 2 * stds)[group_ids], (means + 2 * stds)[group_ids]
+    inliers = np.bincount(group_ids, weights=np.all((lower <= scales) & (scales <= upper), axis=1),
+                          minlength=len(group_starts)).astype(np.int64)
+    # ties are ranked by the first candidate of the audio and then of the bin, like the dictionaries of find_matches
+    group_audio_ids = audio_ids[group_starts]
+    group_first = order[group_starts]
+    new_audio = np.ones(len(group_starts), dtype=bool)
+    new_audio[1:] = group_audio_ids[1:] != group_audio_ids[:-1]
+    audio_first = np.minimum.reduceat(group_first, np.flatnonzero(new_audio))[np.cumsum(new_audio) - 1]
+    selected = np.flatnonzero(counts >= ts)
+    if top_k is not None and top_k < len(selected):
+        # keeping the bins with at least as many inliers as the k-th best bin, without sorting all bins
+        best = np.argpartition(-inliers[selected], top_k - 1)[:top_k]
+        selected = selected[inliers[selected] >= inliers[selected[best]].min()]
+    selected = selected[np.lexsort((group_first[selected], audio_first[selected], -inliers[selected]))][:top_k]
+    return [[int(group_audio_ids[i]), int(bins[group_starts[i]]), float(means[i, 0]), float(means[i, 1]),
+             int(inliers[i])] for i in selected.tolist()]
+
+
 def store_peaks(cursor, spectral_peaks, audio_id):
     """
     Store spectral peaks extracted from reference audios.
@@ -247,6 +520,133 @@ def store_peaks(cursor, spectral_peaks, audio_id):
                      VALUES (?,?,?)""", (audio_id, int(i[0]), int(i[1])))
 
 
+def encode_peak_block(spectral_peaks, block, block_length=PEAK_BLOCK_LENGTH):
+    """
+    A function to encode the spectral peaks of a time block as a blob. Peaks are sorted by time and frequency, times
+    are stored as differences to the previous peak (the first one to the start of the block) followed by the
+    frequencies, as int16 values or as int32 values if some value doesn't fit in 16 bits.
+
+    Parameters:
+        spectral_peaks (numpy.ndarray): (N, 2) array of (time, frequency) spectral peaks of the block.
+        block (int): Index of the time block.
+        block_length (int): Number of frames of a time block.
+
+    Returns:
+        tuple : size in bytes of the encoded values and the encoded blob.
+
+    """
+    spectral_peaks = np.unique(np.asarray(spectral_peaks, dtype=np.int64).reshape(-1, 2), axis=0)
+    values = np.concatenate((np.diff(spectral_peaks[:, 0], prepend=block * block_length), spectral_peaks[:, 1]))
+    item_size = 2 if values.size == 0 or (values.min() >= -2 ** 15 and values.max() < 2 ** 15) else 4
+    return item_size, values.astype(np.int16 if item_size == 2 else np.int32).tobytes()
+
+
+def decode_peak_block(item_size, data, block, block_length=PEAK_BLOCK_LENGTH):
+    """
+    A function to decode the spectral peaks of a time block encoded by encode_peak_block.
+
+    Parameters:
+        item_size (int): size in bytes of the encoded values.
+        data (bytes): the encoded blob.
+        block (int): Index of the time block.
+        block_length (int): Number of frames of a time block.
+
+    Returns:
+        numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks sorted by time.
+
+    """
+    values = np.frombuffer(data, dtype=np.int16 if item_size == 2 else np.int32).reshape(2, -1)
+    spectral_peaks = np.empty((values.shape[1], 2), dtype=np.int32)
+    np.cumsum(values[0], out=spectral_peaks[:, 0])
+    spectral_peaks[:, 0] += block * block_length
+    spectral_peaks[:, 1] = values[1]
+    return spectral_peaks
+
+
+def store_peak_blocks(cursor, spectral_peaks, audio_id, block_length=PEAK_BLOCK_LENGTH):
+    """
+    Store spectral peaks extracted from reference audios as one encoded blob per time block.
+
+    Parameters:
+        cursor : the current cursor of the database.
+        spectral_peaks (List or numpy.ndarray) : spectral peaks extracted from the reference audio.
+        audio_id (int): id of the audio.
+        block_length (int): Number of frames of a time block.
+
+    """
+    spectral_peaks = np.asarray(spectral_peaks, dtype=np.int64).reshape(-1, 2)
+    blocks = spectral_peaks[:, 0] // block_length
+    order = np.argsort(blocks, kind='stable')
+    spectral_peaks, blocks = spectral_peaks[order], blocks[order]
+    block_starts = np.flatnonzero(np.diff(blocks, prepend=blocks[:1] - 1))
+    cursor.executemany("""INSERT INTO PeakBlocks
+                     VALUES (?,?,?,?)""",
+                       ((audio_id, block) + encode_peak_block(peaks, block, block_length)
+                        for block, peaks in zip(blocks[block_starts].tolist(),
+                                                np.split(spectral_peaks, block_starts[1:]))))
+
+
+def lookup_peak_blocks(cursor, audio_id, start, end, block_length=PEAK_BLOCK_LENGTH):
+    """
+    A function to retrieve the spectral peaks of a reference audio between start and end (both included) from the
+    encoded blocks covering them.
+
+    Parameters:
+        cursor : The current cursor of the database.
+        audio_id (int): Id of the audio.
+        start (int): Start of the range.
+        end (int): End of the range.
+        block_length (int): Number of frames of a stored time block.
+
+    Returns:
+        numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks of the range sorted by time.
+
+    """
+    cursor.execute("""SELECT block, item_size, data
+                   FROM PeakBlocks
+                  WHERE audio_id = ?
+                    AND block >= ? AND block <= ?
+                  ORDER BY block""", (audio_id, int(start // block_length), int(end // block_length)))
+    blocks = [decode_peak_block(item_size, data, block, block_length) for block, item_size, data in cursor]
+    if len(blocks) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    spectral_peaks = np.concatenate(blocks)
+    return spectral_peaks[(spectral_peaks[:, 0] >= start) & (spectral_peaks[:, 0] <= end)]
+
+
+def lookup_peak_block_encoded(cursor, audio_id, block, block_length):
+    """
+    A function to retrieve the spectral peaks of a time block of a reference audio from the encoded blocks, the
+    counterpart of peak_cache.lookup_peak_block for the PeakBlocks table.
+
+    Returns:
+        numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks of the block sorted by time.
+
+    """
+    return lookup_peak_blocks(cursor=cursor, audio_id=audio_id, start=block * block_length,
+                              end=(block + 1) * block_length - 1)
+
+
+def table_size(cursor, names):
+    """
+    A function to compute the size of tables and indexes with the dbstat virtual table.
+
+    Parameters:
+        cursor : The current cursor of the database.
+        names (List): Names of the tables and indexes.
+
+    Returns:
+        int : Size in bytes of the pages used by the tables and indexes, None if dbstat is not available.
+
+    """
+    try:
+        cursor.execute("""SELECT SUM(pgsize) FROM dbstat WHERE name IN (""" + ",".join("?" * len(names)) + ")",
+                       names)
+    except sqlite3.OperationalError:
+        return None
+    return cursor.fetchone()[0] or 0
+
+
 def lookup_peak_range(cursor, audio_id, offset, e=3750):
     """
     Queries Peaks table for peaks of given recordid that are within
@@ -267,19 +667,27 @@ def verify_peaks(match, reference_peaks, query_peaks, eX=18, eY=12):
     frequency boundaries (eX and eY). Each reference peak is adjusted
     according to estimated sFreq/sTime from candidate filtering
     stage.
+    All reference peaks are scored at once, the query peaks within eX of each scaled reference peak are found with
+    np.searchsorted over the time sorted query peaks.
     Returns: validation score (num. valid peaks / total peaks)
     """
-    validated = 0
-    for i in reference_peaks:
-        reference_peak = (i[0] - match[1], i[1])
-        reference_peak_scaled = (reference_peak[0] * match[2], reference_peak[1] * match[3])
-        lBound = bisect_left(query_peaks, (reference_peak_scaled[0] - eX, None))
-        rBound = bisect_right(query_peaks, (reference_peak_scaled[0] + eX, None))
-        for j in range(lBound, rBound):
-            if not reference_peak_scaled[1] - eY <= query_peaks[j][1] <= reference_peak_scaled[1] + eY:
-                continue
-            else:
-                validated += 1
+    reference_peaks = np.asarray(reference_peaks, dtype=np.float64).reshape(-1, 2)
+    if len(reference_peaks) == 0:
+        return 0.0
+    query_peaks = np.asarray(query_peaks).reshape(-1, 2)
+    query_peaks = query_peaks[np.argsort(query_peaks[:, 0], kind='stable')]
+    reference_times = (reference_peaks[:, 0] - match[1]) * match[2]
+    reference_freqs = reference_peaks[:, 1] * match[3]
+    lBounds = np.searchsorted(query_peaks[:, 0], reference_times - eX, side='left')
+    rBounds = np.searchsorted(query_peaks[:, 0], reference_times + eX, side='right')
+    # query peaks within the time tolerance of each reference peak
+    lengths = rBounds - lBounds
+    reference_indices = np.repeat(np.arange(len(reference_peaks)), lengths)
+    query_indices = np.repeat(lBounds, lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths,
+                                                                                        lengths)
+    frequencies = query_peaks[query_indices, 1]
+    validated = np.count_nonzero((reference_freqs[reference_indices] - eY <= frequencies) &
+                                 (frequencies <= reference_freqs[reference_indices] + eY))
     vScore = (float(validated) / len(reference_peaks))
     return vScore
 
@@ -291,72 +699,652 @@ class FingerprintManager(object):
 
     Attributes:
         db_path (String): Path for reference audio fingerprints database.
+        persistent (bool): Whether connections are kept open between calls, one per thread.
+        cache_size (int): Page cache size of each connection, in pages or in KiB if negative.
+        mmap_size (int): Maximum number of bytes of the database accessed through memory mapping.
+        read_only (bool): Whether the database is opened read-only.
+        immutable (bool): Whether a read-only database is opened as immutable, without locking.
+        connections_opened (int): Number of connections opened so far.
+        connections_reused (int): Number of times an already open connection was used.
+        index_backend (String): Structure used to look up hashes, "rtree" or the name of an in-memory hash index.
+        peak_cache (PeakCache): Cache of reference peaks used for verification, None if disabled.
+        peak_storage (String): How spectral peaks are stored, "rows" (Peaks table) or "blocks" (PeakBlocks table).
+        query_batcher (QueryBatcher): Batcher of the queries of aquery, created on the first call if None.
 
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, persistent=False, cache_size=-65536, mmap_size=2 ** 28, index_backend="rtree",
+                 peak_cache_blocks=4096, peak_storage="auto", read_only=False, immutable=True, warm_up=False):
         """
         A constructor method to FingerprintManager class.
 
         Parameters:
             db_path (String): Path of reference audio fingerprints database.
+            persistent (bool): Whether to keep connections open between calls. Each thread gets its own connection,
+                so a manager can be shared by many threads while the page cache of each connection stays warm across
+                queries. Connections are closed by close().
+            cache_size (int): Page cache size of each connection, in pages or in KiB if negative.
+            mmap_size (int): Maximum number of bytes of the database accessed through memory mapping, read-only
+                managers map at least the whole database file.
+            index_backend (String): "rtree" looks up hashes with the r-tree of the database. "kdtree" and "grid"
+                load all hashes into an in-memory hash index on the first query (see hash_index), which answers the
+                same look ups without SQLite, the index is loaded again after new fingerprints are stored.
+            peak_cache_blocks (int): Number of time blocks of reference peaks kept in memory for verification, peaks
+                are read from the database for every verification if 0.
+            peak_storage (String): "rows" stores each spectral peak as a row of the Peaks table, "blocks" stores the
+                peaks of each time block of an audio as one encoded blob of the PeakBlocks table (see
+                encode_peak_block), which is much smaller and faster to read. "auto" uses blocks if the database
+                already has encoded peaks (see migrate_peaks) and rows otherwise. Requesting "blocks" for a database
+                whose peaks are only stored as rows raises ValueError.
+            read_only (bool): Whether to open the database read-only (mode=ro), for query nodes. Tables are not
+                created and storing fingerprints raises sqlite3.OperationalError.
+            immutable (bool): Whether a read-only database is also opened as immutable (immutable=1), SQLite then
+                neither locks the file nor checks for changes, so many processes share it through the page cache of
+                the operating system without contention. The file must not be modified while it is open, a new
+                version of the database should be a new file.
+            warm_up (bool): Whether to preload the r-tree and Quads pages on start, see warm_up.
 
         """
+        if index_backend != "rtree" and index_backend not in HASH_INDEXES:
+            raise ValueError("Unknown index backend: " + str(index_backend))
+        if peak_storage not in ("auto", "rows", "blocks"):
+            raise ValueError("Unknown peak storage: " + str(peak_storage))
         self.db_path = db_path
-        with sqlite3.connect(self.db_path) as conn:
-            __create_tables__(conn)
-        conn.close()
+        self.index_backend = index_backend
+        self.__index = None
+        self.__index_lock = threading.Lock()
+        self.peak_cache = PeakCache(max_blocks=peak_cache_blocks) if peak_cache_blocks > 0 else None
+        self.query_batcher = None
+        self.persistent = persistent
+        self.cache_size = cache_size
+        self.read_only = read_only
+        self.immutable = immutable
+        self.mmap_size = max(mmap_size, os.path.getsize(db_path)) if read_only else mmap_size
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.__local = threading.local()
+        self.__connections = list()
+        self.__lock = threading.Lock()
+        with self.connection() as conn:
+            if not read_only:
+                with conn:
+                    __create_tables__(conn)
+            if peak_storage != "rows":
+                # a read-only database may predate the PeakBlocks table
+                has_blocks = conn.execute("""SELECT EXISTS(SELECT 1 FROM sqlite_master
+                                              WHERE type = 'table' AND name = 'PeakBlocks')""").fetchone()[0]
+                if has_blocks:
+                    has_blocks = conn.execute("""SELECT EXISTS(SELECT 1 FROM PeakBlocks)""").fetchone()[0]
+                has_rows = conn.execute("""SELECT EXISTS(SELECT 1 FROM Peaks)""").fetchone()[0]
+                if peak_storage == "blocks" and has_rows and not has_blocks:
+                    # verification would read no peaks at all and never find a match
+                    raise ValueError("The spectral peaks of the database are stored as rows, migrate them to blocks "
+                                     "with migrate_peaks first")
+                if peak_storage == "auto":
+                    peak_storage = "blocks" if has_blocks else "rows"
+        self.peak_storage = peak_storage
+        if warm_up:
+            self.warm_up()
+
+    def __open_connection(self):
+        """
+        A method to open a tuned connection to the reference fingerprint database.
+
+        Returns:
+            sqlite3.Connection : a new connection.
+
+        """
+        if self.read_only:
+            uri = "file:" + pathname2url(os.path.abspath(self.db_path)) + "?mode=ro"
+            if self.immutable:
+                uri += "&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=not self.persistent)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=not self.persistent)
+        conn.execute("PRAGMA cache_size=" + str(int(self.cache_size)))
+        conn.execute("PRAGMA mmap_size=" + str(int(self.mmap_size)))
+        with self.__lock:
+            self.connections_opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        A method to get a connection to the reference fingerprint database. A persistent manager hands out the open
+        connection of the calling thread, otherwise a new connection is opened and closed once it is no longer used.
+
+        Returns:
+            sqlite3.Connection : connection to the reference fingerprint database.
+
+        """
+        if not self.persistent:
+            conn = self.__open_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = self.__open_connection()
+            self.__local.conn = conn
+            with self.__lock:
+                self.__connections.append(conn)
+        else:
+            with self.__lock:
+                self.connections_reused += 1
+        yield conn
+
+    def connection_statistics(self):
+        """
+        A method to report how connections were used.
+
+        Returns:
+            dict : Number of connections opened, number of times an open connection was reused and number of
+                connections currently kept open.
+
+        """
+        with self.__lock:
+            return {"opened": self.connections_opened, "reused": self.connections_reused,
+                    "open": len(self.__connections)}
+
+    def close(self):
+        """
+        A method to close the connections kept open by a persistent manager. The query batcher of aquery is stopped
+        as well, queries waiting in it are cancelled but running batches are not waited for, coroutines should await
+        aclose instead.
+
+        """
+        if self.query_batcher is not None:
+            self.query_batcher.shutdown()
+        with self.__lock:
+            connections = self.__connections
+            self.__connections = list()
+        for conn in connections:
+            conn.close()
+        self.__local = threading.local()
+
+    async def aclose(self):
+        """
+        A coroutine to close the manager from asyncio code, the query batcher of aquery finishes its running batches
+        before the connections are closed.
+
+        """
+        if self.query_batcher is not None:
+            await self.query_batcher.close()
+        self.close()
+
+    def warm_up(self, tables=("Hashes_node", "Quads")):
+        """
+        A method to preload the pages of tables used by queries into the page cache of the connection and of the
+        operating system (which memory mapped connections of other processes share), so the first queries don't
+        wait for the disk. By default the nodes of the r-tree and the Quads table are preloaded.
+
+        Parameters:
+            tables (List): Names of the tables to preload, PeakBlocks or Peaks can be added for verification.
+
+        Returns:
+            dict : Number of rows of each preloaded table and elapsed seconds.
+
+        """
+        statistics = {"rows": dict()}
+        start = time.time()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT name FROM sqlite_master WHERE type = 'table'""")
+            existing_tables = set(i[0] for i in cursor.fetchall())
+            for table in tables:
+                if table not in existing_tables:
+                    raise ValueError("Unknown table: " + str(table))
+                # counting the rows of a table without secondary indexes visits every page of its b-tree
+                cursor.execute("SELECT COUNT(*) FROM " + table)
+                statistics["rows"][table] = cursor.fetchone()[0]
+            cursor.close()
+        statistics["seconds"] = time.time() - start
+        return statistics
+
+    def __check_writable(self):
+        """
+        A method to refuse writes to a read-only database before any connection is opened for writing.
+
+        """
+        if self.read_only:
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+
+    def hash_index(self):
+        """
+        A method to return the in-memory hash index of the reference fingerprint database, loading it if needed.
+
+        Returns:
+            HashIndex : index of all the stored hashes.
+
+        """
+        with self.__index_lock:
+            if self.__index is None:
+                with self.connection() as conn:
+                    self.__index = HASH_INDEXES[self.index_backend].from_database(conn)
+            return self.__index
 
     def store_fingerprints(self, audio_fingerprints, spectral_peaks, audio_title):
         """
         A method to store audion fingerprints.
 
         Parameters:
-            audio_fingerprints (List): List of audio fingerprints.
+            audio_fingerprints (List or numpy.ndarray): List or structured array of audio fingerprints.
             spectral_peaks (List): List of spectral peaks extracted from spectrogram of the audio.
             audio_title (String): Title of the audio.
 
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            if not audio_exists(cursor=cursor, audio_title=audio_title):
-                audio_id = store_audio(cursor=cursor, audio_title=audio_title)
-                store_peaks(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
-                for i in audio_fingerprints:
-                    store_hash(cursor=cursor, hash_value=i[0])
-                    store_quads(cursor=cursor, quad=i[1], audio_id=audio_id)
-        conn.commit()
-        conn.close()
+        self.__check_writable()
+        with self.connection() as conn:
+            with conn:
+                cursor = conn.cursor()
+                if not audio_exists(cursor=cursor, audio_title=audio_title):
+                    audio_id = store_audio(cursor=cursor, audio_title=audio_title)
+                    if self.peak_storage == "blocks":
+                        store_peak_blocks(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
+                    else:
+                        store_peaks(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
+                    for hash_value, quad in iterate_fingerprints(audio_fingerprints):
+                        store_hash(cursor=cursor, hash_value=hash_value)
+                        store_quads(cursor=cursor, quad=quad, audio_id=audio_id)
+                cursor.close()
+        self.__index = None
+
+    def store_fingerprints_bulk(self, tracks, tracks_per_transaction=1000):
+        """
+        A method to store audio fingerprints of many audios. Hash ids are assigned explicitly so hashes, quads and
+        peaks of an audio are each stored with a single executemany, many audios are stored in one transaction and the
+        connection uses ingest friendly settings (in memory journal, no syncing), so an interrupted ingest may leave
+        the database unusable. A dedicated connection is used, also by persistent managers. The stored records are the
+        same as storing each audio with store_fingerprints.
+
+        Parameters:
+            tracks (iterable): (audio_fingerprints, spectral_peaks, audio_title) of each audio to be stored.
+            tracks_per_transaction (int): Number of audios stored in a single transaction.
+
+        Returns:
+            dict : Number of stored tracks, fingerprints and peaks, elapsed seconds and fingerprints stored per second.
 
-    def query_audio(self, audio_fingerprints, query_peaks):
-        match_candidates = self.find_matches(audio_fingerprints)
+        """
+        self.__check_writable()
+        statistics = {"tracks": 0, "fingerprints": 0, "peaks": 0}
+        start = time.time()
         conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=MEMORY")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-262144")
         cursor = conn.cursor()
-        if len(match_candidates) > 0:
-            reference_peaks = lookup_peak_range(cursor=cursor, audio_id=match_candidates[0][0],
-                                                offset=match_candidates[0][1])
-
-            v_score = verify_peaks(match=match_candidates[0], reference_peaks=reference_peaks,
-                                   query_peaks=query_peaks)
-            print(match_candidates[0][0], match_candidates[0][1], len(reference_peaks), v_score)
-            if v_score > 0.2:
-                audio_title = lookup_record(cursor=cursor, audio_id=match_candidates[0][0])
-                cursor.close()
-                conn.close()
-                return audio_title, match_candidates[0][2], match_candidates[0][1]
+        hash_id = next_hash_id(cursor=cursor)
+        pending = 0
+        for audio_fingerprints, spectral_peaks, audio_title in tracks:
+            if audio_exists(cursor=cursor, audio_title=audio_title):
+                continue
+            audio_id = store_audio(cursor=cursor, audio_title=audio_title)
+            if self.peak_storage == "blocks":
+                store_peak_blocks(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
             else:
-                return "No Match", 0
-        else:
+                store_peaks_bulk(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
+            fingerprints = list(iterate_fingerprints(audio_fingerprints))
+            store_hashes_bulk(cursor=cursor, hash_values=[i[0] for i in fingerprints], first_hash_id=hash_id)
+            store_quads_bulk(cursor=cursor, quads=[i[1] for i in fingerprints], first_hash_id=hash_id,
+                             audio_id=audio_id)
+            hash_id += len(fingerprints)
+            statistics["tracks"] += 1
+            statistics["fingerprints"] += len(fingerprints)
+            statistics["peaks"] += len(spectral_peaks)
+            pending += 1
+            if pending == tracks_per_transaction:
+                conn.commit()
+                pending = 0
+        conn.commit()
+        cursor.close()
+        conn.close()
+        self.__index = None
+        statistics["seconds"] = time.time() - start
+        statistics["fingerprints_per_second"] = statistics["fingerprints"] / max(statistics["seconds"], 1e-9)
+        return statistics
+
+    def query_audio(self, audio_fingerprints, query_peaks, streaming=False, max_bins=None, verify_top_k=1):
+        """
+        A method to identify a query audio given its fingerprints and spectral peaks.
+
+        Parameters:
+            audio_fingerprints (List or numpy.ndarray): Fingerprints of the query audio.
+            query_peaks (List or numpy.ndarray): Spectral peaks of the query audio.
+            streaming (bool): Whether to aggregate candidates with a StreamingAggregator, see find_matches.
+            max_bins (int): Maximum number of bins of a streaming query.
+            verify_top_k (int): Number of best candidates verified with the spectral peaks, in order, the first one
+                passing the verification is the match.
+
+        Returns:
+            tuple : audio title, sTime and offset of the matching audio, or "No Match" or "Too Ambiguous".
+
+        """
+        match_candidates = self.find_matches(audio_fingerprints, streaming=streaming, max_bins=max_bins)
+        return self.__verify_best_match(match_candidates=match_candidates, query_peaks=query_peaks,
+                                        verify_top_k=verify_top_k)
+
+    def query_audio_progressive(self, audio_fingerprints, query_peaks, fingerprints_per_batch=32, min_margin=8,
+                                max_bins=None, verify_top_k=1):
+        """
+        A method to identify a query audio from as few of its fingerprints as needed. Fingerprints are looked up in
+        time order in small batches while the votes of each (audio id, time bin) are counted, and the look up stops
+        as soon as the leading bin has min_margin more votes than the best bin of any other audio. The leading bin is
+        then verified like query_audio does.
+
+        Parameters:
+            audio_fingerprints (List or numpy.ndarray): Fingerprints of the query audio.
+            query_peaks (List or numpy.ndarray): Spectral peaks of the query audio.
+            fingerprints_per_batch (int): Number of fingerprints looked up at once.
+            min_margin (int): Number of votes the leading bin needs over the runner-up to stop early.
+            max_bins (int): Maximum number of bins, the query is given up as too ambiguous beyond it.
+            verify_top_k (int): Number of best candidates verified, see query_audio.
+
+        Returns:
+            tuple : the result of query_audio and the number of fingerprints which were looked up.
+
+        """
+        # fingerprints in time order of their A peak
+        fingerprints = sorted(iterate_fingerprints(audio_fingerprints), key=lambda i: i[1][0])
+        with self.connection() as conn:
+            match_candidates, fingerprints_used = self.__find_matches_streaming(
+                conn=conn, audio_fingerprints=fingerprints, top_k=None, max_bins=max_bins,
+                fingerprints_per_batch=fingerprints_per_batch, min_margin=min_margin)
+        return self.__verify_best_match(match_candidates=match_candidates, query_peaks=query_peaks,
+                                        verify_top_k=verify_top_k), fingerprints_used
+
+    def __verify_best_match(self, match_candidates, query_peaks, verify_top_k):
+        """
+        A method to verify the best candidates of a query with its spectral peaks, in order, until one of them passes.
+
+        Returns:
+            tuple : audio title, sTime and offset of the matching audio, or "No Match" or "Too Ambiguous".
+
+        """
+        if match_candidates is None:
+            return "Too Ambiguous", 0
+        if len(match_candidates) == 0:
+            return "No Match", 0
+        query_peaks = np.asarray(query_peaks).reshape(-1, 2)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for match in match_candidates[:verify_top_k]:
+                reference_peaks = self.__lookup_peak_range(cursor=cursor, audio_id=match[0], offset=match[1])
+                v_score = verify_peaks(match=match, reference_peaks=reference_peaks, query_peaks=query_peaks)
+                if v_score > 0.2:
+                    audio_title = lookup_record(cursor=cursor, audio_id=match[0])
+                    cursor.close()
+                    return audio_title, match[2], match[1]
+            cursor.close()
             return "No Match", 0
 
-    def find_matches(self, audio_fingerprints):
-        conn = sqlite3.connect(self.db_path)
+    def __lookup_peak_range(self, cursor, audio_id, offset, e=3750):
+        """
+        A method to retrieve the spectral peaks of a reference audio between offset and offset + e, from the peak
+        cache if it is enabled.
+
+        Returns:
+            List or numpy.ndarray : (time, frequency) spectral peaks of the range.
+
+        """
+        if self.peak_storage == "blocks":
+            if self.peak_cache is not None:
+                return self.peak_cache.lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset, e=e,
+                                                         lookup_block=lookup_peak_block_encoded)
+            return lookup_peak_blocks(cursor=cursor, audio_id=audio_id, start=offset, end=offset + e)
+        if self.peak_cache is not None:
+            return self.peak_cache.lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset, e=e)
+        return lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset, e=e)
+
+    def migrate_peaks(self, drop_rows=True, number_of_samples=200, random_state=0):
+        """
+        A method to move the spectral peaks of the Peaks table to encoded blocks of the PeakBlocks table, the manager
+        then reads and stores peaks as blocks. Only the audios having rows in the Peaks table are encoded (again), the
+        blocks of other audios are kept, so migrating twice or after storing audios as blocks loses no peaks. The size
+        of both tables and the latency of reading peak ranges used for verification (at random audios and offsets) are
+        measured before and after the migration.
+
+        The rows kept with drop_rows=False are a snapshot: audios stored afterwards are only stored as blocks by
+        managers using blocks (and only as rows by managers using rows), so both tables drift apart. Rows should only
+        be kept to check or roll back the migration.
+
+        Parameters:
+            drop_rows (bool): Whether to delete the rows of the Peaks table (and vacuum the database) afterwards.
+            number_of_samples (int): Number of peak ranges read to measure latency.
+            random_state (int): Seed used to pick the peak ranges.
+
+        Returns:
+            dict : Number of migrated audios and peaks, size in bytes of the peaks before and after (None if the
+                SQLite build can't report table sizes), size of the database file before and after, milliseconds per
+                peak range read before and after and whether both storages return the same peaks.
+
+        """
+        self.__check_writable()
+        statistics = {"database_bytes_before": os.path.getsize(self.db_path)}
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            statistics["peak_bytes_before"] = table_size(cursor=cursor, names=["Peaks", "sqlite_autoindex_Peaks_1"])
+            cursor.execute("""SELECT audio_id, MAX(Px) FROM Peaks GROUP BY audio_id""")
+            audios = cursor.fetchall()
+            random_state = np.random.RandomState(random_state)
+            samples = [audios[i] for i in random_state.randint(0, len(audios), number_of_samples)] if audios else []
+            samples = [(audio_id, int(random_state.randint(0, max_time + 1))) for audio_id, max_time in samples]
+            start = time.time()
+            row_peaks = [lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset)
+                         for audio_id, offset in samples]
+            statistics["lookup_milliseconds_before"] = (time.time() - start) * 1000 / max(len(samples), 1)
+            with conn:
+                statistics["peaks"] = 0
+                for audio_id, _ in audios:
+                    cursor.execute("""DELETE FROM PeakBlocks WHERE audio_id = ?""", (audio_id,))
+                    spectral_peaks = conn.execute("""SELECT Px, Py FROM Peaks WHERE audio_id = ?""",
+                                                  (audio_id,)).fetchall()
+                    store_peak_blocks(cursor=cursor, spectral_peaks=spectral_peaks, audio_id=audio_id)
+                    statistics["peaks"] += len(spectral_peaks)
+            statistics["audios"] = len(audios)
+            start = time.time()
+            block_peaks = [lookup_peak_blocks(cursor=cursor, audio_id=audio_id, start=offset, end=offset + 3750)
+                           for audio_id, offset in samples]
+            statistics["lookup_milliseconds_after"] = (time.time() - start) * 1000 / max(len(samples), 1)
+            statistics["identical"] = all(np.array_equal(np.array(sorted(i), dtype=np.int32).reshape(-1, 2), j)
+                                          for i, j in zip(row_peaks, block_peaks))
+            if drop_rows:
+                with conn:
+                    cursor.execute("""DELETE FROM Peaks""")
+                conn.execute("""VACUUM""")
+            statistics["peak_bytes_after"] = table_size(cursor=cursor,
+                                                        names=["PeakBlocks", "sqlite_autoindex_PeakBlocks_1"])
+            cursor.close()
+        statistics["database_bytes_after"] = os.path.getsize(self.db_path)
+        self.peak_storage = "blocks"
+        if self.peak_cache is not None:
+            self.peak_cache.clear()
+        return statistics
+
+    def find_matches(self, audio_fingerprints, batched=False, vectorized=False, top_k=None, streaming=False,
+                     max_bins=None, fingerprints_per_batch=64):
+        """
+        A method to find reference audios matching the fingerprints of a query audio.
+
+        Parameters:
+            audio_fingerprints (List or numpy.ndarray): Fingerprints of the query audio.
+            batched (bool): Whether to look up all hashes with a single query (find_hash_batch) instead of one query
+                per hash, both return the same candidates. Hashes are looked up all at once by in-memory hash indexes.
+            vectorized (bool): Whether to fetch all candidates as arrays, filter them with
+                filter_candidates_vectorized and rank the bins with aggregate_candidates, hashes are then looked up
+                all at once.
+            top_k (int): Number of best candidates returned, all candidates if None.
+            streaming (bool): Whether to aggregate the candidates of each batch of fingerprints with a
+                StreamingAggregator as they are filtered, so that memory is bounded by the number of bins instead of
+                the number of candidates. Candidates are then ranked by number of candidates instead of inliers.
+            max_bins (int): Maximum number of bins of a streaming query, the query is given up as too ambiguous
+                beyond it.
+            fingerprints_per_batch (int): Number of fingerprints looked up at once by a streaming query.
+
+        Returns:
+            List : [audio id, offset, sTime, sFreq, number of inliers] of each candidate, sorted by number of inliers,
+                or None if a streaming query was too ambiguous.
+
+        """
+        with self.connection() as conn:
+            if streaming:
+                return self.__find_matches_streaming(conn=conn, audio_fingerprints=audio_fingerprints, top_k=top_k,
+                                                     max_bins=max_bins,
+                                                     fingerprints_per_batch=fingerprints_per_batch)[0]
+            return self.__find_matches(conn=conn, audio_fingerprints=audio_fingerprints, batched=batched,
+                                       vectorized=vectorized, top_k=top_k)
+
+    def __find_matches_streaming(self, conn, audio_fingerprints, top_k, max_bins, fingerprints_per_batch,
+                                 min_margin=None):
+        """
+        A method to find matches by aggregating the candidates of each batch of fingerprints as they are filtered,
+        stopping early once the leading bin has min_margin more votes than the best bin of any other audio.
+
+        Returns:
+            tuple : the matches (None if the query was too ambiguous) and the number of fingerprints looked up.
+
+        """
+        aggregator = StreamingAggregator(max_bins=max_bins)
+        fingerprints = list(iterate_fingerprints(audio_fingerprints))
+        fingerprints_used = 0
+        for start in range(0, len(fingerprints), fingerprints_per_batch):
+            batch = fingerprints[start:start + fingerprints_per_batch]
+            fingerprints_used += len(batch)
+            audio_ids, offsets, s_times, s_freqs = self.__filtered_candidates(conn=conn, audio_fingerprints=batch)
+            if not aggregator.update(audio_ids=audio_ids, offsets=offsets, s_times=s_times, s_freqs=s_freqs):
+                return None, fingerprints_used
+            if min_margin is not None:
+                results = aggregator.results()
+                if len(results) > 0:
+                    runner_up = next((i[4] for i in results if i[0] != results[0][0]), 0)
+                    if results[0][4] - runner_up >= min_margin:
+                        return results[:top_k], fingerprints_used
+        return aggregator.results(top_k=top_k), fingerprints_used
+
+    def __filtered_candidates(self, conn, audio_fingerprints):
+        """
+        A method to look up all hashes of a query at once and filter their candidates with array operations.
+
+        Returns:
+            tuple : audio id, rough offset, sTime and sFreq of each candidate passing all checks.
+
+        """
+        fingerprints = list(iterate_fingerprints(audio_fingerprints))
+        query_indices, reference_quads, audio_ids = self.__lookup_candidates(conn=conn,
+                                                                             hash_values=[i[0] for i in fingerprints])
+        query_quads = np.array([i[1] for i in fingerprints], dtype=np.int64).reshape(-1, 4)
+        return filter_candidates_vectorized(query_quads=query_quads[query_indices], reference_quads=reference_quads,
+                                            audio_ids=audio_ids)
+
+    def __lookup_candidates(self, conn, hash_values):
+        """
+        A method to look up many hashes at once, with the in-memory hash index or with a single r-tree query.
+
+        Returns:
+            tuple : index of the matching hash, (N, 4) array of Ax, Ay, Bx and By and audio id of each candidate,
+                ordered by index of the matching hash.
+
+        """
+        if self.index_backend != "rtree":
+            return self.hash_index().find_candidates(hash_values=hash_values)
+        cursor = conn.cursor()
+        find_hash_batch(cursor=cursor, hash_values=hash_values)
+        candidates = fetch_candidates(cursor=cursor)
+        cursor.close()
+        # ending the transaction which filled the temporary table, it would otherwise keep holding a read lock
+        conn.commit()
+        return candidates
+
+    def query_audio_batch(self, queries, verify_top_k=1):
+        """
+        A method to identify many query audios at once. The hashes of all queries are looked up together, then the
+        candidates of each query are filtered and ranked with array operations (as find_matches does with
+        vectorized=True) and verified like query_audio does.
+
+        Parameters:
+            queries (List): (audio_fingerprints, query_peaks) of each query audio.
+            verify_top_k (int): Number of best candidates verified for each query, see query_audio.
+
+        Returns:
+            List : the result of query_audio for each query.
+
+        """
+        queries = [(list(iterate_fingerprints(audio_fingerprints)), query_peaks)
+                   for audio_fingerprints, query_peaks in queries]
+        # first fingerprint of each query among the fingerprints of all queries
+        query_starts = np.cumsum([0] + [len(i[0]) for i in queries])
+        fingerprints = [j for i in queries for j in i[0]]
+        with self.connection() as conn:
+            fingerprint_indices, reference_quads, audio_ids = self.__lookup_candidates(
+                conn=conn, hash_values=[i[0] for i in fingerprints])
+        query_quads = np.array([i[1] for i in fingerprints], dtype=np.int64).reshape(-1, 4)
+        # candidates are ordered by fingerprint, so the candidates of each query are contiguous
+        candidate_starts = np.searchsorted(fingerprint_indices, query_starts)
+        results = list()
+        for i, (_, query_peaks) in enumerate(queries):
+            candidates = slice(candidate_starts[i], candidate_starts[i + 1])
+            candidate_audio_ids, offsets, s_times, s_freqs = filter_candidates_vectorized(
+                query_quads=query_quads[fingerprint_indices[candidates]], reference_quads=reference_quads[candidates],
+                audio_ids=audio_ids[candidates])
+            match_candidates = aggregate_candidates(audio_ids=candidate_audio_ids, offsets=offsets, s_times=s_times,
+                                                    s_freqs=s_freqs, top_k=verify_top_k)
+            results.append(self.__verify_best_match(match_candidates=match_candidates, query_peaks=query_peaks,
+                                                    verify_top_k=verify_top_k))
+        return results
+
+    async def aquery(self, audio_fingerprints, query_peaks, timeout=None):
+        """
+        A coroutine to identify a query audio without blocking the event loop. Queries are handed over to the
+        query_batcher of the manager, which groups queries arriving close together into one query_audio_batch call
+        run by a bounded thread pool. A QueryBatcher with default parameters is created on the first call if none
+        was set.
+
+        Parameters:
+            audio_fingerprints (List or numpy.ndarray): Fingerprints of the query audio.
+            query_peaks (List or numpy.ndarray): Spectral peaks of the query audio.
+            timeout (float): Maximum number of seconds to wait for the result, the batcher timeout if None.
+
+        Returns:
+            tuple : the result of query_audio.
+
+        Raises:
+            asyncio.TimeoutError : if the result is not ready in time.
+            asyncio.QueueFull : if too many queries are already waiting.
+
+        """
+        if self.query_batcher is None:
+            self.query_batcher = QueryBatcher(fingerprint_manager=self)
+        return await self.query_batcher.query(audio_fingerprints=audio_fingerprints, query_peaks=query_peaks,
+                                              timeout=timeout)
+
+    def __find_matches(self, conn, audio_fingerprints, batched, vectorized, top_k):
+        if vectorized:
+            audio_ids, offsets, s_times, s_freqs = self.__filtered_candidates(conn=conn,
+                                                                             audio_fingerprints=audio_fingerprints)
+            return aggregate_candidates(audio_ids=audio_ids, offsets=offsets, s_times=s_times, s_freqs=s_freqs,
+                                        top_k=top_k)
         cursor = conn.cursor()
         filtered = defaultdict(list)
-        for i in audio_fingerprints:
-            find_hash(cursor=cursor, hash_value=i[0])
+        if self.index_backend != "rtree":
+            fingerprints = list(iterate_fingerprints(audio_fingerprints))
+            candidates = self.hash_index().find_hashes(hash_values=[i[0] for i in fingerprints])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for (hash_value, quad), reference_quads in zip(fingerprints, candidates):
+                    filter_candidates(cursor=reference_quads, query_quad=quad, filtered=filtered)
+        elif batched:
+            fingerprints = list(iterate_fingerprints(audio_fingerprints))
+            find_hash_batch(cursor=cursor, hash_values=[i[0] for i in fingerprints])
             with np.errstate(divide='ignore', invalid='ignore'):
-                filter_candidates(cursor=cursor, query_quad=i[1], filtered=filtered)
+                filter_candidates_batch(cursor=cursor, query_quads=[i[1] for i in fingerprints], filtered=filtered)
+            # ending the transaction which filled the temporary table, it would otherwise keep holding a read lock
+            conn.commit()
+        else:
+            for hash_value, quad in iterate_fingerprints(audio_fingerprints):
+                find_hash(cursor=cursor, hash_value=hash_value)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    filter_candidates(cursor=cursor, query_quad=quad, filtered=filtered)
         binned = {k: bin_times(v) for k, v in filtered.items()}
         results = list()
         binned_items = list()
@@ -368,5 +1356,4 @@ class FingerprintManager(object):
             outlier_removal(binned_item=i, results=results)
         sorted_results = sorted(results, key=operator.itemgetter(4), reverse=True)
         cursor.close()
-        conn.close()
-        return sorted_results
+        return sorted_results[:top_k]
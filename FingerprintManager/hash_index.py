@@ -0,0 +1,261 @@
+import numpy as np
+
+
+def within_boxes(minimums, maximums, hash_values, e):
+    """
+    A function to check which stored hashes lie within the look up box of a query hash, the condition the r-tree
+    query of find_hash uses.
+
+    Parameters:
+        minimums (numpy.ndarray): (N, 4) array of the lower bounds of the stored hashes.
+        maximums (numpy.ndarray): (N, 4) array of the upper bounds of the stored hashes.
+        hash_values (numpy.ndarray): (N, 4) array of the query hash of each stored hash.
+        e (float): A look up radius.
+
+    Returns:
+        numpy.ndarray : boolean array which is True for the stored hashes within their look up box.
+
+    """
+    return np.all((minimums >= hash_values - e) & (maximums <= hash_values + e), axis=1)
+
+
+class HashIndex(object):
+    """
+    A base class for in-memory indexes of the hashes of a reference fingerprint database. The hashes are kept as the
+    same single precision boxes the r-tree stores along with the raw data and audio id of each hash in parallel
+    arrays, so an index answers the look up box queries of find_hash without going through SQLite and returns the
+    same hashes. Subclasses implement find_hash_indices.
+
+    Attributes:
+        hash_ids (numpy.ndarray): Id of each hash.
+        minimums (numpy.ndarray): (N, 4) float32 array of the lower bounds of the stored cx, cy, dx and dy values.
+        maximums (numpy.ndarray): (N, 4) float32 array of the upper bounds of the stored cx, cy, dx and dy values.
+        quads (numpy.ndarray): (N, 4) int32 array of Ax, Ay, Bx and By of each hash.
+        audio_ids (numpy.ndarray): Id of the audio of each hash.
+
+    """
+
+    def __init__(self, hash_ids, minimums, maximums, quads, audio_ids):
+        """
+        A constructor method for HashIndex class.
+
+        Parameters:
+            hash_ids (numpy.ndarray): Id of each hash.
+            minimums (numpy.ndarray): (N, 4) array of the lower bounds of the stored cx, cy, dx and dy values.
+            maximums (numpy.ndarray): (N, 4) array of the upper bounds of the stored cx, cy, dx and dy values.
+            quads (numpy.ndarray): (N, 4) array of Ax, Ay, Bx and By of each hash.
+            audio_ids (numpy.ndarray): Id of the audio of each hash.
+
+        """
+        self.hash_ids = np.asarray(hash_ids, dtype=np.int64)
+        self.minimums = np.asarray(minimums, dtype=np.float32).reshape(-1, 4)
+        self.maximums = np.asarray(maximums, dtype=np.float32).reshape(-1, 4)
+        self.quads = np.asarray(quads, dtype=np.int32).reshape(-1, 4)
+        self.audio_ids = np.asarray(audio_ids, dtype=np.int32)
+
+    @classmethod
+    def from_database(cls, conn, rows_per_fetch=2 ** 16, **kwargs):
+        """
+        A method to build an index from the hashes stored in a reference fingerprint database.
+
+        Parameters:
+            conn : Connection object to the reference fingerprint database.
+            rows_per_fetch (int): Number of rows converted to arrays at once.
+            kwargs : Parameters of the index.
+
+        Returns:
+            HashIndex : index of all the stored hashes.
+
+        """
+        cursor = conn.cursor()
+        cursor.execute("""SELECT Hashes.id,
+                          Hashes.minNewCx, Hashes.minNewCy, Hashes.minNewDx, Hashes.minNewDy,
+                          Hashes.maxNewCx, Hashes.maxNewCy, Hashes.maxNewDx, Hashes.maxNewDy,
+                          Quads.Ax, Quads.Ay, Quads.Bx, Quads.By, Quads.audio_id
+                       FROM Hashes INNER JOIN Quads
+                         ON Quads.hash_id = Hashes.id
+                      ORDER BY Hashes.id""")
+        blocks = list()
+        while True:
+            rows = cursor.fetchmany(rows_per_fetch)
+            if not rows:
+                break
+            blocks.append(np.array(rows, dtype=np.float64))
+        cursor.close()
+        rows = np.concatenate(blocks) if blocks else np.empty((0, 14))
+        return cls(hash_ids=rows[:, 0], minimums=rows[:, 1:5], maximums=rows[:, 5:9], quads=rows[:, 9:13],
+                   audio_ids=rows[:, 13], **kwargs)
+
+    def __len__(self):
+        return len(self.hash_ids)
+
+    def find_hash_indices(self, hash_values, e=0.01):
+        """
+        A method to find the positions of the stored hashes matching each query hash.
+
+        Parameters:
+            hash_values (numpy.ndarray): (M, 4) array of query hashes.
+            e (float): A look up radius.
+
+        Returns:
+            tuple : positions of the matching hashes and, for each of them, the index of the query hash it matches.
+
+        """
+        raise NotImplementedError
+
+    def find_candidates(self, hash_values, e=0.01):
+        """
+        A method to retrieve the raw data of the stored hashes matching each query hash as arrays, ordered by query
+        hash and then by hash id.
+
+        Parameters:
+            hash_values (List or numpy.ndarray): Hashes extracted from a query audio.
+            e (float): A look up radius.
+
+        Returns:
+            tuple : index of the matching query hash, (N, 4) array of Ax, Ay, Bx and By and audio id of each match.
+
+        """
+        hash_values = np.asarray(hash_values, dtype=np.float64).reshape(-1, 4)
+        positions, query_indices = self.find_hash_indices(hash_values, e=e)
+        order = np.lexsort((positions, query_indices))
+        positions = positions[order]
+        return query_indices[order], self.quads[positions], self.audio_ids[positions]
+
+    def find_hashes(self, hash_values, e=0.01):
+        """
+        A method to retrieve the raw data of the stored hashes matching each query hash, a stored hash matches when
+        its box lies within the look up box of the query hash, the same condition find_hash uses.
+
+        Parameters:
+            hash_values (List or numpy.ndarray): Hashes extracted from a query audio.
+            e (float): A look up radius.
+
+        Returns:
+            List : for each query hash, the (Ax, Ay, Bx, By, audio id) rows of the matching hashes ordered by hash id.
+
+        """
+        query_indices, quads, audio_ids = self.find_candidates(hash_values, e=e)
+        number_of_queries = len(np.asarray(hash_values).reshape(-1, 4))
+        query_starts = np.searchsorted(query_indices, np.arange(1, number_of_queries))
+        rows = np.column_stack((quads, audio_ids)).tolist()
+        bounds = [0] + query_starts.tolist() + [len(rows)]
+        return [rows[bounds[i]:bounds[i + 1]] for i in range(number_of_queries)]
+
+
+class KDTreeHashIndex(HashIndex):
+    """
+    An in-memory hash index backed by a KD-tree (scipy.spatial.cKDTree) over the lower bounds of the stored hashes.
+    Look up boxes are answered with ball queries in the Chebyshev metric, every stored hash within a box is within the
+    look up radius of the query, and the candidates are then checked against the exact box.
+
+    Attributes:
+        leaf_size (int): Number of hashes in a leaf of the KD-tree.
+
+    """
+
+    def __init__(self, hash_ids, minimums, maximums, quads, audio_ids, leaf_size=32):
+        """
+        A constructor method for KDTreeHashIndex class.
+
+        Parameters:
+            leaf_size (int): Number of hashes in a leaf of the KD-tree.
+
+        """
+        from scipy.spatial import cKDTree
+        super(KDTreeHashIndex, self).__init__(hash_ids=hash_ids, minimums=minimums, maximums=maximums, quads=quads,
+                                              audio_ids=audio_ids)
+        self.leaf_size = leaf_size
+        self.__tree = cKDTree(self.minimums, leafsize=leaf_size, balanced_tree=False, compact_nodes=False) \
+            if len(self) > 0 else None
+
+    def find_hash_indices(self, hash_values, e=0.01):
+        if self.__tree is None or len(hash_values) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        # a slightly larger radius so that rounding of the distances never drops a hash on the box boundary
+        neighbours = self.__tree.query_ball_point(hash_values, r=e * (1 + 1e-6) + 1e-9, p=np.inf)
+        lengths = np.fromiter((len(i) for i in neighbours), dtype=np.intp, count=len(neighbours))
+        positions = np.fromiter((j for i in neighbours for j in i), dtype=np.intp, count=lengths.sum())
+        query_indices = np.repeat(np.arange(len(hash_values)), lengths)
+        within = within_boxes(self.minimums[positions], self.maximums[positions], hash_values[query_indices], e)
+        return positions[within], query_indices[within]
+
+
+class GridHashIndex(HashIndex):
+    """
+    An in-memory hash index over a uniform grid. Each stored hash is quantized into the grid cell holding its lower
+    bounds and the four cell coordinates are packed into a 64 bit key (16 bits per coordinate). Keys are kept in a
+    sorted array, so a look up probes the cells the look up box can reach with a binary search each, instead of
+    traversing a tree, and the hashes of the probed cells are then checked against the exact box.
+
+    Attributes:
+        cell_width (float): Width of a grid cell, a look up box reaches at most two cells per coordinate when the cell
+            width is at least twice the look up radius.
+        keys (numpy.ndarray): Sorted keys of the cells of the stored hashes.
+
+    """
+
+    def __init__(self, hash_ids, minimums, maximums, quads, audio_ids, cell_width=0.02):
+        """
+        A constructor method for GridHashIndex class.
+
+        Parameters:
+            cell_width (float): Width of a grid cell.
+
+        """
+        super(GridHashIndex, self).__init__(hash_ids=hash_ids, minimums=minimums, maximums=maximums, quads=quads,
+                                            audio_ids=audio_ids)
+        self.cell_width = cell_width
+        keys = self.cell_keys(self.__cells(self.minimums))
+        self.__order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.__order]
+
+    def __cells(self, values):
+        """
+        A method to compute the grid cell coordinates of hashes.
+
+        """
+        return np.floor(np.asarray(values, dtype=np.float64) / self.cell_width).astype(np.int64)
+
+    @staticmethod
+    def cell_keys(cells):
+        """
+        A method to pack the four coordinates of grid cells into 64 bit keys.
+
+        Parameters:
+            cells (numpy.ndarray): (N, 4) array of cell coordinates.
+
+        Returns:
+            numpy.ndarray : uint64 key of each cell.
+
+        """
+        cells = cells + 2 ** 15
+        if cells.size > 0 and (cells.min() < 0 or cells.max() >= 2 ** 16):
+            raise ValueError("Hashes are out of the range of the grid, use a larger cell width")
+        cells = cells.astype(np.uint64)
+        return cells[:, 0] | (cells[:, 1] << np.uint64(16)) | (cells[:, 2] << np.uint64(32)) | \
+            (cells[:, 3] << np.uint64(48))
+
+    def find_hash_indices(self, hash_values, e=0.01):
+        if len(self) == 0 or len(hash_values) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        # cells reached by the look up box of each query hash along each coordinate
+        first_cells = self.__cells(hash_values - e)
+        spans = self.__cells(hash_values + e) - first_cells
+        steps = np.arange(spans.max() + 1)
+        neighbours = np.stack(np.meshgrid(steps, steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 4)
+        reachable = np.all(neighbours[np.newaxis] <= spans[:, np.newaxis], axis=2)
+        query_indices, neighbour_indices = np.nonzero(reachable)
+        probes = self.cell_keys(first_cells[query_indices] + neighbours[neighbour_indices])
+        # stored hashes of each probed cell
+        starts = np.searchsorted(self.keys, probes, side='left')
+        lengths = np.searchsorted(self.keys, probes, side='right') - starts
+        query_indices = np.repeat(query_indices, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = self.__order[np.repeat(starts, lengths) + offsets]
+        within = within_boxes(self.minimums[positions], self.maximums[positions], hash_values[query_indices], e)
+        return positions[within], query_indices[within]
+
+
+# in-memory hash index backends by name
+HASH_INDEXES = {"kdtree": KDTreeHashIndex, "grid": GridHashIndex}
@@ -0,0 +1,421 @@
+import asyncio
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, CancelledError, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from FingerprintManager.ingest_pipeline import __initialize_worker__, fingerprint_audio, fingerprint_audio_data
+from FingerprintManager.query_batcher import QueryBatcher
+
+# sample formats of raw PCM requests
+PCM_DTYPES = {"float32": np.float32, "int16": np.int16}
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A class of HTTP servers listening on a Unix socket, each request is handled by its own thread.
+
+    """
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    A class of HTTP client connections to a server listening on a Unix socket.
+
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        super(UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request_service(address, method, path, body=None, headers=None, timeout=None):
+    """
+    A function to send a request to an identification service.
+
+    Parameters:
+        address (tuple or String): (host, port) of a localhost service or path of the Unix socket of the service.
+        method (String): HTTP method.
+        path (String): path of the request, with its query string.
+        body (bytes): body of the request.
+        headers (dict): headers of the request.
+        timeout (float): Maximum number of seconds to wait for the response.
+
+    Returns:
+        tuple : HTTP status and the decoded JSON response.
+
+    """
+    if isinstance(address, str):
+        conn = UnixHTTPConnection(socket_path=address, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(address[0], address[1], timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers or dict())
+        response = conn.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+    finally:
+        conn.close()
+
+
+def identify_path(address, audio_path, timeout=None):
+    """
+    A function to identify an audio file with an identification service, the file is read by the service.
+
+    Parameters:
+        address (tuple or String): (host, port) of a localhost service or path of the Unix socket of the service.
+        audio_path (String): relative/absolute path of the query audio.
+        timeout (float): Maximum number of seconds to wait for the response.
+
+    Returns:
+        tuple : HTTP status and the result, see IdentificationService.identify_path.
+
+    """
+    body = json.dumps({"path": os.path.abspath(audio_path)}).encode("utf-8")
+    return request_service(address, "POST", "/identify", body=body, headers={"Content-Type": "application/json"},
+                           timeout=timeout)
+
+
+def identify_pcm(address, audio_data, sr, timeout=None):
+    """
+    A function to identify raw PCM samples with an identification service.
+
+    Parameters:
+        address (tuple or String): (host, port) of a localhost service or path of the Unix socket of the service.
+        audio_data (numpy.ndarray): monophonic float32 or int16 samples of the query audio.
+        sr (int): sampling rate of the samples.
+        timeout (float): Maximum number of seconds to wait for the response.
+
+    Returns:
+        tuple : HTTP status and the result, see IdentificationService.identify_path.
+
+    """
+    audio_data = np.asarray(audio_data)
+    dtype = "int16" if audio_data.dtype == np.int16 else "float32"
+    body = audio_data.astype("<" + ("i2" if dtype == "int16" else "f4"), copy=False).tobytes()
+    return request_service(address, "POST", "/identify?sr=" + str(int(sr)) + "&dtype=" + dtype, body=body,
+                           headers={"Content-Type": "application/octet-stream"}, timeout=timeout)
+
+
+class IdentificationRequestHandler(BaseHTTPRequestHandler):
+    """
+    A class handling the HTTP requests of an identification service.
+
+    POST /identify with a JSON body {"path": ...} identifies an audio file, with an application/octet-stream body it
+    identifies little endian PCM samples given the sr and dtype (float32 or int16) query parameters. GET /statistics
+    returns the counters of the service and GET /health returns its status. Invalid requests are answered with 400,
+    audios which could not be fingerprinted with 422, failures of the service with 500, overload, broken worker
+    processes and stopping with 503 and timeouts with 504.
+
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlsplit(self.path).path
+        if path == "/statistics":
+            self.__respond(200, service.statistics())
+        elif path == "/health":
+            self.__respond(200, {"status": "ok"})
+        else:
+            self.__respond(404, {"error": "Unknown path: " + path})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        if url.path != "/identify":
+            self.__respond(404, {"error": "Unknown path: " + url.path})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                result = service.identify_path(audio_path=json.loads(body.decode("utf-8"))["path"])
+            else:
+                parameters = parse_qs(url.query)
+                dtype = PCM_DTYPES[parameters.get("dtype", ["float32"])[0]]
+                audio_data = np.frombuffer(body, dtype=np.dtype(dtype).newbyteorder("<"))
+                result = service.identify_audio(audio_data=audio_data,
+                                                sr=int(parameters.get("sr", [service.stft.sr])[0]))
+        except (ValueError, KeyError, TypeError) as error:
+            self.__respond(400, {"error": str(error)})
+        except asyncio.QueueFull:
+            self.__respond(503, {"error": "Too many pending queries"})
+        except (asyncio.TimeoutError, TimeoutError):
+            self.__respond(504, {"error": "Query timed out"})
+        except (BrokenExecutor, CancelledError):
+            # a worker process died or the service is stopping, which is no fault of the request
+            self.__respond(503, {"error": "Service unavailable"})
+        except RuntimeError as error:
+            self.__respond(422, {"error": str(error)})
+        except Exception as error:
+            self.__respond(500, {"error": type(error).__name__ + ": " + str(error)})
+        else:
+            self.__respond(200, result)
+
+    def log_message(self, format, *args):
+        # requests are counted by the service instead of being logged
+        pass
+
+    def __respond(self, status, content):
+        """
+        A method to send a JSON response.
+
+        """
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class IdentificationService(object):
+    """
+    A class to identify query audios in a long running local service, so that the cost of starting up (importing the
+    audio libraries, opening the database, loading the hash index and warming the page cache) is paid once instead of
+    by every script. Audios are decoded and fingerprinted by a pool of worker processes which keep their STFT, peak
+    extractor and fingerprint generator, and the queries are identified by a QueryBatcher, so concurrent queries are
+    looked up in batches by a bounded thread pool. The service listens on localhost or on a Unix socket, and its
+    methods can also be called directly from the process running it.
+
+    Attributes:
+        fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database, it should be
+            persistent so that the threads of the query batcher keep their connections.
+        stft (STFT): object used to compute spectrograms.
+        peak_extractor (PeakExtractor): object used to extract spectral peaks.
+        fingerprint_generator (FingerprintGenerator): object used to generate fingerprints.
+        workers (int): Number of worker processes.
+        load_audio_parameters (dict): Extra parameters of audio_manager.load_audio, such as offset and duration.
+        timeout (float): Maximum number of seconds to identify a query.
+        query_batcher (QueryBatcher): Batcher of the queries.
+        address (tuple or String): (host, port) or Unix socket path the service listens on, once started.
+
+    """
+
+    def __init__(self, fingerprint_manager, stft, peak_extractor, fingerprint_generator, workers=None,
+                 load_audio_parameters=None, query_threads=2, batch_window=0.005, max_batch_size=16,
+                 max_queue_depth=256, timeout=60.0, latency_window=1000):
+        """
+        A constructor method for IdentificationService class.
+
+        Parameters:
+            fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database.
+            stft (STFT): object used to compute spectrograms.
+            peak_extractor (PeakExtractor): object used to extract spectral peaks.
+            fingerprint_generator (FingerprintGenerator): object used to generate fingerprints.
+            workers (int): Number of worker processes, the number of CPUs by default.
+            load_audio_parameters (dict): Extra parameters of audio_manager.load_audio, such as offset and duration.
+            query_threads (int): Number of threads of the query batcher.
+            batch_window (float): Number of seconds the query batcher waits for more queries.
+            max_batch_size (int): Maximum number of queries of a batch.
+            max_queue_depth (int): Maximum number of queries waiting for a batch, more queries are rejected.
+            timeout (float): Maximum number of seconds to identify a query.
+            latency_window (int): Number of latest queries the latency percentiles are computed from.
+
+        """
+        self.fingerprint_manager = fingerprint_manager
+        self.stft = stft
+        self.peak_extractor = peak_extractor
+        self.fingerprint_generator = fingerprint_generator
+        self.workers = workers or os.cpu_count() or 1
+        self.load_audio_parameters = load_audio_parameters or dict()
+        self.timeout = timeout
+        self.query_batcher = QueryBatcher(fingerprint_manager=fingerprint_manager, max_workers=query_threads,
+                                          batch_window=batch_window, max_batch_size=max_batch_size,
+                                          max_queue_depth=max_queue_depth, timeout=timeout)
+        self.address = None
+        self.__counters = {"requests": 0, "identified": 0, "matches": 0, "failed": 0, "rejected": 0, "timeouts": 0,
+                           "fingerprint_seconds": 0.0, "query_seconds": 0.0}
+        self.__latencies = deque(maxlen=latency_window)
+        self.__lock = threading.Lock()
+        self.__executor = None
+        self.__loop = None
+        self.__loop_thread = None
+        self.__server = None
+        self.__server_thread = None
+        self.__started = None
+
+    def start(self, address=("127.0.0.1", 0)):
+        """
+        A method to start the worker processes and the query batcher and to listen for requests. Each worker
+        fingerprints a short silence first, so the audio libraries are imported before the first request.
+
+        Parameters:
+            address (tuple or String): (host, port) to listen on, a free port is chosen for port 0, or path of a
+                Unix socket.
+
+        Returns:
+            tuple or String : the address the service listens on.
+
+        """
+        # worker processes are forked before any thread of the service is started
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers, initializer=__initialize_worker__,
+                                              initargs=(self.stft, self.peak_extractor, self.fingerprint_generator,
+                                                        self.load_audio_parameters))
+        silence = np.zeros(self.stft.sr, dtype=np.float32)
+        for future in [self.__executor.submit(fingerprint_audio_data, silence) for _ in range(self.workers)]:
+            future.result()
+        if self.fingerprint_manager.index_backend != "rtree":
+            self.fingerprint_manager.hash_index()
+        self.__loop = asyncio.new_event_loop()
+        self.__loop_thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+        self.__loop_thread.start()
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            self.__server = UnixHTTPServer(address, IdentificationRequestHandler)
+        else:
+            self.__server = ThreadingHTTPServer(address, IdentificationRequestHandler)
+        self.__server.service = self
+        self.address = self.__server.server_address
+        self.__server_thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__server_thread.start()
+        self.__started = time.time()
+        return self.address
+
+    def stop(self):
+        """
+        A method to stop listening and to shut down the query batcher and the worker processes.
+
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server_thread.join()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+            self.__server = None
+        if self.__loop is not None:
+            asyncio.run_coroutine_threadsafe(self.query_batcher.close(), self.__loop).result()
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__loop_thread.join()
+            self.__loop.close()
+            self.__loop = None
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def identify_path(self, audio_path):
+        """
+        A method to identify an audio file, decoded with audio_manager.load_audio by a worker process.
+
+        Parameters:
+            audio_path (String): relative/absolute path of the query audio.
+
+        Returns:
+            dict : title of the matching audio (or "No Match" or "Too Ambiguous") with its sTime and offset, the number
+                of fingerprints of the query and the seconds spent fingerprinting, querying and in total.
+
+        Raises:
+            RuntimeError : if the audio could not be fingerprinted.
+            asyncio.QueueFull : if too many queries are waiting.
+            asyncio.TimeoutError : if the query was not identified in time.
+
+        """
+        return self.__identify(fingerprint_audio, audio_path)
+
+    def identify_audio(self, audio_data, sr):
+        """
+        A method to identify raw samples of an audio, resampled to the sampling rate of the STFT first.
+
+        Parameters:
+            audio_data (numpy.ndarray): monophonic samples of the query audio, int16 samples are scaled to [-1, 1).
+            sr (int): sampling rate of the samples.
+
+        Returns:
+            dict : the result of identify_path.
+
+        Raises:
+            ValueError : if the sampling rate is not positive.
+
+        """
+        from Utilities import audio_manager
+        if sr <= 0:
+            raise ValueError("Invalid sampling rate: " + str(sr))
+        audio_data = np.asarray(audio_data)
+        if audio_data.dtype == np.int16:
+            audio_data = audio_data.astype(np.float32) / 32768
+        audio_data = audio_manager.resample_audio(audio_data=audio_data, native_sr=sr, sr=self.stft.sr)
+        return self.__identify(fingerprint_audio_data, audio_data)
+
+    def statistics(self):
+        """
+        A method to return the counters of the service.
+
+        Returns:
+            dict : number of requests, identified queries, matches, failures, rejected and timed out queries, seconds
+                spent fingerprinting and querying, queries identified per second since the start, latency percentiles
+                of the latest queries in milliseconds, number of batches and of queries waiting for a batch.
+
+        """
+        with self.__lock:
+            statistics = dict(self.__counters)
+            latencies = np.array(self.__latencies)
+        uptime = time.time() - self.__started if self.__started is not None else 0.0
+        statistics["uptime_seconds"] = uptime
+        statistics["queries_per_second"] = statistics["identified"] / max(uptime, 1e-9)
+        for percentile in (50, 90, 99):
+            statistics["p" + str(percentile) + "_ms"] = float(np.percentile(latencies, percentile) * 1000) \
+                if len(latencies) > 0 else None
+        statistics["batches"] = self.query_batcher.batches
+        statistics["queue_depth"] = self.query_batcher.queue_depth()
+        return statistics
+
+    def __identify(self, function, argument):
+        """
+        A method to fingerprint a query in a worker process and to identify it with the query batcher.
+
+        """
+        start = time.time()
+        self.__count("requests")
+        try:
+            result = self.__executor.submit(function, argument).result(timeout=self.timeout)
+            if result[0] is None:
+                raise RuntimeError("Failed Fingerprinting: " + result[1])
+            audio_fingerprints, spectral_peaks, _ = result
+            fingerprinted = time.time()
+            match = asyncio.run_coroutine_threadsafe(
+                self.query_batcher.query(audio_fingerprints=audio_fingerprints, query_peaks=spectral_peaks),
+                self.__loop).result()
+        except asyncio.QueueFull:
+            self.__count("rejected")
+            raise
+        except (asyncio.TimeoutError, TimeoutError):
+            self.__count("timeouts")
+            raise
+        except Exception:
+            self.__count("failed")
+            raise
+        end = time.time()
+        with self.__lock:
+            self.__counters["identified"] += 1
+            self.__counters["matches"] += match[0] not in ("No Match", "Too Ambiguous")
+            self.__counters["fingerprint_seconds"] += fingerprinted - start
+            self.__counters["query_seconds"] += end - fingerprinted
+            self.__latencies.append(end - start)
+        return {"match": match[0], "s_time": float(match[1]), "offset": int(match[2]) if len(match) > 2 else None,
+                "fingerprints": len(audio_fingerprints), "fingerprint_seconds": fingerprinted - start,
+                "query_seconds": end - fingerprinted, "seconds": end - start}
+
+    def __count(self, counter):
+        """
+        A method to increment a counter of the service.
+
+        """
+        with self.__lock:
+            self.__counters[counter] += 1
@@ -0,0 +1,224 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# objects used by worker processes, set once per process by __initialize_worker__
+__worker_objects__ = dict()
+
+
+def __initialize_worker__(stft, peak_extractor, fingerprint_generator, load_audio_parameters):
+    """
+    A function to keep the objects used for fingerprinting in a worker process.
+
+    """
+    __worker_objects__.update(stft=stft, peak_extractor=peak_extractor, fingerprint_generator=fingerprint_generator,
+                              load_audio_parameters=load_audio_parameters)
+
+
+def fingerprint_audio(audio_path):
+    """
+    A function to decode an audio and generate its fingerprints in a worker process.
+
+    Parameters:
+        audio_path (String): relative/absolute path of a given audio.
+
+    Returns:
+        tuple : audio fingerprints, (N, 2) int32 array of spectral peaks and the seconds spent in each stage, or None
+            and the error message if the audio could not be fingerprinted.
+
+    """
+    from Utilities import audio_manager
+    stft = __worker_objects__["stft"]
+    try:
+        start = time.time()
+        audio_data = audio_manager.load_audio(audio_path=audio_path, sr=stft.sr,
+                                              **__worker_objects__["load_audio_parameters"])
+        decoded = time.time()
+    except Exception as error:
+        return None, str(error)
+    result = fingerprint_audio_data(audio_data)
+    if result[0] is not None:
+        result[2]["decode"] = decoded - start
+    return result
+
+
+def fingerprint_audio_data(audio_data):
+    """
+    A function to generate the fingerprints of a decoded audio in a worker process.
+
+    Parameters:
+        audio_data (numpy.ndarray): monophonic time series representation of the audio at the sampling rate of the
+            STFT.
+
+    Returns:
+        tuple : audio fingerprints, (N, 2) int32 array of spectral peaks and the seconds spent in each stage, or None
+            and the error message if the audio could not be fingerprinted.
+
+    """
+    stft = __worker_objects__["stft"]
+    peak_extractor = __worker_objects__["peak_extractor"]
+    fingerprint_generator = __worker_objects__["fingerprint_generator"]
+    try:
+        start = time.time()
+        spectrogram = stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data)
+        del audio_data
+        spectral_peaks, peak_magnitudes = peak_extractor.extract_spectral_peak_array(spectrogram=spectrogram,
+                                                                                     return_magnitudes=True)
+        del spectrogram
+        transformed = time.time()
+        audio_fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=spectral_peaks,
+                                                                         peak_magnitudes=peak_magnitudes)
+        fingerprinted = time.time()
+    except Exception as error:
+        return None, str(error)
+    return audio_fingerprints, spectral_peaks, {"decode": 0.0, "spectral_peaks": transformed - start,
+                                                "fingerprints": fingerprinted - transformed}
+
+
+class IngestPipeline(object):
+    """
+    A class to store reference audios with a pool of worker processes. Workers decode audios and generate their
+    fingerprints while a single writer thread stores the results with FingerprintManager.store_fingerprints_bulk,
+    committing in batches. The number of audios in flight and waiting to be written is bounded, so fast workers wait
+    for a slow writer instead of piling up results in memory.
+
+    Attributes:
+        fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database.
+        stft (STFT): object used to compute spectrograms.
+        peak_extractor (PeakExtractor): object used to extract spectral peaks.
+        fingerprint_generator (FingerprintGenerator): object used to generate fingerprints.
+        workers (int): Number of worker processes.
+        max_pending (int): Maximum number of audios being fingerprinted at once.
+        queue_size (int): Maximum number of fingerprinted audios waiting for the writer.
+        tracks_per_transaction (int): Number of audios stored in a single transaction.
+        load_audio_parameters (dict): Extra parameters of audio_manager.load_audio, such as backend.
+        statistics (dict): Counters of the last run.
+
+    """
+
+    def __init__(self, fingerprint_manager, stft, peak_extractor, fingerprint_generator, workers=None,
+                 max_pending=None, queue_size=64, tracks_per_transaction=100, load_audio_parameters=None):
+        """
+        A constructor method for IngestPipeline class.
+
+        Parameters:
+            fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database.
+            stft (STFT): object used to compute spectrograms.
+            peak_extractor (PeakExtractor): object used to extract spectral peaks.
+            fingerprint_generator (FingerprintGenerator): object used to generate fingerprints, generating them as a
+                structured array (output_format="array") keeps the results sent to the writer compact.
+            workers (int): Number of worker processes, the number of CPUs by default.
+            max_pending (int): Maximum number of audios being fingerprinted at once, twice the workers by default.
+            queue_size (int): Maximum number of fingerprinted audios waiting for the writer.
+            tracks_per_transaction (int): Number of audios stored in a single transaction.
+            load_audio_parameters (dict): Extra parameters of audio_manager.load_audio, such as backend.
+
+        """
+        self.fingerprint_manager = fingerprint_manager
+        self.stft = stft
+        self.peak_extractor = peak_extractor
+        self.fingerprint_generator = fingerprint_generator
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.queue_size = queue_size
+        self.tracks_per_transaction = tracks_per_transaction
+        self.load_audio_parameters = load_audio_parameters or dict()
+        self.statistics = dict()
+
+    def run(self, audio_paths, audio_titles=None):
+        """
+        A method to fingerprint and store reference audios. Audios are stored in the order they are given, audios
+        which fail to decode are skipped and counted.
+
+        Parameters:
+            audio_paths (List): relative/absolute paths of reference audios.
+            audio_titles (List): Title of each audio, the file name without extension by default.
+
+        Returns:
+            dict : Counters of the run, number of stored audios and fingerprints (audios which were already stored
+                are fingerprinted but skipped by the writer), number of fingerprinted and failed audios, wall time,
+                seconds spent in each stage (decode, spectral_peaks and fingerprints summed over workers, write by the
+                writer) and the throughput of each stage in fingerprinted audios per second.
+
+        """
+        if audio_titles is None:
+            audio_titles = [os.path.splitext(os.path.basename(i))[0] for i in audio_paths]
+        statistics = {"tracks": 0, "fingerprinted": 0, "failed": 0, "fingerprints": 0, "decode_seconds": 0.0,
+                      "spectral_peaks_seconds": 0.0, "fingerprints_seconds": 0.0, "write_seconds": 0.0}
+        fingerprinted = queue.Queue(maxsize=self.queue_size)
+        writer_errors = list()
+        waiting = [0.0]
+
+        def fingerprinted_tracks():
+            while True:
+                start_waiting = time.time()
+                track = fingerprinted.get()
+                waiting[0] += time.time() - start_waiting
+                if track is None:
+                    return
+                yield track
+
+        def write():
+            try:
+                start_writing = time.time()
+                stored = self.fingerprint_manager.store_fingerprints_bulk(
+                    tracks=fingerprinted_tracks(), tracks_per_transaction=self.tracks_per_transaction)
+                statistics["tracks"] = stored["tracks"]
+                statistics["fingerprints"] = stored["fingerprints"]
+                # time spent by the writer, without waiting for fingerprinted audios
+                statistics["write_seconds"] = time.time() - start_writing - waiting[0]
+            except Exception as error:
+                writer_errors.append(error)
+                # draining the queue so that the producer doesn't block forever
+                for _ in fingerprinted_tracks():
+                    pass
+
+        start = time.time()
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=__initialize_worker__,
+                                     initargs=(self.stft, self.peak_extractor, self.fingerprint_generator,
+                                               self.load_audio_parameters)) as executor:
+                pending = deque()
+                for audio_path, audio_title in zip(audio_paths, audio_titles):
+                    pending.append((executor.submit(fingerprint_audio, audio_path), audio_title))
+                    if len(pending) < self.max_pending:
+                        continue
+                    self.__collect(pending.popleft(), fingerprinted, statistics)
+                while pending:
+                    self.__collect(pending.popleft(), fingerprinted, statistics)
+        finally:
+            fingerprinted.put(None)
+            writer.join()
+        if writer_errors:
+            raise writer_errors[0]
+        statistics["seconds"] = time.time() - start
+        for stage in ("decode", "spectral_peaks", "fingerprints", "write"):
+            statistics[stage + "_tracks_per_second"] = statistics["fingerprinted"] / max(
+                statistics[stage + "_seconds"], 1e-9)
+        statistics["tracks_per_second"] = statistics["tracks"] / max(statistics["seconds"], 1e-9)
+        statistics["fingerprints_per_second"] = statistics["fingerprints"] / max(statistics["seconds"], 1e-9)
+        self.statistics = statistics
+        return statistics
+
+    @staticmethod
+    def __collect(pending_track, fingerprinted, statistics):
+        """
+        A method to wait for a fingerprinted audio and hand it over to the writer.
+
+        """
+        future, audio_title = pending_track
+        result = future.result()
+        if result[0] is None:
+            print("Failed Fingerprinting ", audio_title, result[1])
+            statistics["failed"] += 1
+            return
+        audio_fingerprints, spectral_peaks, timings = result
+        statistics["fingerprinted"] += 1
+        for stage in ("decode", "spectral_peaks", "fingerprints"):
+            statistics[stage + "_seconds"] += timings[stage]
+        fingerprinted.put((audio_fingerprints, spectral_peaks, audio_title))
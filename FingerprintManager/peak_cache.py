@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def lookup_peak_block(cursor, audio_id, block, block_length):
+    """
+    A function to retrieve the spectral peaks of a time block of a reference audio.
+
+    Parameters:
+        cursor : The current cursor of the database.
+        audio_id (int): Id of the audio.
+        block (int): Index of the time block.
+        block_length (int): Number of frames of a time block.
+
+    Returns:
+        numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks of the block sorted by time.
+
+    """
+    cursor.execute("""SELECT Px, Py
+                   FROM Peaks
+                  WHERE audio_id = ?
+                    AND Px >= ? AND Px < ?
+                  ORDER BY Px, Py""", (audio_id, block * block_length, (block + 1) * block_length))
+    return np.array(cursor.fetchall(), dtype=np.int32).reshape(-1, 2)
+
+
+class PeakCache(object):
+    """
+    A class to keep spectral peaks of reference audios in memory for verification. Peaks are cached by audio id and
+    time block, a peak range is served from the cached blocks covering it and the least recently used blocks are
+    dropped once the cache holds more than its maximum number of blocks. The cache can be shared by many threads.
+
+    Attributes:
+        max_blocks (int): Maximum number of cached blocks.
+        block_length (int): Number of frames of a time block.
+        hits (int): Number of blocks served from the cache.
+        misses (int): Number of blocks read from the database.
+
+    """
+
+    def __init__(self, max_blocks=4096, block_length=3750):
+        """
+        A constructor method for PeakCache class.
+
+        Parameters:
+            max_blocks (int): Maximum number of cached blocks.
+            block_length (int): Number of frames of a time block.
+
+        """
+        self.max_blocks = max_blocks
+        self.block_length = block_length
+        self.hits = 0
+        self.misses = 0
+        self.__blocks = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__blocks)
+
+    def lookup_peak_range(self, cursor, audio_id, offset, e=3750, lookup_block=lookup_peak_block):
+        """
+        A method to retrieve the spectral peaks of a reference audio between offset and offset + e, the peaks
+        lookup_peak_range returns.
+
+        Parameters:
+            cursor : The current cursor of the database, used for blocks which are not cached.
+            audio_id (int): Id of the audio.
+            offset (int): Start of the range.
+            e (int): Length of the range.
+            lookup_block (function): Function reading the peaks of a block from the database.
+
+        Returns:
+            numpy.ndarray : (N, 2) int32 array of (time, frequency) spectral peaks of the range sorted by time.
+
+        """
+        blocks = [self.__block(cursor, audio_id, block, lookup_block)
+                  for block in range(int(offset // self.block_length), int((offset + e) // self.block_length) + 1)]
+        peaks = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+        return peaks[(peaks[:, 0] >= offset) & (peaks[:, 0] <= offset + e)]
+
+    def clear(self):
+        """
+        A method to drop all cached blocks.
+
+        """
+        with self.__lock:
+            self.__blocks.clear()
+
+    def __block(self, cursor, audio_id, block, lookup_block):
+        """
+        A method to return the peaks of a block, reading them from the database on a miss.
+
+        """
+        key = (audio_id, block)
+        with self.__lock:
+            peaks = self.__blocks.get(key)
+            if peaks is not None:
+                self.__blocks.move_to_end(key)
+                self.hits += 1
+                return peaks
+            self.misses += 1
+        peaks = lookup_block(cursor, audio_id, block, self.block_length)
+        with self.__lock:
+            self.__blocks[key] = peaks
+            while len(self.__blocks) > self.max_blocks:
+                self.__blocks.popitem(last=False)
+        return peaks
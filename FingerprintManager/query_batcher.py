@@ -0,0 +1,229 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class QueryBatcher(object):
+    """
+    A class to serve queries from asyncio code. Queries wait in a bounded queue, the ones arriving within a short
+    window of each other are grouped and identified together with FingerprintManager.query_audio_batch, so their hashes
+    are looked up at once, and the blocking database work runs in a bounded thread pool instead of the event loop. The
+    number of batches in flight is bounded by the number of threads, so queries pile up in the queue under overload and
+    new queries are rejected once it is full.
+
+    Attributes:
+        fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database.
+        max_workers (int): Number of threads running batches.
+        batch_window (float): Number of seconds to wait for more queries after the first query of a batch.
+        max_batch_size (int): Maximum number of queries of a batch.
+        max_queue_depth (int): Maximum number of queries waiting for a batch.
+        timeout (float): Default maximum number of seconds to wait for a result, no limit if None.
+        verify_top_k (int): Number of best candidates verified for each query, see query_audio.
+        queries (int): Number of queries accepted.
+        batches (int): Number of batches run.
+        rejected (int): Number of queries rejected because the queue was full.
+        timeouts (int): Number of queries which timed out.
+
+    """
+
+    def __init__(self, fingerprint_manager, max_workers=4, batch_window=0.005, max_batch_size=16,
+                 max_queue_depth=256, timeout=None, verify_top_k=1):
+        """
+        A constructor method for QueryBatcher class.
+
+        Parameters:
+            fingerprint_manager (FingerprintManager): Manager of the reference fingerprint database, it should be
+                persistent so that each thread keeps its connection.
+            max_workers (int): Number of threads running batches.
+            batch_window (float): Number of seconds to wait for more queries after the first query of a batch.
+            max_batch_size (int): Maximum number of queries of a batch.
+            max_queue_depth (int): Maximum number of queries waiting for a batch.
+            timeout (float): Default maximum number of seconds to wait for a result, no limit if None.
+            verify_top_k (int): Number of best candidates verified for each query, see query_audio.
+
+        """
+        self.fingerprint_manager = fingerprint_manager
+        self.max_workers = max_workers
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self.verify_top_k = verify_top_k
+        self.queries = 0
+        self.batches = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.__executor = None
+        self.__loop = None
+        self.__queue = None
+        self.__slots = None
+        self.__collector = None
+        # running batches, kept referenced until they are done
+        self.__batches = set()
+
+    async def query(self, audio_fingerprints, query_peaks, timeout=None):
+        """
+        A coroutine to identify a query audio in the next batch.
+
+        Parameters:
+            audio_fingerprints (List or numpy.ndarray): Fingerprints of the query audio.
+            query_peaks (List or numpy.ndarray): Spectral peaks of the query audio.
+            timeout (float): Maximum number of seconds to wait for the result, the default timeout if None.
+
+        Returns:
+            tuple : the result of query_audio.
+
+        Raises:
+            asyncio.TimeoutError : if the result is not ready in time.
+            asyncio.QueueFull : if max_queue_depth queries are already waiting.
+
+        """
+        self.__start()
+        future = self.__loop.create_future()
+        try:
+            self.__queue.put_nowait((audio_fingerprints, query_peaks, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self.queries += 1
+        try:
+            # a query which timed out is cancelled, batches skip it or drop its result
+            return await asyncio.wait_for(future, timeout=self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def queue_depth(self):
+        """
+        A method to return the number of queries waiting for a batch.
+
+        Returns:
+            int : number of waiting queries.
+
+        """
+        return self.__queue.qsize() if self.__queue is not None else 0
+
+    async def close(self):
+        """
+        A coroutine to stop batching, queries still waiting are cancelled and the thread pool is shut down once the
+        running batches are done.
+
+        """
+        collector, batches = self.__collector, set(self.__batches)
+        self.__stop(collector=collector, queue=self.__queue)
+        self.__loop = self.__queue = self.__slots = self.__collector = None
+        if collector is not None:
+            try:
+                await collector
+            except asyncio.CancelledError:
+                pass
+        if batches:
+            await asyncio.gather(*batches, return_exceptions=True)
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        A method to stop batching from any thread, without waiting for the running batches. The collector task is
+        cancelled in its event loop (if it is still open) along with the queries still waiting, and the thread pool
+        is shut down. The next query starts batching again with a new thread pool.
+
+        """
+        loop = self.__loop
+        if loop is not None and not loop.is_closed():
+            try:
+                in_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                in_loop = False
+            if in_loop or not loop.is_running():
+                self.__stop(collector=self.__collector, queue=self.__queue)
+            else:
+                # the collector uses the queue in the loop thread, which is cleared once it is cancelled there
+                stopped = Future()
+                loop.call_soon_threadsafe(self.__stop, self.__collector, self.__queue, stopped)
+                stopped.result()
+        self.__loop = self.__queue = self.__slots = self.__collector = None
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
+    @staticmethod
+    def __stop(collector, queue, stopped=None):
+        """
+        A method to cancel the collector task and the queries waiting in the queue, in the event loop.
+
+        Parameters:
+            collector (asyncio.Task): Collector task, the queries it holds are cancelled by the task itself.
+            queue (asyncio.Queue): Queue of the waiting queries.
+            stopped (concurrent.futures.Future): Future set once done, for callers in other threads.
+
+        """
+        if collector is not None:
+            collector.cancel()
+        if queue is not None:
+            while not queue.empty():
+                queue.get_nowait()[2].cancel()
+        if stopped is not None:
+            stopped.set_result(None)
+
+    def __start(self):
+        """
+        A method to set up the queue and the collector task in the running event loop, again if the batcher is used
+        from another event loop.
+
+        """
+        loop = asyncio.get_running_loop()
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="QueryBatcher")
+        if self.__loop is not loop or self.__collector is None or self.__collector.done():
+            self.__loop = loop
+            self.__queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self.__slots = asyncio.Semaphore(self.max_workers)
+            self.__collector = loop.create_task(self.__collect())
+
+    async def __collect(self):
+        """
+        A coroutine to group waiting queries into batches and hand them over to the thread pool.
+
+        """
+        while True:
+            batch = list()
+            try:
+                batch.append(await self.__queue.get())
+                if self.__queue.qsize() < self.max_batch_size - 1:
+                    await asyncio.sleep(self.batch_window)
+                while len(batch) < self.max_batch_size and not self.__queue.empty():
+                    batch.append(self.__queue.get_nowait())
+                batch = [i for i in batch if not i[2].done()]
+                if not batch:
+                    continue
+                # waiting for a free thread, queries keep arriving in the queue meanwhile
+                await self.__slots.acquire()
+            except asyncio.CancelledError:
+                # the queries taken off the queue would otherwise wait forever
+                for i in batch:
+                    i[2].cancel()
+                raise
+            batch_task = self.__loop.create_task(self.__run(batch, self.__slots))
+            self.__batches.add(batch_task)
+            batch_task.add_done_callback(self.__batches.discard)
+
+    async def __run(self, batch, slots):
+        """
+        A coroutine to identify the queries of a batch in the thread pool and pass on the results, then to free the
+        thread slot of the batch (the batcher may have been closed meanwhile).
+
+        """
+        try:
+            self.batches += 1
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.__executor, self.fingerprint_manager.query_audio_batch,
+                                                 [(i[0], i[1]) for i in batch], self.verify_top_k)
+        except Exception as error:
+            for i in batch:
+                if not i[2].done():
+                    i[2].set_exception(error)
+        else:
+            for i, result in zip(batch, results):
+                if not i[2].done():
+                    i[2].set_result(result)
+        finally:
+            slots.release()
@@ -0,0 +1,95 @@
+from FingerprintManager import FingerprintManager, QueryBatcher
+from Utilities import dir_manager
+import numpy as np
+import asyncio
+import os
+import time
+
+# defining constants
+NUMBER_OF_TRACKS = 200
+FINGERPRINTS_PER_TRACK = 2000
+PEAKS_PER_TRACK = 6000
+FINGERPRINTS_PER_QUERY = 90
+NUMBER_OF_QUERIES = 400
+CONCURRENCY_LEVELS = [1, 8, 32]
+MAX_BATCH_SIZES = [1, 16]
+
+
+def synthetic_track(random_state, track_number):
+    """
+    A function to create random time sorted fingerprints and spectral peaks of a track.
+
+    """
+    hashes = np.round(random_state.uniform(0, 1, (FINGERPRINTS_PER_TRACK, 4)), 3).tolist()
+    # valid raw data, Ax < Bx and Ay < By
+    quads = np.empty((FINGERPRINTS_PER_TRACK, 4), dtype=int)
+    quads[:, 0] = np.sort(random_state.randint(1, 50000, FINGERPRINTS_PER_TRACK))
+    quads[:, 1] = random_state.randint(1, 300, FINGERPRINTS_PER_TRACK)
+    quads[:, 2] = quads[:, 0] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    quads[:, 3] = quads[:, 1] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    # distinct peaks sorted by time
+    spectral_peaks = np.unique(np.column_stack((random_state.randint(0, 50200, PEAKS_PER_TRACK),
+                                                random_state.randint(0, 513, PEAKS_PER_TRACK))), axis=0)
+    audio_fingerprints = [[i, j] for i, j in zip(hashes, quads.tolist())]
+    return audio_fingerprints, spectral_peaks.tolist(), "Track_" + str(track_number)
+
+
+def synthetic_query(random_state, track):
+    """
+    A function to create a query from an excerpt of a track, shifted to start at time 0.
+
+    """
+    start = random_state.randint(0, FINGERPRINTS_PER_TRACK - FINGERPRINTS_PER_QUERY)
+    audio_fingerprints = track[0][start:start + FINGERPRINTS_PER_QUERY]
+    offset = audio_fingerprints[0][1][0] // 20 * 20
+    query_fingerprints = [[i[0], [i[1][0] - offset, i[1][1], i[1][2] - offset, i[1][3]]] for i in audio_fingerprints]
+    query_peaks = [[i[0] - offset, i[1]] for i in track[1] if offset <= i[0] <= offset + 3750]
+    return query_fingerprints, query_peaks
+
+
+async def client(query_batcher, queries, latencies, results):
+    """
+    A coroutine sending queries one after the other, like a client waiting for each answer.
+
+    """
+    for audio_fingerprints, query_peaks in queries:
+        start = time.perf_counter()
+        results.append(await query_batcher.query(audio_fingerprints=audio_fingerprints, query_peaks=query_peaks))
+        latencies.append(time.perf_counter() - start)
+
+
+async def load_test(query_batcher, queries, concurrency):
+    """
+    A coroutine to run the queries with a number of concurrent clients.
+
+    """
+    latencies = list()
+    results = list()
+    start = time.perf_counter()
+    await asyncio.gather(*[client(query_batcher, queries[i::concurrency], latencies, results)
+                           for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    await query_batcher.close()
+    return latencies, results, elapsed
+
+
+random_state = np.random.RandomState(0)
+tracks = [synthetic_track(random_state, i) for i in range(NUMBER_OF_TRACKS)]
+queries = [synthetic_query(random_state, tracks[i])
+           for i in random_state.randint(0, NUMBER_OF_TRACKS, NUMBER_OF_QUERIES)]
+dir_manager.create_dir("../../../Benchmark_Data/")
+db_path = "../../../Benchmark_Data/Async_Queries.db"
+if os.path.exists(db_path):
+    os.remove(db_path)
+fingerprint_manager = FingerprintManager(db_path=db_path, persistent=True)
+fingerprint_manager.store_fingerprints_bulk(tracks=tracks)
+print("Concurrency", "Max Batch Size", "Batches", "p50 (ms)", "p99 (ms)", "Queries per Second", "Matches")
+for concurrency in CONCURRENCY_LEVELS:
+    for max_batch_size in MAX_BATCH_SIZES:
+        query_batcher = QueryBatcher(fingerprint_manager=fingerprint_manager, max_batch_size=max_batch_size,
+                                     max_queue_depth=NUMBER_OF_QUERIES)
+        latencies, results, elapsed = asyncio.run(load_test(query_batcher, queries, concurrency))
+        matches = sum(1 for i in results if i[0] != "No Match")
+        print(concurrency, max_batch_size, query_batcher.batches, round(np.percentile(latencies, 50) * 1000, 2),
+              round(np.percentile(latencies, 99) * 1000, 2), round(len(latencies) / elapsed, 1), matches)
+fingerprint_manager.close()
@@ -0,0 +1,35 @@
+from Utilities import audio_manager
+from Utilities import dir_manager
+import numpy as np
+import soundfile
+import time
+
+# defining constants
+SAMPLING_RATE = 7000
+NATIVE_SAMPLING_RATE = 44100
+AUDIO_DURATION = 240
+NUMBER_OF_QUERIES = 10
+QUERY_DURATION = 10.0
+
+# a four minute stereo audio written both as WAV and as MP3
+dir_manager.create_dir("../../../Benchmark_Data/")
+random_state = np.random.RandomState(0)
+audio_data = 0.1 * random_state.normal(size=(NATIVE_SAMPLING_RATE * AUDIO_DURATION, 2))
+audio_paths = ["../../../Benchmark_Data/audio.wav", "../../../Benchmark_Data/audio.mp3"]
+soundfile.write(audio_paths[0], audio_data, NATIVE_SAMPLING_RATE)
+soundfile.write(audio_paths[1], audio_data, NATIVE_SAMPLING_RATE, format="MP3")
+# query offsets spread over the whole audio
+offsets = np.linspace(0, AUDIO_DURATION - QUERY_DURATION, NUMBER_OF_QUERIES)
+loaders = [("librosa", "polyphase"), ("soundfile", "polyphase"), ("soundfile", "soxr")]
+print("Format", "Backend", "Resampler", "Full Audio (s)", "Query Segment (s)")
+for audio_path in audio_paths:
+    for backend, resampler in loaders:
+        start = time.time()
+        audio_manager.load_audio(audio_path=audio_path, sr=SAMPLING_RATE, backend=backend, resampler=resampler)
+        full_audio_time = time.time() - start
+        start = time.time()
+        for offset in offsets:
+            audio_manager.load_audio(audio_path=audio_path, sr=SAMPLING_RATE, offset=offset, duration=QUERY_DURATION,
+                                     backend=backend, resampler=resampler)
+        query_time = (time.time() - start) / NUMBER_OF_QUERIES
+        print(audio_path.split(".")[-1], backend, resampler, round(full_audio_time, 3), round(query_time, 4))
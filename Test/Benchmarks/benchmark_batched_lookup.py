@@ -0,0 +1,57 @@
+from FingerprintManager import FingerprintManager
+from Utilities import dir_manager
+import numpy as np
+import os
+import time
+
+# defining constants
+NUMBER_OF_TRACKS = 500
+FINGERPRINTS_PER_TRACK = 2000
+FINGERPRINTS_PER_SECOND = 9
+NUMBER_OF_QUERIES = 20
+
+
+def synthetic_track(random_state, track_number):
+    """
+    A function to create random time sorted fingerprints of a track.
+
+    """
+    hashes = np.round(random_state.uniform(0, 1, (FINGERPRINTS_PER_TRACK, 4)), 3).tolist()
+    # valid raw data, Ax < Bx and Ay < By
+    quads = np.empty((FINGERPRINTS_PER_TRACK, 4), dtype=int)
+    quads[:, 0] = np.sort(random_state.randint(1, 50000, FINGERPRINTS_PER_TRACK))
+    quads[:, 1] = random_state.randint(1, 300, FINGERPRINTS_PER_TRACK)
+    quads[:, 2] = quads[:, 0] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    quads[:, 3] = quads[:, 1] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    quads = quads.tolist()
+    audio_fingerprints = [[i, j] for i, j in zip(hashes, quads)]
+    return audio_fingerprints, [], "Track_" + str(track_number)
+
+
+random_state = np.random.RandomState(0)
+tracks = [synthetic_track(random_state, i) for i in range(NUMBER_OF_TRACKS)]
+dir_manager.create_dir("../../../Benchmark_Data/")
+db_path = "../../../Benchmark_Data/Batched_Lookup.db"
+if os.path.exists(db_path):
+    os.remove(db_path)
+fingerprint_manager = FingerprintManager(db_path=db_path, persistent=True)
+fingerprint_manager.store_fingerprints_bulk(tracks=tracks)
+print("Clip Duration (s)", "Fingerprints", "Per Hash (ms)", "Batched (ms)", "Speedup", "Same Matches")
+for clip_duration in [5, 10, 20, 30]:
+    number_of_fingerprints = clip_duration * FINGERPRINTS_PER_SECOND
+    # query clips are excerpts of reference tracks
+    queries = list()
+    for i in random_state.randint(0, NUMBER_OF_TRACKS, NUMBER_OF_QUERIES):
+        start = random_state.randint(0, FINGERPRINTS_PER_TRACK - number_of_fingerprints)
+        queries.append(tracks[i][0][start:start + number_of_fingerprints])
+    timings = list()
+    matches = list()
+    for batched in [False, True]:
+        start = time.time()
+        matches.append([fingerprint_manager.find_matches(audio_fingerprints=i, batched=batched) for i in queries])
+        timings.append((time.time() - start) / NUMBER_OF_QUERIES * 1000)
+    print(clip_duration, number_of_fingerprints, round(timings[0], 2), round(timings[1], 2),
+          round(timings[0] / timings[1], 2),
+          # the per hash look up leaves candidates in r-tree order, so tied candidates may come in another order
+          [sorted(i) for i in matches[0]] == [sorted(i) for i in matches[1]])
+fingerprint_manager.close()
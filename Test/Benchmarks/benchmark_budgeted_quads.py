@@ -0,0 +1,34 @@
+from Core import FingerprintGenerator
+import numpy as np
+import time
+import tracemalloc
+
+# defining constants
+FRAMES_PER_SECOND = 219
+NUMBER_OF_FREQUENCY_BINS = 513
+AUDIO_DURATION = 60
+PEAKS_PER_SECOND = 20
+
+# random spectrogram and synthetic time sorted spectral peaks
+random_state = np.random.RandomState(0)
+spectrogram = random_state.normal(size=(NUMBER_OF_FREQUENCY_BINS, FRAMES_PER_SECOND * AUDIO_DURATION))
+number_of_peaks = PEAKS_PER_SECOND * AUDIO_DURATION
+times = np.sort(random_state.randint(0, FRAMES_PER_SECOND * AUDIO_DURATION, number_of_peaks))
+freqs = random_state.randint(0, NUMBER_OF_FREQUENCY_BINS, number_of_peaks)
+spectral_peaks = list(zip(times, freqs))
+print("Mode", "Quads/Second", "Number of Fingerprints", "Time (s)", "Peak Memory (MB)")
+for budgeted in [False, True]:
+    for number_of_quads_per_second in [9, 50, 500]:
+        fingerprint_generator = FingerprintGenerator(frames_per_second=FRAMES_PER_SECOND, target_zone_width=1,
+                                                     target_zone_center=2, tolerance=0.31,
+                                                     number_of_quads_per_second=number_of_quads_per_second,
+                                                     vectorized=True, budgeted=budgeted)
+        tracemalloc.start()
+        start = time.time()
+        audio_fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=spectral_peaks,
+                                                                         spectrogram=spectrogram)
+        end = time.time()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("Budgeted" if budgeted else "Exhaustive", number_of_quads_per_second, len(audio_fingerprints),
+              round(end - start, 3), round(peak_memory / 2 ** 20, 1))
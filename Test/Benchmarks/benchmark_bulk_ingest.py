@@ -0,0 +1,56 @@
+from FingerprintManager import FingerprintManager
+from Utilities import dir_manager
+import numpy as np
+import os
+import sqlite3
+import time
+
+# defining constants
+NUMBER_OF_TRACKS = 200
+FINGERPRINTS_PER_TRACK = 2000
+PEAKS_PER_TRACK = 5000
+
+
+def synthetic_track(random_state, track_number):
+    """
+    A function to create random fingerprints and spectral peaks of a track.
+
+    """
+    hashes = np.round(random_state.uniform(0, 1, (FINGERPRINTS_PER_TRACK, 4)), 3).tolist()
+    quads = random_state.randint(0, 50000, (FINGERPRINTS_PER_TRACK, 4)).tolist()
+    audio_fingerprints = [[i, j] for i, j in zip(hashes, quads)]
+    times = np.sort(random_state.choice(50000, PEAKS_PER_TRACK, replace=False))
+    spectral_peaks = list(zip(times, random_state.randint(0, 513, PEAKS_PER_TRACK)))
+    return audio_fingerprints, spectral_peaks, "Track_" + str(track_number)
+
+
+def dump_database(db_path):
+    """
+    A function to read all records of a reference fingerprint database.
+
+    """
+    with sqlite3.connect(db_path) as conn:
+        return [conn.execute("SELECT * FROM " + i + " ORDER BY 1, 2").fetchall()
+                for i in ["Hashes", "Audios", "Quads", "Peaks"]]
+
+
+random_state = np.random.RandomState(0)
+tracks = [synthetic_track(random_state, i) for i in range(NUMBER_OF_TRACKS)]
+dir_manager.create_dir("../../../Benchmark_Data/")
+db_paths = ["../../../Benchmark_Data/Ingest_Single.db", "../../../Benchmark_Data/Ingest_Bulk.db"]
+for db_path in db_paths:
+    if os.path.exists(db_path):
+        os.remove(db_path)
+# storing one track at a time
+fingerprint_manager = FingerprintManager(db_path=db_paths[0])
+start = time.time()
+for audio_fingerprints, spectral_peaks, audio_title in tracks:
+    fingerprint_manager.store_fingerprints(audio_fingerprints=audio_fingerprints, spectral_peaks=spectral_peaks,
+                                           audio_title=audio_title)
+elapsed = time.time() - start
+print("Single", "Fingerprints/Second", round(NUMBER_OF_TRACKS * FINGERPRINTS_PER_TRACK / elapsed))
+# storing all tracks with bulk ingest
+fingerprint_manager = FingerprintManager(db_path=db_paths[1])
+statistics = fingerprint_manager.store_fingerprints_bulk(tracks=tracks)
+print("Bulk", "Fingerprints/Second", round(statistics["fingerprints_per_second"]))
+print("Identical Databases", dump_database(db_paths[0]) == dump_database(db_paths[1]))
@@ -0,0 +1,75 @@
+from FingerprintManager import FingerprintManager
+from Utilities import dir_manager
+import numpy as np
+import os
+import time
+
+# defining constants
+FINGERPRINTS_PER_TRACK = 10000
+NUMBER_OF_QUERIES = 20
+FINGERPRINTS_PER_QUERY = 270
+INDEX_BACKENDS = ["kdtree", "grid"]
+
+
+def synthetic_tracks(random_state, number_of_tracks):
+    """
+    A function to create random fingerprints of tracks, the hashes are concentrated around a few centers like hashes
+    of real audios are.
+
+    """
+    centers = random_state.uniform(0.2, 0.8, (64, 4))
+    for track_number in range(number_of_tracks):
+        hashes = centers[random_state.randint(0, len(centers), FINGERPRINTS_PER_TRACK)]
+        hashes = np.round(np.clip(hashes + random_state.normal(0, 0.08, hashes.shape), 0, 1), 3)
+        quads = np.empty((FINGERPRINTS_PER_TRACK, 4), dtype=int)
+        quads[:, 0] = np.sort(random_state.randint(1, 50000, FINGERPRINTS_PER_TRACK))
+        quads[:, 1] = random_state.randint(1, 300, FINGERPRINTS_PER_TRACK)
+        quads[:, 2] = quads[:, 0] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+        quads[:, 3] = quads[:, 1] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+        yield [[i, j] for i, j in zip(hashes.tolist(), quads.tolist())], [], "Track_" + str(track_number)
+
+
+def same_matches(matches, other_matches):
+    """
+    A function to compare candidates found by two backends in their ranked order, ties included. Scale factors may
+    differ by rounding.
+
+    """
+    return [[(i[0], i[1], round(i[2], 6), round(i[3], 6), i[4]) for i in j] for j in matches] == \
+        [[(i[0], i[1], round(i[2], 6), round(i[3], 6), i[4]) for i in j] for j in other_matches]
+
+
+dir_manager.create_dir("../../../Benchmark_Data/")
+print("Stored Hashes", "Backend", "Load (s)", "Query (ms)", "Speedup", "Same Matches")
+for number_of_hashes in [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]:
+    number_of_tracks = number_of_hashes // FINGERPRINTS_PER_TRACK
+    db_path = "../../../Benchmark_Data/Hash_Index.db"
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    FingerprintManager(db_path=db_path).store_fingerprints_bulk(
+        tracks=synthetic_tracks(np.random.RandomState(0), number_of_tracks))
+    # queries are shifted excerpts of stored tracks
+    random_state = np.random.RandomState(1)
+    tracks = list(synthetic_tracks(np.random.RandomState(0), min(number_of_tracks, NUMBER_OF_QUERIES)))
+    queries = list()
+    for i in range(NUMBER_OF_QUERIES):
+        start = random_state.randint(0, FINGERPRINTS_PER_TRACK - FINGERPRINTS_PER_QUERY)
+        audio_fingerprints = tracks[i % len(tracks)][0][start:start + FINGERPRINTS_PER_QUERY]
+        queries.append([[j[0], [j[1][0] + 7, j[1][1], j[1][2] + 7, j[1][3]]] for j in audio_fingerprints])
+    fingerprint_manager = FingerprintManager(db_path=db_path, persistent=True)
+    start = time.time()
+    rtree_matches = [fingerprint_manager.find_matches(audio_fingerprints=i, batched=True) for i in queries]
+    rtree_time = (time.time() - start) / NUMBER_OF_QUERIES * 1000
+    fingerprint_manager.close()
+    print(number_of_hashes, "rtree", 0, round(rtree_time, 2), 1, True)
+    for index_backend in INDEX_BACKENDS:
+        fingerprint_manager = FingerprintManager(db_path=db_path, persistent=True, index_backend=index_backend)
+        start = time.time()
+        fingerprint_manager.hash_index()
+        load_time = time.time() - start
+        start = time.time()
+        matches = [fingerprint_manager.find_matches(audio_fingerprints=i) for i in queries]
+        query_time = (time.time() - start) / NUMBER_OF_QUERIES * 1000
+        fingerprint_manager.close()
+        print(number_of_hashes, index_backend, round(load_time, 2), round(query_time, 2),
+              round(rtree_time / query_time, 2), same_matches(rtree_matches, matches))
@@ -0,0 +1,37 @@
+from Core import FingerprintGenerator
+import numpy as np
+import time
+
+# defining constants
+FRAMES_PER_SECOND = 219
+NUMBER_OF_FREQUENCY_BINS = 513
+AUDIO_DURATION = 60
+
+# random spectrogram used for ranking quads
+random_state = np.random.RandomState(0)
+spectrogram = random_state.normal(size=(NUMBER_OF_FREQUENCY_BINS, FRAMES_PER_SECOND * AUDIO_DURATION))
+# fingerprint generator objects for both quad enumeration modes
+fingerprint_generator = FingerprintGenerator(frames_per_second=FRAMES_PER_SECOND, target_zone_width=1,
+                                             target_zone_center=2, tolerance=0.31)
+vectorized_fingerprint_generator = FingerprintGenerator(frames_per_second=FRAMES_PER_SECOND, target_zone_width=1,
+                                                        target_zone_center=2, tolerance=0.31, vectorized=True)
+print("Peaks/Second", "Number of Peaks", "Python (s)", "NumPy (s)", "Speedup")
+for peaks_per_second in [5, 10, 15, 20]:
+    number_of_peaks = peaks_per_second * AUDIO_DURATION
+    # synthetic time sorted spectral peaks
+    times = np.sort(random_state.randint(0, FRAMES_PER_SECOND * AUDIO_DURATION, number_of_peaks))
+    freqs = random_state.randint(0, NUMBER_OF_FREQUENCY_BINS, number_of_peaks)
+    spectral_peaks = list(zip(times, freqs))
+    start = time.time()
+    audio_fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=spectral_peaks,
+                                                                     spectrogram=spectrogram)
+    python_time = time.time() - start
+    start = time.time()
+    vectorized_audio_fingerprints = vectorized_fingerprint_generator.generate_fingerprints(
+        spectral_peaks=spectral_peaks,
+        spectrogram=spectrogram)
+    numpy_time = time.time() - start
+    # both modes should generate exactly the same fingerprints
+    assert audio_fingerprints == vectorized_audio_fingerprints
+    print(peaks_per_second, number_of_peaks, round(python_time, 3), round(numpy_time, 3),
+          round(python_time / numpy_time, 1))
@@ -0,0 +1,72 @@
+from FingerprintManager import FingerprintManager
+from Utilities import dir_manager
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
+import time
+
+# defining constants
+NUMBER_OF_TRACKS = 500
+FINGERPRINTS_PER_TRACK = 2000
+FINGERPRINTS_PER_QUERY = 90
+QUERIES_PER_PROCESS = 50
+PROCESS_COUNTS = [1, 2, 4]
+DB_PATH = "../../../Benchmark_Data/Read_Only_Replicas.db"
+
+
+def synthetic_track(random_state, track_number):
+    """
+    A function to create random time sorted fingerprints of a track.
+
+    """
+    hashes = np.round(random_state.uniform(0, 1, (FINGERPRINTS_PER_TRACK, 4)), 3).tolist()
+    # valid raw data, Ax < Bx and Ay < By
+    quads = np.empty((FINGERPRINTS_PER_TRACK, 4), dtype=int)
+    quads[:, 0] = np.sort(random_state.randint(1, 50000, FINGERPRINTS_PER_TRACK))
+    quads[:, 1] = random_state.randint(1, 300, FINGERPRINTS_PER_TRACK)
+    quads[:, 2] = quads[:, 0] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    quads[:, 3] = quads[:, 1] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    audio_fingerprints = [[i, j] for i, j in zip(hashes, quads.tolist())]
+    return audio_fingerprints, [], "Track_" + str(track_number)
+
+
+def run_queries(queries, read_only, warm_up):
+    """
+    A function to run queries in a query process, with a manager of its own.
+
+    """
+    start = time.time()
+    fingerprint_manager = FingerprintManager(db_path=DB_PATH, persistent=True, read_only=read_only, warm_up=warm_up)
+    opened = time.time()
+    first_query = None
+    for audio_fingerprints in queries:
+        fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints, vectorized=True)
+        if first_query is None:
+            first_query = time.time() - opened
+    fingerprint_manager.close()
+    return opened - start, first_query, time.time() - start
+
+
+if __name__ == "__main__":
+    random_state = np.random.RandomState(0)
+    tracks = [synthetic_track(random_state, i) for i in range(NUMBER_OF_TRACKS)]
+    dir_manager.create_dir("../../../Benchmark_Data/")
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    FingerprintManager(db_path=DB_PATH).store_fingerprints_bulk(tracks=tracks)
+    # query clips are excerpts of reference tracks
+    queries = list()
+    for i in random_state.randint(0, NUMBER_OF_TRACKS, QUERIES_PER_PROCESS):
+        start = random_state.randint(0, FINGERPRINTS_PER_TRACK - FINGERPRINTS_PER_QUERY)
+        queries.append(tracks[i][0][start:start + FINGERPRINTS_PER_QUERY])
+    print("Processes", "Mode", "Warm Up", "Open (ms)", "First Query (ms)", "Queries per Second")
+    for number_of_processes in PROCESS_COUNTS:
+        for read_only, warm_up in [(False, False), (True, False), (True, True)]:
+            start = time.time()
+            with ProcessPoolExecutor(max_workers=number_of_processes) as executor:
+                results = list(executor.map(run_queries, [queries] * number_of_processes,
+                                            [read_only] * number_of_processes, [warm_up] * number_of_processes))
+            elapsed = time.time() - start
+            print(number_of_processes, "read_only" if read_only else "read_write", warm_up,
+                  round(np.mean([i[0] for i in results]) * 1000, 2), round(np.mean([i[1] for i in results]) * 1000, 2),
+                  round(number_of_processes * QUERIES_PER_PROCESS / elapsed, 1))
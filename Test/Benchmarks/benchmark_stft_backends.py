@@ -0,0 +1,31 @@
+from Core import STFT
+import numpy as np
+import time
+import tracemalloc
+
+# defining constants
+SAMPLING_RATE = 7000
+AUDIO_DURATION = 60
+NUMBER_OF_RUNS = 5
+
+# one minute of synthetic time series audio data sampled at 7KHz
+random_state = np.random.RandomState(0)
+t = np.arange(SAMPLING_RATE * AUDIO_DURATION) / SAMPLING_RATE
+audio_data = (0.3 * np.sin(2 * np.pi * 440 * t) + 0.1 * random_state.normal(size=t.size)).astype(np.float32)
+spectrograms = dict()
+print("Backend", "Time per Minute (s)", "Peak Memory per Minute (MB)", "Output dtype")
+for backend in ["librosa", "numpy"]:
+    stft = STFT(n_fft=1024, hop_length=32, sr=SAMPLING_RATE, backend=backend)
+    # warming up imports and caches
+    stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data[:SAMPLING_RATE])
+    start = time.time()
+    for i in range(NUMBER_OF_RUNS):
+        spectrogram = stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data)
+    elapsed = (time.time() - start) / NUMBER_OF_RUNS
+    tracemalloc.start()
+    spectrograms[backend] = stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(backend, round(elapsed * 60 / AUDIO_DURATION, 3), round(peak_memory / 2 ** 20 * 60 / AUDIO_DURATION, 1),
+          spectrograms[backend].dtype)
+print("Maximum Difference (db)", np.max(np.abs(spectrograms["librosa"] - spectrograms["numpy"])))
@@ -0,0 +1,61 @@
+from Core import PeakExtractor
+import numpy as np
+
+FRAMES_PER_SECOND = 219
+
+
+def test_density_within_range():
+    """
+    Every full second of a noisy spectrogram gets between the minimum and the maximum number of peaks, and the
+    reported density is the one of the returned peaks.
+
+    """
+    random_state = np.random.RandomState(0)
+    spectrogram = random_state.uniform(-80, 0, (513, 10 * FRAMES_PER_SECOND))
+    peak_extractor = PeakExtractor(maximum_filter_height=75, maximum_filter_width=150)
+    spectral_peaks, peak_magnitudes, peak_density = peak_extractor.extract_spectral_peaks_adaptive(
+        spectrogram=spectrogram, peaks_per_second=(10, 30), frames_per_second=FRAMES_PER_SECOND)
+    assert len(peak_density) == 10
+    assert np.all((peak_density >= 10) & (peak_density <= 30))
+    assert np.array_equal(np.bincount(spectral_peaks[:, 0] // FRAMES_PER_SECOND, minlength=10), peak_density)
+    # sorted by time and then by frequency, magnitudes read at the peaks
+    assert np.all(np.diff(spectral_peaks[:, 0] * spectrogram.shape[0] + spectral_peaks[:, 1]) > 0)
+    assert np.array_equal(peak_magnitudes, spectrogram[spectral_peaks[:, 1], spectral_peaks[:, 0]])
+
+
+def test_dense_blocks_keep_strongest_peaks():
+    """
+    Blocks with too many peaks keep their strongest ones, blocks within range keep the peaks of the default filter.
+
+    """
+    random_state = np.random.RandomState(1)
+    spectrogram = random_state.uniform(-80, -60, (513, 4 * FRAMES_PER_SECOND))
+    # 60 strong isolated peaks in the second block
+    times = np.arange(60) * 3 + FRAMES_PER_SECOND + 10
+    freqs = np.tile(np.arange(10, 513, 100), 12)[:60]
+    spectrogram[freqs, times] = np.linspace(-50, -1, 60)
+    peak_extractor = PeakExtractor(maximum_filter_height=3, maximum_filter_width=3)
+    spectral_peaks, peak_magnitudes, peak_density = peak_extractor.extract_spectral_peaks_adaptive(
+        spectrogram=spectrogram, peaks_per_second=(0, 30), frames_per_second=FRAMES_PER_SECOND)
+    assert np.all(peak_density <= 30)
+    second_block = spectral_peaks[:, 0] // FRAMES_PER_SECOND == 1
+    assert np.count_nonzero(second_block) == 30
+    assert np.sort(peak_magnitudes[second_block]).tolist() == np.sort(np.linspace(-50, -1, 60))[30:].tolist()
+
+
+def test_empty_spectrogram():
+    """
+    A spectrogram without frames gives no peaks and no blocks.
+
+    """
+    peak_extractor = PeakExtractor()
+    spectral_peaks, peak_magnitudes, peak_density = peak_extractor.extract_spectral_peaks_adaptive(
+        spectrogram=np.empty((513, 0), dtype=np.float32))
+    assert spectral_peaks.shape == (0, 2) and len(peak_magnitudes) == 0 and len(peak_density) == 0
+
+
+if __name__ == "__main__":
+    test_density_within_range()
+    test_dense_blocks_keep_strongest_peaks()
+    test_empty_spectrogram()
+    print("Adaptive peak extraction tests passed")
@@ -0,0 +1,73 @@
+from Core import STFT
+from Core import PeakExtractor
+import numpy as np
+
+
+def synthetic_clips(random_state, number_of_clips=5, samples=7000 * 3):
+    """
+    A function to create equal length clips of tones in noise, at different levels so each clip has its own maximum.
+
+    """
+    time = np.arange(samples) / 7000
+    clips = list()
+    for i in range(number_of_clips):
+        tones = sum(np.sin(2 * np.pi * random_state.uniform(100, 3000) * time) for _ in range(5))
+        clips.append(((tones + random_state.normal(0, 0.5, samples)) * 10 ** -i).astype(np.float32))
+    return clips
+
+
+def test_batch_matches_single_clips():
+    """
+    The spectrograms of a batch are the ones of each clip computed alone, normalized by their own maximum.
+
+    """
+    clips = synthetic_clips(np.random.RandomState(0))
+    for backend in ("numpy", "librosa"):
+        stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend=backend, frames_per_block=500)
+        spectrograms = stft.compute_batch_spectrogram_magnitude_in_db(audio_batch=clips)
+        assert spectrograms.shape == (len(clips), 513, 1 + 7000 * 3 // 32)
+        for clip, spectrogram in zip(clips, spectrograms):
+            single = stft.compute_spectrogram_magnitude_in_db(audio_data=clip)
+            assert spectrogram.max() == 0
+            assert np.allclose(spectrogram, single, atol=1e-3)
+
+
+def test_unequal_clips():
+    """
+    Clips of different lengths can't be stacked.
+
+    """
+    stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+    try:
+        stft.compute_batch_spectrogram_magnitude_in_db(audio_batch=[np.zeros(7000), np.zeros(6000)])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("clips of different lengths were accepted")
+
+
+def test_batch_peaks_match_single_clips():
+    """
+    Peaks extracted from the stacked spectrograms are the ones of each spectrogram extracted alone.
+
+    """
+    stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+    spectrograms = stft.compute_batch_spectrogram_magnitude_in_db(audio_batch=synthetic_clips(
+        np.random.RandomState(1)))
+    peak_extractor = PeakExtractor(maximum_filter_height=75, maximum_filter_width=150)
+    spectral_peaks, peak_magnitudes = peak_extractor.extract_spectral_peak_arrays(spectrograms=spectrograms,
+                                                                                  return_magnitudes=True)
+    assert len(spectral_peaks) == len(spectrograms)
+    for spectrogram, peaks, magnitudes in zip(spectrograms, spectral_peaks, peak_magnitudes):
+        single_peaks, single_magnitudes = peak_extractor.extract_spectral_peak_array(spectrogram=spectrogram,
+                                                                                     return_magnitudes=True)
+        assert len(peaks) > 0
+        assert np.array_equal(peaks, single_peaks)
+        assert np.array_equal(magnitudes, single_magnitudes)
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_clips()
+    test_unequal_clips()
+    test_batch_peaks_match_single_clips()
+    print("Batch spectrogram tests passed")
@@ -0,0 +1,27 @@
+from Utilities import dir_manager
+from Core import STFT
+from Core import PeakExtractor
+from Core import FeatureCache
+import time
+
+# source directory for reference audio files
+src_dir = "../../../Test_Data/Reference_Audios/"
+# retrieving all mp3 audio files under specified source directory
+mp3_files = dir_manager.find_mp3_files(src_dir=src_dir)[:10]
+# STFT based spectrogram object
+stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+# peak extractor object
+peak_extractor = PeakExtractor(maximum_filter_width=150, maximum_filter_height=75)
+# caches of features loaded with different audio loaders, which never share entries
+feature_caches = [FeatureCache(cache_dir="../../../Feature_Cache/", max_size=2 ** 30),
+                  FeatureCache(cache_dir="../../../Feature_Cache/", max_size=2 ** 30,
+                               load_audio_parameters={"backend": "soundfile"})]
+for feature_cache in feature_caches:
+    # the second pass is served from the cache
+    for _ in range(2):
+        start = time.time()
+        for i in mp3_files:
+            spectrogram, spectral_peaks, peak_magnitudes = feature_cache.get_features(
+                audio_path=i, stft=stft, peak_extractor=peak_extractor, offset=10.0, duration=10.0)
+        print(feature_cache.load_audio_parameters, feature_cache.hits, feature_cache.misses, time.time() - start)
+    print(feature_cache.size())
@@ -0,0 +1,62 @@
+from Core import PeakExtractor
+from Core import FingerprintGenerator
+import numpy as np
+
+
+def synthetic_spectrogram(random_state, frames=3000, bins=513, peaks_per_frame=4):
+    """
+    A function to create a noisy spectrogram with several strong peaks in every 20th frame.
+
+    """
+    spectrogram = random_state.uniform(-80, -60, (bins, frames))
+    for time_index in range(0, frames, 20):
+        freq_indices = random_state.choice(np.arange(10, bins - 10, 100), peaks_per_frame, replace=False)
+        spectrogram[freq_indices, time_index] = random_state.uniform(-20, 0, peaks_per_frame)
+    return spectrogram
+
+
+def test_same_peaks_and_order():
+    """
+    Both peak extraction paths return the same peaks in the same (time, frequency) order, with the same magnitudes.
+
+    """
+    random_state = np.random.RandomState(0)
+    peak_extractor = PeakExtractor(maximum_filter_height=75, maximum_filter_width=150)
+    spectrogram = synthetic_spectrogram(random_state)
+    spectral_peaks, _, _, peak_magnitudes = peak_extractor.extract_spectral_peaks(spectrogram=spectrogram,
+                                                                                 return_magnitudes=True)
+    peak_array, magnitude_array = peak_extractor.extract_spectral_peak_array(spectrogram=spectrogram,
+                                                                             return_magnitudes=True)
+    # the spectrogram has frames holding several peaks
+    assert np.max(np.bincount(peak_array[:, 0])) > 1
+    assert [[int(i), int(j)] for i, j in spectral_peaks] == peak_array.tolist()
+    assert np.array_equal(np.array(peak_magnitudes), magnitude_array)
+    assert spectral_peaks == sorted(spectral_peaks)
+
+
+def test_same_fingerprints():
+    """
+    Fingerprints generated from the peaks of both paths are the same, so they can be mixed in one database.
+
+    """
+    random_state = np.random.RandomState(1)
+    peak_extractor = PeakExtractor(maximum_filter_height=75, maximum_filter_width=150)
+    spectrogram = synthetic_spectrogram(random_state)
+    spectral_peaks = peak_extractor.extract_spectral_peaks(spectrogram=spectrogram)[0]
+    peak_array = peak_extractor.extract_spectral_peak_array(spectrogram=spectrogram)
+    for vectorized in (False, True):
+        fingerprint_generator = FingerprintGenerator(frames_per_second=219, target_zone_width=2, target_zone_center=4,
+                                                     number_of_quads_per_second=20, tolerance=0.31,
+                                                     vectorized=vectorized)
+        fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=spectral_peaks,
+                                                                   spectrogram=spectrogram)
+        array_fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=peak_array,
+                                                                         spectrogram=spectrogram)
+        assert len(fingerprints) > 0
+        assert fingerprints == array_fingerprints
+
+
+if __name__ == "__main__":
+    test_same_peaks_and_order()
+    test_same_fingerprints()
+    print("Peak order tests passed")
@@ -0,0 +1,61 @@
+from FingerprintManager import FingerprintManager
+import numpy as np
+import os
+
+# defining constants
+FINGERPRINTS_PER_TRACK = 400
+FRAMES_PER_TRACK = 20000
+FRAMES_PER_PEAK = 20
+QUERY_FRAMES = 3750
+
+
+def synthetic_track(random_state, track_number):
+    """
+    A function to create random time sorted fingerprints and sparse spectral peaks of a track.
+
+    """
+    hashes = random_state.uniform(0, 1, (FINGERPRINTS_PER_TRACK, 4)).tolist()
+    # valid raw data, Ax < Bx and Ay < By
+    quads = np.empty((FINGERPRINTS_PER_TRACK, 4), dtype=int)
+    quads[:, 0] = np.sort(random_state.randint(1, FRAMES_PER_TRACK, FINGERPRINTS_PER_TRACK))
+    quads[:, 1] = random_state.randint(1, 300, FINGERPRINTS_PER_TRACK)
+    quads[:, 2] = quads[:, 0] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    quads[:, 3] = quads[:, 1] + random_state.randint(1, 200, FINGERPRINTS_PER_TRACK)
+    audio_fingerprints = [[i, j] for i, j in zip(hashes, quads.tolist())]
+    # one peak in every FRAMES_PER_PEAK frames
+    times = np.arange(0, FRAMES_PER_TRACK, FRAMES_PER_PEAK) + random_state.randint(0, FRAMES_PER_PEAK,
+                                                                                  FRAMES_PER_TRACK // FRAMES_PER_PEAK)
+    freqs = random_state.randint(0, 512, len(times))
+    spectral_peaks = list(zip(times.tolist(), freqs.tolist()))
+    return audio_fingerprints, spectral_peaks, "Track_" + str(track_number)
+
+
+def create_reference_database(db_path, number_of_tracks=10, random_state=0, peak_storage="auto"):
+    """
+    A function to store synthetic tracks into a new reference database.
+
+    Returns:
+        List : (audio_fingerprints, spectral_peaks, audio_title) of each stored track, in order of their audio ids.
+
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    random_state = np.random.RandomState(random_state)
+    tracks = [synthetic_track(random_state, i) for i in range(number_of_tracks)]
+    FingerprintManager(db_path=db_path, peak_storage=peak_storage).store_fingerprints_bulk(tracks=tracks)
+    return tracks
+
+
+def excerpt_query(track, start, frames=QUERY_FRAMES):
+    """
+    A function to cut a query out of a track, the fingerprints and peaks from frame start on, shifted to the start of
+    the query. A start which is a multiple of the bin width of find_matches is found as the offset of the match.
+
+    Returns:
+        tuple : fingerprints and spectral peaks of the query.
+
+    """
+    audio_fingerprints = [[i[0], [i[1][0] - start, i[1][1], i[1][2] - start, i[1][3]]] for i in track[0]
+                          if start <= i[1][0] < start + frames]
+    query_peaks = [(i[0] - start, i[1]) for i in track[1] if start <= i[0] <= start + frames]
+    return audio_fingerprints, query_peaks
@@ -0,0 +1,99 @@
+from FingerprintManager import FingerprintManager
+from FingerprintManager.fingerprint_manager import aggregate_candidates, bin_times, outlier_removal
+from synthetic_references import create_reference_database, excerpt_query
+from collections import defaultdict
+import numpy as np
+import operator
+import os
+import tempfile
+
+
+def random_candidates(random_state, number_of_candidates=5000):
+    """
+    A function to create filtered candidates clustered around a few offsets of each audio, with scale factors
+    scattered around 1 and a few outliers.
+
+    """
+    audio_ids = random_state.randint(1, 20, number_of_candidates)
+    offsets = random_state.randint(0, 10, number_of_candidates) * 137 + random_state.uniform(0, 30,
+                                                                                            number_of_candidates)
+    s_times = random_state.normal(1, 0.02, number_of_candidates)
+    s_freqs = random_state.normal(1, 0.02, number_of_candidates)
+    outliers = random_state.uniform(0, 1, number_of_candidates) < 0.05
+    s_times[outliers] *= 1.2
+    return audio_ids, offsets, s_times, s_freqs
+
+
+def reference_results(audio_ids, offsets, s_times, s_freqs):
+    """
+    A function to rank candidates the way find_matches does it, with bin_times and outlier_removal.
+
+    """
+    filtered = defaultdict(list)
+    for audio_id, offset, s_time, s_freq in zip(audio_ids.tolist(), offsets.tolist(), s_times.tolist(),
+                                                s_freqs.tolist()):
+        filtered[audio_id].append((offset, (s_time, s_freq)))
+    results = list()
+    for audio_id, binned in ((k, bin_times(v)) for k, v in filtered.items()):
+        for offset, scales in binned.items():
+            outlier_removal(binned_item=[audio_id, offset, len(scales), scales], results=results)
+    return sorted(results, key=operator.itemgetter(4), reverse=True)
+
+
+def same_results(results, other_results):
+    """
+    A function to compare ranked bins, means may differ in the last digits.
+
+    """
+    return len(results) == len(other_results) and \
+        all(i[0] == j[0] and i[1] == j[1] and i[4] == j[4] and np.allclose(i[2:4], j[2:4], rtol=1e-9)
+            for i, j in zip(results, other_results))
+
+
+def test_same_as_bin_times_and_outlier_removal():
+    """
+    The grouped array aggregation ranks the bins bin_times and outlier_removal rank, ties included, and its top-k
+    are the first k of them.
+
+    """
+    candidates = random_candidates(np.random.RandomState(0))
+    expected = reference_results(*candidates)
+    assert len(expected) > 100
+    assert len({i[4] for i in expected}) < len(expected)
+    assert same_results(aggregate_candidates(*candidates), expected)
+    for top_k in (1, 5, 20):
+        assert same_results(aggregate_candidates(*candidates, top_k=top_k), expected[:top_k])
+
+
+def test_sparse_bins():
+    """
+    Bins with less than ts candidates are dropped and no candidates give no bins.
+
+    """
+    assert aggregate_candidates(np.array([1, 1, 1]), np.array([0.0, 1.0, 2.0]), np.ones(3), np.ones(3)) == []
+    assert aggregate_candidates(np.empty(0), np.empty(0), np.empty(0), np.empty(0)) == []
+
+
+def test_vectorized_find_matches():
+    """
+    Vectorized find_matches ranks the candidates of the baseline find_matches.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        audio_fingerprints = excerpt_query(tracks[3], start=4000)[0] + excerpt_query(tracks[7], start=1000)[0][:40]
+        fingerprint_manager = FingerprintManager(db_path=db_path)
+        expected = fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints)
+        assert [i[0] for i in expected[:2]] == [4, 8]
+        assert same_results(fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints, vectorized=True),
+                            expected)
+        assert same_results(fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints, vectorized=True,
+                                                             top_k=1), expected[:1])
+
+
+if __name__ == "__main__":
+    test_same_as_bin_times_and_outlier_removal()
+    test_sparse_bins()
+    test_vectorized_find_matches()
+    print("Candidate aggregation tests passed")
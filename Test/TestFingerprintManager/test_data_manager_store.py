@@ -30,11 +30,13 @@ for i in reference_audios:
     audio_data = audio_manager.load_audio(audio_path=i, sr=7000)
     # computing the spectrogram of time series audio data
     spectrogram = stft.compute_spectrogram_magnitude_in_db(audio_data=audio_data)
-    # extracting spectral peaks from STFT based spectrogram
-    spectral_peaks = peak_extractor.extract_spectral_peaks(spectrogram=spectrogram)
+    # extracting spectral peaks along with their magnitudes from STFT based spectrogram
+    spectral_peaks = peak_extractor.extract_spectral_peaks(spectrogram=spectrogram, return_magnitudes=True)
+    # the spectrogram is no longer needed once peak magnitudes are known
+    del spectrogram
     # generate fingerprints using the association of four spectral peaks
     audio_fingerprints = fingerprint_generator.generate_fingerprints(spectral_peaks=spectral_peaks[0],
-                                                                     spectrogram=spectrogram)
+                                                                     peak_magnitudes=spectral_peaks[3])
     # storing fingerprints
     fingerprint_manager.store_fingerprints(audio_fingerprints=audio_fingerprints,
                                            spectral_peaks=spectral_peaks[0],
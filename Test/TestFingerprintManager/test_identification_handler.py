@@ -0,0 +1,91 @@
+from Core import STFT
+from FingerprintManager import IdentificationService
+from FingerprintManager.identification_service import IdentificationRequestHandler, identify_pcm, request_service
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer
+import asyncio
+import threading
+import numpy as np
+
+
+class FailingService(object):
+    """
+    A stand-in for an identification service whose queries raise a given exception.
+
+    """
+
+    def __init__(self, error):
+        self.error = error
+        self.stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+
+    def identify_audio(self, audio_data, sr):
+        raise self.error
+
+
+def status_of(error):
+    """
+    A function to return the HTTP status a PCM request gets when identifying it raises the given exception.
+
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IdentificationRequestHandler)
+    server.service = FailingService(error=error)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return identify_pcm(server.server_address, np.zeros(100, dtype=np.float32), 7000, timeout=5)[0]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_error_statuses():
+    """
+    Every exception of a query is answered with an HTTP status instead of a dropped connection.
+
+    """
+    assert status_of(ValueError("Invalid sampling rate: 0")) == 400
+    assert status_of(asyncio.QueueFull()) == 503
+    assert status_of(asyncio.TimeoutError()) == 504
+    assert status_of(BrokenProcessPool("A worker process died")) == 503
+    assert status_of(RuntimeError("Failed Fingerprinting: silence")) == 422
+    assert status_of(ZeroDivisionError("division by zero")) == 500
+
+
+def test_unknown_path():
+    """
+    Unknown paths are answered with 404.
+
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IdentificationRequestHandler)
+    server.service = FailingService(error=None)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert request_service(server.server_address, "GET", "/unknown", timeout=5)[0] == 404
+        assert request_service(server.server_address, "POST", "/unknown", body=b"", timeout=5)[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_invalid_sampling_rate():
+    """
+    Raw samples with a sampling rate which is not positive are rejected before resampling.
+
+    """
+    identification_service = IdentificationService(fingerprint_manager=None, stft=None, peak_extractor=None,
+                                                   fingerprint_generator=None)
+    for sr in (0, -7000):
+        try:
+            identification_service.identify_audio(audio_data=np.zeros(100, dtype=np.float32), sr=sr)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("sr=" + str(sr) + " was accepted")
+
+
+if __name__ == "__main__":
+    test_error_statuses()
+    test_unknown_path()
+    test_invalid_sampling_rate()
+    print("IdentificationRequestHandler tests passed")
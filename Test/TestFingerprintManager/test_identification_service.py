@@ -0,0 +1,44 @@
+from Utilities import dir_manager
+from Core import STFT
+from Core import PeakExtractor
+from Core import FingerprintGenerator
+from FingerprintManager import FingerprintManager
+from FingerprintManager import IdentificationService
+from FingerprintManager.identification_service import identify_path, request_service
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__":
+    # source directory for query audios
+    src_dir = "../../../Test_Data/Query_Audios/Pitch_Shifted/120/"
+    # retrieving all query audios under specified source directory
+    query_audios = dir_manager.find_wav_files(src_dir=src_dir)
+    # STFT based spectrogram object
+    stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+    # peak extractor object
+    peak_extractor = PeakExtractor(maximum_filter_width=150, maximum_filter_height=75)
+    # fingerprint generator object
+    fingerprint_generator = FingerprintGenerator(
+        frames_per_second=219,
+        target_zone_width=2,
+        target_zone_center=4,
+        number_of_quads_per_second=500,
+        tolerance=0.31,
+        vectorized=True,
+        output_format="array")
+    # persistent fingerprint manager object, shared by the threads of the service
+    fingerprint_manager = FingerprintManager(db_path="../../../Databases/Quads_Test_1.db", persistent=True)
+    # identification service listening on a Unix socket, queries are fingerprinted by 4 worker processes
+    identification_service = IdentificationService(fingerprint_manager=fingerprint_manager,
+                                                   stft=stft,
+                                                   peak_extractor=peak_extractor,
+                                                   fingerprint_generator=fingerprint_generator,
+                                                   workers=4,
+                                                   load_audio_parameters={"backend": "soundfile", "offset": 0.0,
+                                                                          "duration": 30.0})
+    address = identification_service.start(address="/tmp/quad_identification.sock")
+    # 8 concurrent clients
+    with ThreadPoolExecutor(max_workers=8) as clients:
+        for i, (status, result) in zip(query_audios, clients.map(lambda j: identify_path(address, j), query_audios)):
+            print(i, status, result)
+    print(request_service(address, "GET", "/statistics")[1])
+    identification_service.stop()
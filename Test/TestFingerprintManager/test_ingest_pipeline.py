@@ -0,0 +1,38 @@
+from Utilities import dir_manager
+from Core import STFT
+from Core import PeakExtractor
+from Core import FingerprintGenerator
+from FingerprintManager import FingerprintManager
+from FingerprintManager import IngestPipeline
+
+if __name__ == "__main__":
+    # Source directory for reference audio files
+    src_dir = "../../../Test_Data/Reference_Audios/"
+    # retrieving all reference audios under specified source directory
+    reference_audios = dir_manager.find_mp3_files(src_dir=src_dir)
+    # an object for Short Time Fourier Transform
+    stft = STFT(n_fft=1024, hop_length=32, sr=7000, backend="numpy")
+    # an object to extract spectral peaks from STFT based spectrogram
+    peak_extractor = PeakExtractor(maximum_filter_width=150, maximum_filter_height=75)
+    # an object to generate fingerprints as a compact structured array
+    fingerprint_generator = FingerprintGenerator(
+        frames_per_second=219,
+        target_zone_width=2,
+        target_zone_center=4,
+        number_of_quads_per_second=9,
+        tolerance=0.0,
+        vectorized=True,
+        output_format="array"
+    )
+    # Data manager object
+    fingerprint_manager = FingerprintManager(db_path="../../../Databases/Quads_Test_1.db")
+    # decoding and fingerprinting in worker processes, storing with a single writer
+    ingest_pipeline = IngestPipeline(fingerprint_manager=fingerprint_manager,
+                                     stft=stft,
+                                     peak_extractor=peak_extractor,
+                                     fingerprint_generator=fingerprint_generator,
+                                     workers=8,
+                                     load_audio_parameters={"backend": "soundfile"})
+    audio_titles = [i.split("/")[5].split(".")[0] for i in reference_audios]
+    statistics = ingest_pipeline.run(audio_paths=reference_audios, audio_titles=audio_titles)
+    print(statistics)
@@ -0,0 +1,30 @@
+from FingerprintManager import FingerprintManager
+from FingerprintManager.fingerprint_manager import lookup_peak_blocks, PEAK_BLOCK_LENGTH
+import shutil
+import sqlite3
+
+
+def peak_ranges(db_path):
+    """
+    A function to read the encoded peaks of the first ranges of every stored audio.
+
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""SELECT id FROM Audios ORDER BY id""")
+    audio_ids = [i[0] for i in cursor.fetchall()]
+    ranges = [lookup_peak_blocks(cursor=cursor, audio_id=i, start=j, end=j + 3750,
+                                 block_length=PEAK_BLOCK_LENGTH).tolist() for i in audio_ids for j in (0, 3000, 10000)]
+    conn.close()
+    return ranges
+
+
+# migrating a copy of the reference database
+db_path = "../../../Databases/Quads_Test_Blocks.db"
+shutil.copy("../../../Databases/Quads_Test_1.db", db_path)
+fingerprint_manager = FingerprintManager(db_path=db_path)
+print(fingerprint_manager.migrate_peaks())
+migrated_ranges = peak_ranges(db_path=db_path)
+# migrating again re-encodes nothing and keeps every block
+print(fingerprint_manager.migrate_peaks())
+print("Unchanged After Second Migration", peak_ranges(db_path=db_path) == migrated_ranges)
@@ -0,0 +1,127 @@
+from FingerprintManager import FingerprintManager
+from FingerprintManager.fingerprint_manager import lookup_peak_range, verify_peaks
+from FingerprintManager.peak_cache import PeakCache, lookup_peak_block
+from synthetic_references import create_reference_database, excerpt_query
+from bisect import bisect_left, bisect_right
+import numpy as np
+import os
+import sqlite3
+import tempfile
+
+
+def verify_peaks_bisect(match, reference_peaks, query_peaks, eX=18, eY=12):
+    """
+    A function to score reference peaks one by one with two bisections each, the way verify_peaks used to. The
+    bisections run over the times of the sorted query peaks, so equal times are never compared with None.
+
+    """
+    query_peaks = sorted(query_peaks)
+    query_times = [i[0] for i in query_peaks]
+    validated = 0
+    for i in reference_peaks:
+        reference_peak_scaled = ((i[0] - match[1]) * match[2], i[1] * match[3])
+        lBound = bisect_left(query_times, reference_peak_scaled[0] - eX)
+        rBound = bisect_right(query_times, reference_peak_scaled[0] + eX)
+        for j in range(lBound, rBound):
+            if reference_peak_scaled[1] - eY <= query_peaks[j][1] <= reference_peak_scaled[1] + eY:
+                validated += 1
+    return float(validated) / len(reference_peaks)
+
+
+def test_verify_peaks():
+    """
+    Scoring all reference peaks at once gives the score of the bisections, for unsorted query peaks too.
+
+    """
+    random_state = np.random.RandomState(0)
+    for s_time, s_freq in [(1.0, 1.0), (0.93, 1.05), (1.2, 0.8)]:
+        reference_peaks = [(int(i), int(j)) for i, j in zip(random_state.randint(1000, 5000, 300),
+                                                            random_state.randint(0, 512, 300))]
+        query_peaks = [(int(round((i - 1000) * s_time + random_state.randint(-20, 21))),
+                        int(round(j * s_freq + random_state.randint(-15, 16)))) for i, j in reference_peaks]
+        query_peaks += [(int(i), int(j)) for i, j in zip(random_state.randint(0, 4000, 300),
+                                                         random_state.randint(0, 512, 300))]
+        random_state.shuffle(query_peaks)
+        match = [1, 1000, s_time, s_freq, 50]
+        v_score = verify_peaks(match=match, reference_peaks=reference_peaks, query_peaks=query_peaks)
+        assert v_score > 0
+        assert v_score == verify_peaks_bisect(match=match, reference_peaks=reference_peaks, query_peaks=query_peaks)
+    assert verify_peaks(match=match, reference_peaks=[], query_peaks=query_peaks) == 0.0
+
+
+def test_peak_cache_lru():
+    """
+    The least recently used block is dropped first, and blocks are read from the database only on a miss.
+
+    """
+    reads = list()
+
+    def lookup_block(cursor, audio_id, block, block_length):
+        reads.append((audio_id, block))
+        return np.array([[block * block_length + 1, audio_id]], dtype=np.int32)
+
+    peak_cache = PeakCache(max_blocks=2, block_length=100)
+    for audio_id in (1, 2, 1, 3):
+        peak_cache.lookup_peak_range(cursor=None, audio_id=audio_id, offset=0, e=50, lookup_block=lookup_block)
+    # audio 2 was used least recently when audio 3 was added
+    assert reads == [(1, 0), (2, 0), (3, 0)] and len(peak_cache) == 2
+    peak_cache.lookup_peak_range(cursor=None, audio_id=1, offset=0, e=50, lookup_block=lookup_block)
+    peak_cache.lookup_peak_range(cursor=None, audio_id=2, offset=0, e=50, lookup_block=lookup_block)
+    assert reads[3:] == [(2, 0)]
+    assert (peak_cache.hits, peak_cache.misses) == (2, 4)
+    # a range spanning blocks, cut to its bounds
+    peaks = peak_cache.lookup_peak_range(cursor=None, audio_id=1, offset=150, e=100, lookup_block=lookup_block)
+    assert peaks.tolist() == [[201, 1]]
+    peak_cache.clear()
+    assert len(peak_cache) == 0
+
+
+def test_cached_peak_ranges():
+    """
+    Cached peak ranges are the ranges read from the Peaks table.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        create_reference_database(db_path=db_path, number_of_tracks=3)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        peak_cache = PeakCache(max_blocks=4, block_length=3750)
+        for audio_id, offset in [(1, 0), (2, 3000), (1, 16000), (3, 7500), (2, 3000)]:
+            expected = sorted(lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset))
+            peaks = peak_cache.lookup_peak_range(cursor=cursor, audio_id=audio_id, offset=offset,
+                                                 lookup_block=lookup_peak_block)
+            assert len(expected) > 0 and peaks.tolist() == [list(i) for i in expected]
+        conn.close()
+
+
+def test_top_k_verification():
+    """
+    A query whose best candidate fails verification is matched with the next candidate passing it.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        # most fingerprints come from track 1, while the peaks are the ones of track 2
+        audio_fingerprints = excerpt_query(tracks[1], start=3000)[0]
+        fingerprints, query_peaks = excerpt_query(tracks[2], start=9000)
+        audio_fingerprints += fingerprints[:30]
+        for peak_cache_blocks in (0, 4096):
+            fingerprint_manager = FingerprintManager(db_path=db_path, peak_cache_blocks=peak_cache_blocks)
+            assert [i[0] for i in fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints)[:2]] == \
+                [2, 3]
+            assert fingerprint_manager.query_audio(audio_fingerprints=audio_fingerprints,
+                                                   query_peaks=query_peaks) == ("No Match", 0)
+            assert fingerprint_manager.query_audio(audio_fingerprints=audio_fingerprints, query_peaks=query_peaks,
+                                                   verify_top_k=2)[::2] == ("Track_2", 9000)
+            assert [i[0] for i in fingerprint_manager.query_audio_batch(
+                queries=[(audio_fingerprints, query_peaks)] * 2, verify_top_k=2)] == ["Track_2"] * 2
+
+
+if __name__ == "__main__":
+    test_verify_peaks()
+    test_peak_cache_lru()
+    test_cached_peak_ranges()
+    test_top_k_verification()
+    print("Peak verification tests passed")
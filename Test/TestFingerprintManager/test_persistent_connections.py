@@ -0,0 +1,72 @@
+from FingerprintManager import FingerprintManager
+from synthetic_references import create_reference_database, excerpt_query
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import threading
+
+
+def test_persistent_connections():
+    """
+    A persistent manager opens one tuned connection per thread and reuses it, with the results of a manager opening a
+    connection per call.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        queries = [excerpt_query(tracks[i], start=2000 + 100 * i)[0] for i in range(len(tracks))]
+        expected = [FingerprintManager(db_path=db_path).find_matches(audio_fingerprints=i) for i in queries]
+        fingerprint_manager = FingerprintManager(db_path=db_path, persistent=True, cache_size=-4096,
+                                                 mmap_size=2 ** 20)
+        assert [fingerprint_manager.find_matches(audio_fingerprints=i) for i in queries] == expected
+        statistics = fingerprint_manager.connection_statistics()
+        assert statistics["opened"] == 1 and statistics["open"] == 1
+        assert statistics["reused"] >= len(queries)
+        with fingerprint_manager.connection() as conn:
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -4096
+            assert conn.execute("PRAGMA mmap_size").fetchone()[0] == 2 ** 20
+        # one more connection for each thread, reused by all queries of the thread
+        connections = set()
+        barrier = threading.Barrier(3)
+
+        def run_queries(thread_queries):
+            barrier.wait()
+            with fingerprint_manager.connection() as conn:
+                connections.add(id(conn))
+            return [fingerprint_manager.find_matches(audio_fingerprints=i) for i in thread_queries]
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(run_queries, [queries] * 3))
+        assert all(i == expected for i in results)
+        assert len(connections) == 3
+        assert fingerprint_manager.connection_statistics()["opened"] == 4
+        fingerprint_manager.close()
+        assert fingerprint_manager.connection_statistics()["open"] == 0
+        # a closed manager opens a new connection on demand
+        assert fingerprint_manager.find_matches(audio_fingerprints=queries[0]) == expected[0]
+        assert fingerprint_manager.connection_statistics()["opened"] == 5
+        fingerprint_manager.close()
+
+
+def test_connection_per_call():
+    """
+    A manager which isn't persistent opens a connection for every call and keeps none open.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path, number_of_tracks=2)
+        fingerprint_manager = FingerprintManager(db_path=db_path)
+        opened = fingerprint_manager.connection_statistics()["opened"]
+        for _ in range(3):
+            fingerprint_manager.find_matches(audio_fingerprints=excerpt_query(tracks[0], start=0)[0])
+        statistics = fingerprint_manager.connection_statistics()
+        assert statistics["opened"] == opened + 3
+        assert statistics["reused"] == 0 and statistics["open"] == 0
+
+
+if __name__ == "__main__":
+    test_persistent_connections()
+    test_connection_per_call()
+    print("Persistent connection tests passed")
@@ -0,0 +1,44 @@
+from FingerprintManager import FingerprintManager
+from synthetic_references import create_reference_database, excerpt_query
+import numpy as np
+import os
+import tempfile
+
+
+def test_progressive_query():
+    """
+    A clean query stops as soon as the leading bin is far enough ahead, with the result of the full query.
+    Fingerprints are looked up in time order whatever their order in the query, and a query which never gets a clear
+    leader looks up all of its fingerprints.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        audio_fingerprints, query_peaks = excerpt_query(tracks[2], start=8000)
+        fingerprint_manager = FingerprintManager(db_path=db_path)
+        expected = fingerprint_manager.query_audio(audio_fingerprints=audio_fingerprints, query_peaks=query_peaks)
+        assert expected[0] == "Track_2"
+        result, fingerprints_used = fingerprint_manager.query_audio_progressive(
+            audio_fingerprints=audio_fingerprints, query_peaks=query_peaks, fingerprints_per_batch=8, min_margin=12)
+        assert result == expected
+        assert fingerprints_used == 16 < len(audio_fingerprints)
+        shuffled = [audio_fingerprints[i] for i in np.random.RandomState(0).permutation(len(audio_fingerprints))]
+        assert fingerprint_manager.query_audio_progressive(audio_fingerprints=shuffled, query_peaks=query_peaks,
+                                                           fingerprints_per_batch=8, min_margin=12) == \
+            (expected, fingerprints_used)
+        # a margin which is never reached
+        result, fingerprints_used = fingerprint_manager.query_audio_progressive(
+            audio_fingerprints=audio_fingerprints, query_peaks=query_peaks, fingerprints_per_batch=8,
+            min_margin=len(audio_fingerprints) + 1)
+        assert result == expected and fingerprints_used == len(audio_fingerprints)
+        # fingerprints matching nothing
+        unknown_fingerprints = [[[j + 2 for j in i[0]], i[1]] for i in audio_fingerprints]
+        assert fingerprint_manager.query_audio_progressive(audio_fingerprints=unknown_fingerprints,
+                                                           query_peaks=query_peaks) == \
+            (("No Match", 0), len(audio_fingerprints))
+
+
+if __name__ == "__main__":
+    test_progressive_query()
+    print("Progressive query tests passed")
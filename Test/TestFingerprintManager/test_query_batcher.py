@@ -0,0 +1,103 @@
+from FingerprintManager import QueryBatcher
+import asyncio
+import threading
+import time
+
+
+class SlowManager(object):
+    """
+    A stand-in for a fingerprint manager whose batches take a while.
+
+    """
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+
+    def query_audio_batch(self, queries, verify_top_k=1):
+        time.sleep(self.delay)
+        return [("Match", i) for i in range(len(queries))]
+
+
+def test_close_during_batch_window():
+    """
+    A query taken off the queue but still waiting in the batch window is cancelled by close.
+
+    """
+    async def run():
+        query_batcher = QueryBatcher(fingerprint_manager=SlowManager(), batch_window=0.5)
+        query = asyncio.ensure_future(query_batcher.query(audio_fingerprints=[], query_peaks=[]))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(query_batcher.close(), timeout=5)
+        done, _ = await asyncio.wait([query], timeout=5)
+        assert query in done
+        assert query.cancelled()
+        assert query_batcher.batches == 0
+
+    asyncio.run(run())
+
+
+def test_close_while_waiting_for_thread():
+    """
+    The running batch finishes before close returns and the queries waiting for a thread are cancelled.
+
+    """
+    async def run():
+        query_batcher = QueryBatcher(fingerprint_manager=SlowManager(), max_workers=1, batch_window=0.0,
+                                     max_batch_size=1)
+        queries = [asyncio.ensure_future(query_batcher.query(audio_fingerprints=[], query_peaks=[]))
+                   for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(query_batcher.close(), timeout=5)
+        results = await asyncio.wait_for(asyncio.gather(*queries, return_exceptions=True), timeout=5)
+        assert results[0] == ("Match", 0)
+        assert all(isinstance(i, asyncio.CancelledError) for i in results[1:])
+        assert not [i for i in asyncio.all_tasks() if i is not asyncio.current_task()]
+
+    asyncio.run(run())
+
+
+def test_shutdown_from_another_thread():
+    """
+    Shutting down from another thread cancels the waiting queries in the loop and the batcher can be used again.
+
+    """
+    async def run():
+        query_batcher = QueryBatcher(fingerprint_manager=SlowManager(delay=0.0), batch_window=0.5)
+        query = asyncio.ensure_future(query_batcher.query(audio_fingerprints=[], query_peaks=[]))
+        await asyncio.sleep(0.05)
+        thread = threading.Thread(target=query_batcher.shutdown)
+        thread.start()
+        done, _ = await asyncio.wait([query], timeout=5)
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert query in done and query.cancelled()
+        assert await query_batcher.query(audio_fingerprints=[], query_peaks=[]) == ("Match", 0)
+        await query_batcher.close()
+
+    asyncio.run(run())
+
+
+def test_queue_full():
+    """
+    Queries beyond max_queue_depth are rejected.
+
+    """
+    async def run():
+        query_batcher = QueryBatcher(fingerprint_manager=SlowManager(), max_workers=1, batch_window=0.5,
+                                     max_queue_depth=1)
+        queries = [asyncio.ensure_future(query_batcher.query(audio_fingerprints=[], query_peaks=[]))
+                   for _ in range(3)]
+        results = await asyncio.gather(*queries, return_exceptions=True)
+        assert any(isinstance(i, asyncio.QueueFull) for i in results)
+        assert query_batcher.rejected == sum(1 for i in results if isinstance(i, asyncio.QueueFull))
+        await query_batcher.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_close_during_batch_window()
+    test_close_while_waiting_for_thread()
+    test_shutdown_from_another_thread()
+    test_queue_full()
+    print("QueryBatcher tests passed")
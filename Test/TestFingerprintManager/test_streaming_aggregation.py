@@ -0,0 +1,95 @@
+from FingerprintManager import FingerprintManager
+from FingerprintManager.candidate_aggregator import StreamingAggregator
+from synthetic_references import create_reference_database, excerpt_query
+import numpy as np
+import os
+import tempfile
+
+
+def random_candidates(random_state, number_of_candidates=5000):
+    """
+    A function to create filtered candidates spread over a few bins of a few audios.
+
+    """
+    audio_ids = random_state.randint(1, 10, number_of_candidates)
+    offsets = random_state.randint(0, 8, number_of_candidates) * 100 + random_state.uniform(0, 20,
+                                                                                           number_of_candidates)
+    s_times = random_state.normal(1, 0.05, number_of_candidates)
+    s_freqs = random_state.normal(1, 0.05, number_of_candidates)
+    return audio_ids, offsets, s_times, s_freqs
+
+
+def test_running_statistics():
+    """
+    Statistics merged batch by batch are the ones of all candidates of each bin computed at once.
+
+    """
+    audio_ids, offsets, s_times, s_freqs = random_candidates(np.random.RandomState(0))
+    aggregator = StreamingAggregator()
+    for start in range(0, len(audio_ids), 317):
+        batch = slice(start, start + 317)
+        assert aggregator.update(audio_ids=audio_ids[batch], offsets=offsets[batch], s_times=s_times[batch],
+                                 s_freqs=s_freqs[batch])
+    assert aggregator.candidates == len(audio_ids)
+    bins = (np.floor(offsets / 20) * 20).astype(np.int64)
+    keys = sorted(set(zip(audio_ids.tolist(), bins.tolist())))
+    assert len(aggregator) == len(keys)
+    results = aggregator.results()
+    assert len(results) == len(keys)
+    assert [i[4] for i in results] == sorted((i[4] for i in results), reverse=True)
+    for audio_id, offset, s_time, s_freq, count in results:
+        selected = (audio_ids == audio_id) & (bins == offset)
+        assert count == np.count_nonzero(selected)
+        assert np.isclose(s_time, s_times[selected].mean()) and np.isclose(s_freq, s_freqs[selected].mean())
+    deviations = aggregator.standard_deviations()
+    first = dict()
+    for i, key in enumerate(zip(audio_ids.tolist(), bins.tolist())):
+        first.setdefault(key, i)
+    for slot, key in enumerate(sorted(first, key=first.get)):
+        selected = (audio_ids == key[0]) & (bins == key[1])
+        assert np.allclose(deviations[slot], [s_times[selected].std(), s_freqs[selected].std()])
+    assert aggregator.results(top_k=3) == results[:3]
+
+
+def test_too_many_bins():
+    """
+    The aggregation stops and drops its statistics as soon as the number of bins goes beyond the cap.
+
+    """
+    audio_ids, offsets, s_times, s_freqs = random_candidates(np.random.RandomState(1))
+    aggregator = StreamingAggregator(max_bins=20)
+    assert not aggregator.update(audio_ids=audio_ids, offsets=offsets, s_times=s_times, s_freqs=s_freqs)
+    assert aggregator.ambiguous and len(aggregator) == 0
+    assert not aggregator.update(audio_ids=audio_ids[:1], offsets=offsets[:1], s_times=s_times[:1],
+                                 s_freqs=s_freqs[:1])
+
+
+def test_streaming_queries():
+    """
+    A streaming query finds the matching bin, and a query with more bins than the cap is too ambiguous.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        audio_fingerprints, query_peaks = excerpt_query(tracks[5], start=6000)
+        # fingerprints of excerpts of many tracks at many offsets
+        noisy_fingerprints = [j for i in range(len(tracks)) for start in range(0, 15000, 3000)
+                              for j in excerpt_query(tracks[i], start=start, frames=500)[0]]
+        fingerprint_manager = FingerprintManager(db_path=db_path)
+        matches = fingerprint_manager.find_matches(audio_fingerprints=audio_fingerprints, streaming=True,
+                                                   fingerprints_per_batch=16)
+        assert matches[0][:2] == [6, 6000] and matches[0][4] == len(audio_fingerprints)
+        assert fingerprint_manager.query_audio(audio_fingerprints=audio_fingerprints, query_peaks=query_peaks,
+                                               streaming=True, max_bins=100)[0] == "Track_5"
+        assert fingerprint_manager.find_matches(audio_fingerprints=noisy_fingerprints, streaming=True,
+                                                max_bins=10) is None
+        assert fingerprint_manager.query_audio(audio_fingerprints=noisy_fingerprints, query_peaks=query_peaks,
+                                               streaming=True, max_bins=10) == ("Too Ambiguous", 0)
+
+
+if __name__ == "__main__":
+    test_running_statistics()
+    test_too_many_bins()
+    test_streaming_queries()
+    print("Streaming aggregation tests passed")
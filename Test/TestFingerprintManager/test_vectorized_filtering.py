@@ -0,0 +1,87 @@
+from FingerprintManager.fingerprint_manager import filter_candidates, filter_candidates_vectorized, find_hash
+from FingerprintManager.fingerprint_manager import fetch_candidates, find_hash_batch
+from synthetic_references import create_reference_database, excerpt_query
+from collections import defaultdict
+import numpy as np
+import os
+import sqlite3
+import tempfile
+
+
+def random_candidates(random_state, number_of_candidates=20000):
+    """
+    A function to create query quads and candidates scaled from them in time and frequency, about half of which pass
+    the tolerance checks of filter_candidates.
+
+    """
+    query_quads = np.empty((number_of_candidates, 4), dtype=np.int64)
+    query_quads[:, 0] = random_state.randint(0, 5000, number_of_candidates)
+    query_quads[:, 1] = random_state.randint(1, 300, number_of_candidates)
+    query_quads[:, 2] = query_quads[:, 0] + random_state.randint(1, 200, number_of_candidates)
+    query_quads[:, 3] = query_quads[:, 1] + random_state.randint(1, 200, number_of_candidates)
+    scales = random_state.uniform(0.6, 1.6, (number_of_candidates, 2))
+    reference_quads = np.empty_like(query_quads)
+    reference_quads[:, 0] = random_state.randint(0, 50000, number_of_candidates)
+    reference_quads[:, 1] = np.maximum(1, np.round(query_quads[:, 1] * scales[:, 1]))
+    reference_quads[:, 2] = reference_quads[:, 0] + np.maximum(
+        1, np.round((query_quads[:, 2] - query_quads[:, 0]) * scales[:, 0]))
+    reference_quads[:, 3] = reference_quads[:, 1] + np.maximum(
+        1, np.round((query_quads[:, 3] - query_quads[:, 1]) * scales[:, 1]))
+    audio_ids = random_state.randint(1, 50, number_of_candidates)
+    return query_quads, reference_quads, audio_ids
+
+
+def test_same_as_filter_candidates():
+    """
+    The vectorized filter keeps the candidates filter_candidates keeps, in the same order and with the same offsets
+    and scale factors.
+
+    """
+    query_quads, reference_quads, audio_ids = random_candidates(np.random.RandomState(0))
+    filtered = defaultdict(list)
+    for query_quad, reference_quad, audio_id in zip(query_quads.tolist(), reference_quads.tolist(),
+                                                    audio_ids.tolist()):
+        filter_candidates(cursor=[reference_quad + [audio_id]], query_quad=query_quad, filtered=filtered)
+    candidate_audio_ids, offsets, s_times, s_freqs = filter_candidates_vectorized(
+        query_quads=query_quads, reference_quads=reference_quads, audio_ids=audio_ids)
+    assert 0 < len(candidate_audio_ids) < len(audio_ids)
+    assert sum(len(i) for i in filtered.values()) == len(candidate_audio_ids)
+    for audio_id, candidates in filtered.items():
+        selected = candidate_audio_ids == audio_id
+        assert np.allclose([i[0] for i in candidates], offsets[selected], rtol=1e-12)
+        assert np.allclose([i[1][0] for i in candidates], s_times[selected], rtol=1e-12)
+        assert np.allclose([i[1][1] for i in candidates], s_freqs[selected], rtol=1e-12)
+
+
+def test_same_candidates_from_database():
+    """
+    Candidates fetched for a whole query as arrays and filtered at once are the ones filtered hash by hash.
+
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "References.db")
+        tracks = create_reference_database(db_path=db_path)
+        # a query mixing excerpts of two tracks
+        audio_fingerprints = excerpt_query(tracks[3], start=4000)[0] + excerpt_query(tracks[7], start=1000)[0]
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        filtered = defaultdict(list)
+        for hash_value, quad in audio_fingerprints:
+            find_hash(cursor=cursor, hash_value=hash_value)
+            filter_candidates(cursor=cursor, query_quad=quad, filtered=filtered)
+        find_hash_batch(cursor=cursor, hash_values=[i[0] for i in audio_fingerprints])
+        query_indices, reference_quads, audio_ids = fetch_candidates(cursor=cursor)
+        query_quads = np.array([i[1] for i in audio_fingerprints])[query_indices]
+        candidate_audio_ids, offsets, s_times, s_freqs = filter_candidates_vectorized(
+            query_quads=query_quads, reference_quads=reference_quads, audio_ids=audio_ids)
+        conn.close()
+        expected = sorted((audio_id, i[0], i[1][0], i[1][1]) for audio_id, j in filtered.items() for i in j)
+        assert {i[0] for i in expected} >= {4, 8}
+        assert sorted(zip(candidate_audio_ids.tolist(), offsets.tolist(), s_times.tolist(),
+                          s_freqs.tolist())) == expected
+
+
+if __name__ == "__main__":
+    test_same_as_filter_candidates()
+    test_same_candidates_from_database()
+    print("Vectorized filtering tests passed")
@@ -1,26 +1,109 @@
+from fractions import Fraction
+from functools import lru_cache
 
-import librosa
+import numpy as np
 
 
-def load_audio(audio_path, sr=7000, offset=None, duration=None):
+@lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    """
+    A function to design the anti-aliasing low pass filter used for polyphase resampling by a factor of up / down,
+    the same filter scipy.signal.resample_poly designs by default.
+
+    Parameters:
+        up (int): upsampling factor.
+        down (int): downsampling factor.
+
+    Returns:
+        numpy.ndarray: coefficients of the FIR filter.
+
+    """
+    from scipy.signal import firwin
+    max_rate = max(up, down)
+    return firwin(2 * 10 * max_rate + 1, 1. / max_rate, window=('kaiser', 5.0)).astype(np.float32)
+
+
+def load_audio(audio_path, sr=7000, offset=None, duration=None, backend="librosa", resampler="polyphase"):
     """
     A function to load monophonic time series representation of an audio.
 
     Parameters:
         audio_path (String): relative/absolute path of a give audio.
         sr (int): sampling rate
-        offset (float): an offset in seconds where reading the audio starts.
-        duration (float): duration of reading (in seconds).
+        offset (float): an offset in seconds where reading the audio starts, the start of the audio if None.
+        duration (float): duration of reading (in seconds), the rest of the audio is read if it is None.
+        backend (String): "librosa" loads the audio with librosa.load, "soundfile" loads it with
+            load_audio_segment.
+        resampler (String): resampler used by the soundfile backend, see load_audio_segment.
 
     Returns:
         numpy.ndarray: monophonic time series representation of the given audio.
 
     """
-    if offset is not None and duration is not None:
-        audio_data, sr = librosa.load(path=audio_path,
-                                      sr=sr, offset=offset, duration=duration)
-        return audio_data
-    else:
-        audio_data, sr = librosa.load(path=audio_path,
-                                      sr=sr)
+    if backend == "soundfile":
+        return load_audio_segment(audio_path=audio_path, sr=sr, offset=offset, duration=duration, resampler=resampler)
+    import librosa
+    # offset and duration are each applied on their own, as the soundfile backend does
+    audio_data, sr = librosa.load(path=audio_path, sr=sr, offset=0.0 if offset is None else offset,
+                                  duration=duration)
+    return audio_data
+
+
+def load_audio_segment(audio_path, sr=7000, offset=None, duration=None, resampler="polyphase"):
+    """
+    A function to load monophonic time series representation of a segment of an audio. The file is opened with
+    soundfile (WAV, FLAC, OGG and, with libsndfile 1.1 or later, MP3), seeks to the offset, decodes only the frames of
+    the segment at the native sampling rate and resamples them to the requested sampling rate.
+
+    Parameters:
+        audio_path (String): relative/absolute path of a give audio.
+        sr (int): sampling rate
+        offset (float): an offset in seconds where reading the audio starts.
+        duration (float): duration of reading (in seconds), the rest of the audio is read if it is None.
+        resampler (String): "polyphase" resamples with scipy.signal.resample_poly, "soxr" resamples with the
+            soxr package (which has to be installed).
+
+    Returns:
+        numpy.ndarray: float32 monophonic time series representation of the given audio segment.
+
+    """
+    import soundfile
+    with soundfile.SoundFile(audio_path) as audio_file:
+        native_sr = audio_file.samplerate
+        if offset is not None:
+            audio_file.seek(min(int(round(offset * native_sr)), audio_file.frames))
+        frames = -1 if duration is None else int(round(duration * native_sr))
+        audio_data = audio_file.read(frames=frames, dtype='float32', always_2d=True)
+    # down mixing to mono
+    audio_data = audio_data.mean(axis=1, dtype=np.float32) if audio_data.shape[1] > 1 else audio_data[:, 0]
+    return resample_audio(audio_data=audio_data, native_sr=native_sr, sr=sr, resampler=resampler)
+
+
+def resample_audio(audio_data, native_sr, sr=7000, resampler="polyphase"):
+    """
+    A function to resample monophonic time series representation of an audio.
+
+    Parameters:
+        audio_data (numpy.ndarray): monophonic time series representation of an audio.
+        native_sr (int): sampling rate of the audio.
+        sr (int): requested sampling rate.
+        resampler (String): "polyphase" resamples with scipy.signal.resample_poly, "soxr" resamples with the
+            soxr package (which has to be installed).
+
+    Returns:
+        numpy.ndarray: float32 monophonic time series representation of the audio at the requested sampling rate.
+
+    """
+    audio_data = np.asarray(audio_data, dtype=np.float32)
+    if native_sr == sr:
         return audio_data
+    if resampler == "soxr":
+        import soxr
+        return soxr.resample(audio_data, native_sr, sr).astype(np.float32, copy=False)
+    if resampler == "polyphase":
+        from scipy.signal import resample_poly
+        ratio = Fraction(sr, native_sr)
+        return resample_poly(audio_data, ratio.numerator, ratio.denominator,
+                             window=polyphase_filter(ratio.numerator, ratio.denominator)).astype(np.float32,
+                                                                                                  copy=False)
+    raise ValueError("Unknown resampler: " + str(resampler))